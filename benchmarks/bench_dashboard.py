@@ -0,0 +1,245 @@
+"""Benchmark dos caminhos quentes de um rerun do dashboard.
+
+Gera `DataSource` sintéticos em várias escalas (via gerador mock vetorizado) e mede
+cada etapa equivalente a um rerun de `streamlit_app.main` — carga/normalização,
+cubo diário (em memória e por ingestão em blocos), filtros, KPIs + séries diárias
+(linhas brutas e cubo diário, com o ganho do cubo em `speedup`), KPIs de produto,
+percentis de AIT/tNPS (exatos e por sketches, com o erro máximo observado),
+forecast (total e em lote por segmento) e propensão — com tempo (mínimo/mediana
+de N repetições) e pico de memória (tracemalloc) por etapa.
+
+Falha (exit 1) se os percentis passarem do erro garantido ou se o cubo ficar mais
+lento que filtro + agregação das linhas brutas.
+
+Saída: JSON lines (uma linha por escala × etapa), com o commit atual, para
+comparar execuções entre commits:
+
+    python benchmarks/bench_dashboard.py --scales 100000,1000000 --output base.jsonl
+    python benchmarks/bench_dashboard.py --scales 100000,1000000 --compare base.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from src.catalog import build_filter_options  # noqa: E402
+from src.cube import DailyCube, cube_aggregates, cube_daily_group_sums  # noqa: E402
+from src.data_access import DataSource, make_data_source  # noqa: E402
+from src.filters import apply_filters  # noqa: E402
+from src.metrics import SERIES_METRICS, compute_product_kpis, compute_ticket_aggregates, series_matrix  # noqa: E402
+from src.ml import forecast_batch, forecast_series_stub, score_conversion_propensity_stub  # noqa: E402
+from src.model_registry import ModelRegistry  # noqa: E402
+from src.sketch import RELATIVE_ACCURACY, SKETCH_METRICS, QuantileSketches, exact_quantiles, quantile_error, sketch_quantiles  # noqa: E402
+from src.streaming import fold_ticket_chunks, iter_parquet_chunks  # noqa: E402
+from src.mock_data import generate_mock_jobs, generate_mock_product_metrics, generate_mock_tickets  # noqa: E402
+
+DEFAULT_SCALES = [100_000, 1_000_000]
+DAYS = 120
+DIMENSIONS = ["canal", "produto", "convenio", "segmento", "estado", "prioridade", "categoria"]
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def build_data_source(n_tickets: int, days: int = DAYS, seed: int = 42) -> DataSource:
+    tickets = generate_mock_tickets(days=days, tickets_per_day=n_tickets / days, seed=seed)
+    return make_data_source(tickets, generate_mock_jobs(days), generate_mock_product_metrics(days))
+
+
+def scenario_filters(ds: DataSource) -> Dict[str, dict]:
+    """Filtros típicos: tudo selecionado (padrão da sidebar) e um recorte estreito."""
+    options = build_filter_options(ds)
+    full = {k: options[k] for k in DIMENSIONS}
+    full["date_range"] = (options["min_date"], options["max_date"])
+    narrow = {k: options[k][: max(1, len(options[k]) // 2)] for k in DIMENSIONS}
+    narrow["date_range"] = (options["max_date"] - pd.Timedelta(days=30), options["max_date"])
+    return {"full": full, "narrow": narrow}
+
+
+def _measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Tempo de `repeat` execuções sem tracemalloc (que distorce o tempo) + uma execução rastreada para o pico."""
+    timings: List[float] = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "result": result,
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "peak_mb": peak / 2**20,
+    }
+
+
+def run_rerun_stages(ds: DataSource, filters: dict, repeat: int) -> Dict[str, Dict[str, Any]]:
+    """Mede as etapas de um rerun de `main()` (mesma ordem e mesmas funções)."""
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    stages["filter"] = _measure(lambda: apply_filters(ds, filters), repeat)
+    tickets_f, jobs_f, product_f = stages["filter"]["result"]
+
+    stages["ticket_aggregates"] = _measure(lambda: compute_ticket_aggregates(tickets_f, jobs_f), repeat)
+    aggs = stages["ticket_aggregates"]["result"]
+
+    # Caminho usado pelo app fora do modo agregado: KPIs/séries a partir do cubo diário.
+    # Comparado com filtro + agregação das linhas brutas (o que o cubo substitui no rerun).
+    stages["raw_aggregates"] = _measure(lambda: compute_ticket_aggregates(*apply_filters(ds, filters)[:2]), repeat)
+    stages["cube_aggregates"] = _measure(lambda: cube_aggregates(ds, filters), repeat)
+    stages["cube_aggregates"]["speedup"] = stages["raw_aggregates"]["median_s"] / stages["cube_aggregates"]["median_s"]
+
+    stages["product_kpis"] = _measure(lambda: compute_product_kpis(product_f), repeat)
+
+    # Percentis de AIT/tNPS por canal e convênio: ordenação das linhas filtradas vs. merge dos sketches
+    breakdowns = [(metric, by) for metric in SKETCH_METRICS for by in (None, "canal", "convenio")]
+    stages["quantiles_exact"] = _measure(lambda: [exact_quantiles(tickets_f, m, by) for m, by in breakdowns], repeat)
+    stages["quantiles_sketch"] = _measure(lambda: [sketch_quantiles(ds, filters, m, by) for m, by in breakdowns], repeat)
+    stages["quantiles_sketch"]["max_rel_error"] = max(
+        quantile_error(est, exact, by)
+        for (_, by), est, exact in zip(breakdowns, stages["quantiles_sketch"]["result"], stages["quantiles_exact"]["result"])
+    )
+
+    by_day = aggs.daily.set_index("timestamp")["tickets"]
+    stages["forecast"] = _measure(lambda: forecast_series_stub(by_day, horizon=14), repeat)
+
+    # Aba Previsões: volume/AIT/tNPS por convênio num único forecast em lote
+    def _forecast_segments():
+        sums = cube_daily_group_sums(ds, filters, "convenio")
+        matrix = pd.concat({m: series_matrix(sums, "convenio", m) for m in SERIES_METRICS}, axis=1)
+        return forecast_batch(matrix, horizon=14)
+
+    stages["forecast_segments"] = _measure(_forecast_segments, repeat)
+
+    features = product_f.tail(30)[["applications", "approvals"]]
+    # Alvo com duas classes (o stub exige); no app o alvo vem de conversions > 0
+    target = (product_f.tail(30)["conversions"] > product_f.tail(30)["conversions"].median()).astype(int)
+    if target.nunique() > 1:
+        # Treino isolado (registry só em memória, vazio) vs. rerun servido pelo registry
+        stages["propensity_train"] = _measure(lambda: ModelRegistry().get_or_train(features, target), repeat)
+        stages["propensity"] = _measure(lambda: score_conversion_propensity_stub(features, target), repeat)
+
+    # O rerun usa o cubo *ou* filtro + agregação das linhas brutas; o total considera o cubo
+    rerun = [v for k, v in stages.items() if k not in ("filter", "ticket_aggregates", "raw_aggregates", "propensity_train", "quantiles_exact")]
+    stages["rerun_total"] = {
+        "min_s": sum(s["min_s"] for s in rerun),
+        "median_s": sum(s["median_s"] for s in rerun),
+        "peak_mb": max(s["peak_mb"] for s in rerun),
+    }
+    return stages
+
+
+def run(scales: List[int], repeat: int) -> List[Dict[str, Any]]:
+    meta = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+    records: List[Dict[str, Any]] = []
+    for n in scales:
+        load = _measure(lambda: build_data_source(n), 1)
+        ds = load["result"]
+        records.append({**meta, "scale": n, "scenario": "-", "stage": "load", "rows": len(ds.tickets),
+                        "min_s": load["min_s"], "median_s": load["median_s"], "peak_mb": load["peak_mb"]})
+        cube = _measure(lambda: DailyCube.from_tickets(ds.tickets), 1)
+        ds.cube = cube["result"]
+        records.append({**meta, "scale": n, "scenario": "-", "stage": "cube_build", "rows": len(ds.cube.cells),
+                        "min_s": cube["min_s"], "median_s": cube["median_s"], "peak_mb": cube["peak_mb"]})
+        sketches = _measure(lambda: QuantileSketches.from_tickets(ds.tickets), 1)
+        ds.sketches = sketches["result"]
+        records.append({**meta, "scale": n, "scenario": "-", "stage": "sketch_build",
+                        "rows": sum(len(e) for e in ds.sketches.entries.values()),
+                        "min_s": sketches["min_s"], "median_s": sketches["median_s"], "peak_mb": sketches["peak_mb"]})
+        # Mesmo cubo via ingestão em blocos (Parquet lido em lotes de 100k linhas)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "tickets.parquet"
+            ds.tickets.to_parquet(path, index=False, row_group_size=100_000)
+            stream = _measure(lambda: fold_ticket_chunks(iter_parquet_chunks(path, batch_rows=100_000)), 1)
+        records.append({**meta, "scale": n, "scenario": "-", "stage": "stream_fold", "rows": len(ds.tickets),
+                        "min_s": stream["min_s"], "median_s": stream["median_s"], "peak_mb": stream["peak_mb"]})
+        for scenario, filters in scenario_filters(ds).items():
+            for stage, m in run_rerun_stages(ds, filters, repeat).items():
+                extra = {k: m[k] for k in ("max_rel_error", "speedup") if k in m}
+                records.append({**meta, "scale": n, "scenario": scenario, "stage": stage, "rows": len(ds.tickets),
+                                "min_s": m["min_s"], "median_s": m["median_s"], "peak_mb": m["peak_mb"], **extra})
+        del ds, load, cube, sketches, stream
+    return records
+
+
+def compare(current: List[Dict[str, Any]], baseline_path: Path) -> None:
+    baseline = {}
+    for line in baseline_path.read_text().splitlines():
+        if line.strip():
+            r = json.loads(line)
+            baseline[(r["scale"], r["scenario"], r["stage"])] = r
+    print(f"{'scale':>10} {'scenario':>8} {'stage':>18} {'base s':>9} {'atual s':>9} {'delta':>8}")
+    for r in current:
+        b = baseline.get((r["scale"], r["scenario"], r["stage"]))
+        if b is None:
+            continue
+        delta = (r["median_s"] / b["median_s"] - 1) * 100 if b["median_s"] else 0.0
+        print(f"{r['scale']:>10} {r['scenario']:>8} {r['stage']:>18} {b['median_s']:>9.4f} {r['median_s']:>9.4f} {delta:>+7.1f}%")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="total de tickets por escala, separado por vírgula (ex.: 100000,1000000,10000000)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetições por etapa (reporta mínimo e mediana)")
+    parser.add_argument("--output", type=Path, help="arquivo JSON lines de saída (padrão: stdout)")
+    parser.add_argument("--compare", type=Path, help="JSON lines de uma execução anterior para comparar medianas")
+    args = parser.parse_args(argv)
+
+    scales = [int(float(s)) for s in args.scales.split(",") if s.strip()]
+    # Modelos do registry (e demais caches em disco) num diretório temporário, fora do ~/.cache real
+    with tempfile.TemporaryDirectory(prefix="bench-cache-") as cache_dir:
+        os.environ["DISK_CACHE_DIR"] = cache_dir
+        records = run(scales, args.repeat)
+
+    lines = "\n".join(json.dumps(r, sort_keys=True) for r in records) + "\n"
+    if args.output:
+        args.output.write_text(lines)
+    elif not args.compare:
+        sys.stdout.write(lines)
+    if args.compare:
+        compare(records, args.compare)
+    # Percentis dos sketches fora da garantia documentada (src/sketch.py) = regressão
+    broken = [r for r in records if r.get("max_rel_error", 0.0) > RELATIVE_ACCURACY + 1e-9]
+    for r in broken:
+        print(f"[{r['scale']}/{r['scenario']}] erro dos percentis {r['max_rel_error']:.4f} > {RELATIVE_ACCURACY}", file=sys.stderr)
+    # Cubo mais lento que filtro + agregação das linhas brutas = não compensa no rerun
+    slower = [r for r in records if r.get("speedup", 1.0) < 1.0]
+    for r in slower:
+        print(f"[{r['scale']}/{r['scenario']}] cubo {r['speedup']:.2f}x do caminho bruto (< 1x)", file=sys.stderr)
+    return 1 if broken or slower else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
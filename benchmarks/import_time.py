@@ -0,0 +1,117 @@
+"""Tempo de import no cold start (via `python -X importtime`) e guarda contra regressões.
+
+Mede, num interpretador novo para cada alvo:
+
+- `app`: os imports de topo de `streamlit_app.py` (o que toda réplica paga antes do
+  primeiro paint, sem executar o app);
+- `src`: todos os módulos de `src/` usados fora da UI (scripts, jobs, benchmarks).
+
+Falha (exit 1) se um alvo carregar um módulo pesado que deveria ser importado só
+sob demanda (sklearn, plotly.express, conector do Databricks...) ou passar de `--budget-ms`:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms 1500 --top 15
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# Carregados sob demanda (aba Previsões, gráficos, modo Databricks); nunca no import
+LAZY_MODULES = ("sklearn", "plotly.express", "databricks.sql", "joblib", "pyarrow.parquet")
+# Módulos de src/ não devem puxar o streamlit (só a UI usa)
+UI_MODULES = ("streamlit",)
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def app_imports() -> List[str]:
+    """Instruções de import de topo de `streamlit_app.py`."""
+    tree = ast.parse((ROOT / "streamlit_app.py").read_text(encoding="utf-8"))
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def src_imports() -> List[str]:
+    modules = sorted(p.stem for p in (ROOT / "src").glob("*.py") if p.stem not in ("__init__", "ui_components"))
+    return [f"import src.{m}" for m in modules]
+
+
+def measure(statements: List[str]) -> Dict[str, object]:
+    """Roda os imports com `-X importtime` e devolve o total e o cumulativo por módulo."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(statements)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "falha no import")
+    modules: Dict[str, int] = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if not m:
+            continue
+        cumulative_us, indent, name = int(m.group(2)), m.group(3), m.group(4)
+        modules[name] = cumulative_us
+        if len(indent) <= 1:  # import de topo: o cumulativo já inclui os filhos
+            total_us += cumulative_us
+    return {"total_ms": total_us / 1000, "modules": modules}
+
+
+def _loaded(modules: Dict[str, int], prefix: str) -> bool:
+    return any(name == prefix or name.startswith(prefix + ".") for name in modules)
+
+
+def run(top: int) -> List[Dict[str, object]]:
+    targets = {
+        "app": (app_imports(), LAZY_MODULES),
+        "src": (src_imports(), LAZY_MODULES + UI_MODULES),
+    }
+    records = []
+    for target, (statements, forbidden) in targets.items():
+        result = measure(statements)
+        modules = result["modules"]
+        heaviest = sorted(modules.items(), key=lambda kv: kv[1], reverse=True)
+        # Só pacotes de topo no ranking (os filhos já estão no cumulativo)
+        top_level = [(n, us) for n, us in heaviest if "." not in n][:top]
+        records.append({
+            "target": target,
+            "total_ms": round(result["total_ms"], 1),
+            "modules": len(modules),
+            "top_ms": {name: round(us / 1000, 1) for name, us in top_level},
+            "violations": [prefix for prefix in forbidden if _loaded(modules, prefix)],
+        })
+    return records
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=10, help="pacotes mais caros listados por alvo")
+    parser.add_argument("--budget-ms", type=float, help="falha se o import do app passar deste tempo")
+    args = parser.parse_args(argv)
+
+    records = run(args.top)
+    sys.stdout.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+
+    failed = False
+    for r in records:
+        if r["violations"]:
+            print(f"[{r['target']}] módulos que deveriam ser lazy foram importados: {', '.join(r['violations'])}", file=sys.stderr)
+            failed = True
+        if args.budget_ms is not None and r["target"] == "app" and r["total_ms"] > args.budget_ms:
+            print(f"[app] import levou {r['total_ms']:.0f} ms (orçamento: {args.budget_ms:.0f} ms)", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
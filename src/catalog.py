@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import DatabricksConfig
+from .data_access import DataSource, TableWatermark, run_concurrently
+from .databricks_client import run_query
+from .filters import TICKET_DIMENSIONS, TableIndex, get_filter_index
+from .instrumentation import span, traced
+from .query_builder import build_dimension_values, build_time_bounds
+
+
+@dataclass(frozen=True)
+class DimensionCatalog:
+    """Período disponível e valores distintos de cada dimensão de tickets.
+
+    Calculado uma vez por versão dos dados e guardado em tuplas (dezenas de valores,
+    nada proporcional ao número de tickets): a sidebar lê daqui em tempo constante.
+    """
+
+    min_date: Optional[date]
+    max_date: Optional[date]
+    values: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+
+    def as_options(self) -> dict:
+        """Formato consumido pela sidebar (`min_date`, `max_date` e uma lista por dimensão)."""
+        return {
+            "min_date": self.min_date,
+            "max_date": self.max_date,
+            **{key: list(self.values.get(key, ())) for key in TICKET_DIMENSIONS},
+        }
+
+
+def _as_date(value) -> Optional[date]:
+    ts = pd.Timestamp(value) if value is not None else pd.NaT
+    return None if pd.isna(ts) else ts.date()
+
+
+def catalog_from_index(index: TableIndex) -> DimensionCatalog:
+    """Catálogo a partir de um índice de filtros (tickets ou cubo), sem reler as linhas.
+
+    O vetor de tempo já está ordenado (NaT no fim) e cada dimensão já está em códigos:
+    basta olhar as pontas e contar quais categorias aparecem de fato.
+    """
+    times = index.times
+    valid = len(times) - int(np.isnat(times).sum())  # NaT ficam no fim da ordenação
+    values = {}
+    for key, codes in index.codes.items():
+        cats = index.categories[key]
+        used = np.bincount(codes[codes >= 0], minlength=len(cats)) > 0
+        values[key] = tuple(sorted(cats[used].tolist()))
+    return DimensionCatalog(
+        min_date=_as_date(times[0]) if valid else None,
+        max_date=_as_date(times[valid - 1]) if valid else None,
+        values=values,
+    )
+
+
+def catalog_from_watermark(watermark: TableWatermark) -> DimensionCatalog:
+    """Só o período (MIN/MAX do watermark de tickets), sem valores de dimensão.
+
+    Base do modo Databricks quando as consultas do catálogo falham: a sidebar ainda
+    tem datas válidas, e seleções vazias não restringem nada.
+    """
+    return DimensionCatalog(min_date=_as_date(watermark.min_time), max_date=_as_date(watermark.max_time))
+
+
+def get_catalog(ds: DataSource) -> DimensionCatalog:
+    """Catálogo do DataSource, construído uma vez e guardado no próprio objeto.
+
+    Usa o índice de filtros dos tickets (construído de qualquer forma para filtrar) ou,
+    numa visão em streaming sem linhas de tickets, o índice do cubo diário. Na base
+    do modo Databricks (só watermarks), o período vem do watermark de tickets.
+    """
+    if ds.catalog is None:
+        with span("catalog.build") as s:
+            if ds.tickets.empty and ds.cube is not None:
+                ds.catalog, source = catalog_from_index(ds.cube.index), "cube"
+            elif ds.tickets.empty and "tickets" in ds.watermarks:
+                ds.catalog, source = catalog_from_watermark(ds.watermarks["tickets"]), "watermark"
+            else:
+                ds.catalog, source = catalog_from_index(get_filter_index(ds).tickets), "tickets"
+            s.set(source=source, values=sum(len(v) for v in ds.catalog.values.values()))
+    return ds.catalog
+
+
+def build_filter_options(ds: DataSource) -> dict:
+    """Opções da sidebar (período e valores por dimensão) a partir do catálogo."""
+    return get_catalog(ds).as_options()
+
+
+@traced("catalog.load_dimension_catalog")
+def load_dimension_catalog(cfg: DatabricksConfig, version: str = "") -> DimensionCatalog:
+    """Catálogo direto do warehouse: `MIN/MAX` do tempo e `GROUPING SETS` das dimensões.
+
+    Duas consultas pequenas em paralelo; o resultado tem o tamanho do catálogo, não da
+    tabela de tickets. `version` (versão da base) entra na chave do cache de consultas.
+    """
+    queries = {
+        "bounds": build_time_bounds("tickets", cfg.table_tickets),
+        "values": build_dimension_values("tickets", cfg.table_tickets),
+    }
+    results, report = run_concurrently({name: (lambda q=q: run_query(*q, cfg=cfg, version=version)) for name, q in queries.items()})
+    if report.failed:
+        first = report.tables[report.failed[0]]
+        raise RuntimeError(f"Falha na consulta do catálogo '{first.name}': {first.error}")
+    bounds, distinct = results["bounds"], results["values"]
+    values = {}
+    for key, col in TICKET_DIMENSIONS.items():
+        if col in distinct.columns:
+            values[key] = tuple(sorted(distinct[col].dropna().unique().tolist()))
+    return DimensionCatalog(
+        min_date=_as_date(bounds["min_time"].iloc[0]) if len(bounds) else None,
+        max_date=_as_date(bounds["max_time"].iloc[0]) if len(bounds) else None,
+        values=values,
+    )
@@ -1,10 +1,7 @@
 import os
 from dataclasses import dataclass
 
-try:
-    import streamlit as st
-except Exception:  # streamlit not available during static checks
-    st = None
+_STREAMLIT = None  # carregado sob demanda em _streamlit()
 
 
 @dataclass
@@ -18,8 +15,43 @@ class DatabricksConfig:
     table_eligibility: str | None
 
 
+@dataclass
+class DiskCacheConfig:
+    enabled: bool
+    path: str
+    ttl_s: float
+    max_bytes: int
+    models_max_bytes: int = 256 * 1024 * 1024
+
+
+@dataclass
+class MemoConfig:
+    max_entries: int
+    max_bytes: int
+
+
+@dataclass
+class QueryCacheConfig:
+    enabled: bool
+    ttl_s: float
+    max_bytes: int
+
+
+def _streamlit():
+    # Import tardio: importar config (ex.: em scripts/benchmarks) não carrega o streamlit
+    global _STREAMLIT
+    if _STREAMLIT is None:
+        try:
+            import streamlit as st  # lazy import
+        except Exception:  # streamlit not available during static checks
+            st = False
+        _STREAMLIT = st
+    return _STREAMLIT or None
+
+
 def _get_secret(key: str, default: str | None = None) -> str | None:
     # Prefer st.secrets, fallback to env vars
+    st = _streamlit()
     if st is not None:
         try:
             value = st.secrets.get(key)  # type: ignore[attr-defined]
@@ -60,3 +92,68 @@ def is_databricks_configured(cfg: DatabricksConfig | None = None) -> bool:
     return bool(cfg.host and cfg.http_path and cfg.token)
 
 
+def is_aggregate_mode_enabled() -> bool:
+    # Modo agregado (GROUP BY no warehouse) ligado por padrão; AGGREGATE_MODE=false volta às linhas brutas
+    value = _get_secret("AGGREGATE_MODE", "true") or "true"
+    return value.strip().lower() not in ("0", "false", "no", "off")
+
+
+def is_streaming_ingestion_enabled() -> bool:
+    # Fora do modo agregado, tickets chegam em blocos e viram o cubo diário (memória constante);
+    # STREAM_TICKETS=false volta a materializar as linhas filtradas
+    value = _get_secret("STREAM_TICKETS", "true") or "true"
+    return value.strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_refresh_interval_s() -> float:
+    # Intervalo do refresh incremental (segundos) no modo Databricks
+    try:
+        return float(_get_secret("REFRESH_INTERVAL_S", "300") or 300)
+    except ValueError:
+        return 300.0
+
+
+def get_chart_width_px() -> int:
+    # Largura de referência dos gráficos: limita pontos por traço (~1 por pixel)
+    try:
+        return max(100, int(_get_secret("CHART_WIDTH_PX", "1200") or 1200))
+    except ValueError:
+        return 1200
+
+
+def load_disk_cache_config() -> DiskCacheConfig:
+    enabled = (_get_secret("DISK_CACHE_ENABLED", "true") or "true").strip().lower() not in ("0", "false", "no", "off")
+    try:
+        ttl_s = float(_get_secret("DISK_CACHE_TTL_S", "21600") or 21600)
+        max_bytes = int(float(_get_secret("DISK_CACHE_MAX_MB", "2048") or 2048) * 1024 * 1024)
+        models_max_bytes = int(float(_get_secret("DISK_CACHE_MODELS_MAX_MB", "256") or 256) * 1024 * 1024)
+    except ValueError:
+        ttl_s, max_bytes, models_max_bytes = 21600.0, 2048 * 1024 * 1024, 256 * 1024 * 1024
+    return DiskCacheConfig(
+        enabled=enabled,
+        path=_get_secret("DISK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "lending-ops-dashboard")) or "",
+        ttl_s=ttl_s,
+        max_bytes=max_bytes,
+        models_max_bytes=models_max_bytes,
+    )
+
+
+def load_memo_config() -> MemoConfig:
+    # Limites do cache em memória de frames/KPIs por filtro (compartilhado entre sessões)
+    try:
+        max_entries = int(_get_secret("MEMO_MAX_ENTRIES", "256") or 256)
+        max_bytes = int(float(_get_secret("MEMO_MAX_MB", "512") or 512) * 1024 * 1024)
+    except ValueError:
+        max_entries, max_bytes = 256, 512 * 1024 * 1024
+    return MemoConfig(max_entries=max_entries, max_bytes=max_bytes)
+
+
+def load_query_cache_config() -> QueryCacheConfig:
+    # Cache de resultados do warehouse compartilhado entre sessões (mesma SQL = uma consulta)
+    enabled = (_get_secret("QUERY_CACHE_ENABLED", "true") or "true").strip().lower() not in ("0", "false", "no", "off")
+    try:
+        ttl_s = float(_get_secret("QUERY_CACHE_TTL_S", "300") or 300)
+        max_bytes = int(float(_get_secret("QUERY_CACHE_MAX_MB", "1024") or 1024) * 1024 * 1024)
+    except ValueError:
+        ttl_s, max_bytes = 300.0, 1024 * 1024 * 1024
+    return QueryCacheConfig(enabled=enabled, ttl_s=ttl_s, max_bytes=max_bytes)
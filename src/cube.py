@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .data_access import DataSource
+from .filters import TICKET_DIMENSIONS, TableIndex, date_bounds, filter_positions
+from .instrumentation import span, traced
+from .metrics import TicketAggregates, ticket_aggregates_from_sums
+from .query_builder import TABLE_COLUMNS
+
+
+# Medidas somáveis por célula; médias são recompostas como soma/contagem
+# (mesmas colunas das consultas agregadas do warehouse, ver query_builder).
+MEASURES = ["tickets", "backlog", "fcr_sum", "fcr_n", "reopen_sum", "reopen_n", "ait_sum", "ait_n", "tnps_sum", "tnps_n"]
+# Contagens de não nulos de flags: só entram nas células quando há nulos; senão
+# são iguais a `tickets` e ocupariam memória à toa
+OPTIONAL_COUNTS = ("fcr_n", "reopen_n")
+# Medidas lidas de cada abertura de `ticket_aggregates_from_sums`
+_CATEGORIA_MEASURES = ["tickets", "fcr_sum", "fcr_n"]
+_CONVENIO_MEASURES = ["tickets", "ait_sum", "ait_n", "tnps_sum", "tnps_n"]
+
+
+def ticket_cells(tickets: pd.DataFrame) -> pd.DataFrame:
+    """Medidas de cada ticket no formato de célula (dia + dimensões + MEASURES), sem agrupar.
+
+    Contagens e somas de flags (0/1) são int32; só AIT e tNPS somam em float64.
+    """
+    dims = [col for col in TICKET_DIMENSIONS.values() if col in tickets.columns]
+    measures = pd.DataFrame({
+        "day": pd.to_datetime(tickets["timestamp"]).dt.floor("D"),
+        **{col: tickets[col].astype("category") for col in dims},
+        "tickets": np.ones(len(tickets), dtype=np.int32),
+        "backlog": (tickets["reopen"] == 1).to_numpy(dtype=np.int32),
+    })
+    for col, prefix in (("fcr", "fcr"), ("reopen", "reopen")):
+        values = tickets[col].astype("float64")
+        measures[f"{prefix}_sum"] = values.fillna(0.0).to_numpy(dtype=np.int32)
+        valid = values.notna().to_numpy()
+        if not valid.all():
+            measures[f"{prefix}_n"] = valid.astype(np.int32)
+    for col, prefix in (("ait_min", "ait"), ("tnps", "tnps")):
+        values = tickets[col].astype("float64")
+        measures[f"{prefix}_sum"] = values.fillna(0.0).to_numpy()
+        measures[f"{prefix}_n"] = values.notna().to_numpy(dtype=np.int32)
+    return measures
+
+
+def cell_measures(cells: pd.DataFrame) -> list:
+    """Medidas presentes nas células (sem as contagens opcionais omitidas), na ordem de MEASURES."""
+    return [col for col in MEASURES if col in cells.columns]
+
+
+def align_counts(parts: list) -> list:
+    """Preenche contagens opcionais ausentes em alguns rollups parciais com `tickets`."""
+    present = {col for part in parts for col in OPTIONAL_COUNTS if col in part.columns}
+    return [
+        part.assign(**{col: part["tickets"] for col in present if col not in part.columns})
+        for part in parts
+    ]
+
+
+def rollup_cells(cells: pd.DataFrame) -> pd.DataFrame:
+    """Soma células com a mesma chave (dia + dimensões); somas são associativas, então
+    rollups parciais (ex.: por bloco) podem ser combinados com outro rollup.
+
+    Dia e códigos das dimensões são empacotados num único int64 e as medidas somadas
+    com `np.bincount`: bem menos memória intermediária que um groupby de várias chaves.
+    Mesma ordem do groupby (dia, depois códigos das categorias; ausentes por último).
+    """
+    measures = cell_measures(cells)
+    keys = [col for col in cells.columns if col not in MEASURES]
+    dims = [col for col in keys if col != "day"]
+    if len(cells) == 0 or not all(isinstance(cells[col].dtype, pd.CategoricalDtype) for col in dims):
+        return _groupby_sum(cells, keys, measures)
+
+    days = cells["day"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+    first_day = int(days.min())
+    radices = [int(days.max()) - first_day + 1]
+    codes = [days - first_day]
+    for col in dims:
+        n_cats = len(cells[col].cat.categories)
+        c = cells[col].cat.codes.to_numpy().astype(np.int64)
+        codes.append(np.where(c < 0, n_cats, c))  # ausente = último código
+        radices.append(n_cats + 1)
+    if float(np.prod(radices, dtype=np.float64)) >= 2**62:
+        return _groupby_sum(cells, keys, measures)
+
+    packed = codes[0]
+    for c, radix in zip(codes[1:], radices[1:]):
+        packed = packed * radix + c
+    unique, inverse = np.unique(packed, return_inverse=True)
+
+    out = {}
+    rest = unique
+    for col, radix in zip(reversed(dims), reversed(radices[1:])):
+        rest, c = np.divmod(rest, radix)
+        cats = cells[col].cat.categories
+        out[col] = pd.Categorical.from_codes(np.where(c == len(cats), -1, c), dtype=cells[col].dtype)
+    day = (rest + first_day).astype("datetime64[D]").astype("datetime64[ns]")
+    rolled = pd.DataFrame({"day": day, **{col: out[col] for col in dims}})
+    for col in measures:
+        sums = np.bincount(inverse, weights=cells[col].to_numpy(dtype=np.float64), minlength=len(unique))
+        rolled[col] = sums.astype(cells[col].dtype) if pd.api.types.is_integer_dtype(cells[col].dtype) else sums
+    return rolled
+
+
+def _groupby_sum(cells: pd.DataFrame, keys: list, measures: list) -> pd.DataFrame:
+    rolled = cells.groupby(keys, observed=True, dropna=False, sort=True)[measures].sum().reset_index()
+    return rolled.astype({col: cells[col].dtype for col in measures})
+
+
+class CubeBuilder:
+    """Monta um `DailyCube` a partir de blocos de tickets, com memória limitada.
+
+    Cada bloco vira um rollup parcial; quando os parciais pendentes passam de
+    `compact_rows` linhas, eles são combinados num só. O pico de memória fica
+    proporcional ao número de células (dias × combinações de dimensões) mais um
+    bloco, e não ao total de tickets lidos.
+    """
+
+    def __init__(self, compact_rows: int = 1_000_000):
+        self.compact_rows = compact_rows
+        self.rows_read = 0
+        self._parts: list = []
+        self._pending_rows = 0
+
+    def add(self, tickets: pd.DataFrame) -> None:
+        if len(tickets) == 0:
+            return
+        self.rows_read += len(tickets)
+        self.add_cells(rollup_cells(ticket_cells(tickets)))
+
+    def add_cells(self, part: pd.DataFrame) -> None:
+        """Acrescenta um rollup já pronto (ex.: células de um cubo anterior)."""
+        if len(part) == 0:
+            return
+        self._parts.append(part)
+        self._pending_rows += len(part)
+        if self._pending_rows > self.compact_rows and len(self._parts) > 1:
+            self._compact()
+
+    def _compact(self) -> None:
+        self._parts = [rollup_cells(concat_cells(align_counts(self._parts)))]
+        self._pending_rows = len(self._parts[0])
+
+    def build(self) -> "DailyCube":
+        if not self._parts:
+            # Sem blocos: cubo vazio com todas as dimensões (categóricas vazias), para que
+            # agrupamentos por canal/categoria/convênio devolvam frames vazios, não KeyError
+            return DailyCube.from_tickets(pd.DataFrame(columns=TABLE_COLUMNS["tickets"]))
+        self._compact()
+        return DailyCube(self._parts[0])
+
+
+def concat_cells(parts: list) -> pd.DataFrame:
+    """Concatena rollups parciais mantendo dimensões como category.
+
+    `pd.concat` de categóricas com categorias diferentes (comum entre blocos) cai
+    para object, que custa várias vezes mais memória; `union_categoricals` une os
+    dicionários e mantém códigos inteiros.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    columns = {}
+    for col in parts[0].columns:
+        values = [p[col] for p in parts]
+        if all(isinstance(v.dtype, pd.CategoricalDtype) for v in values):
+            columns[col] = pd.api.types.union_categoricals(values)
+        else:
+            columns[col] = pd.concat(values, ignore_index=True)
+    return pd.DataFrame({col: np.asarray(v) if not isinstance(v, pd.Categorical) else v for col, v in columns.items()})
+
+
+class DailyCube:
+    """Rollup dia × canal × produto × convênio × segmento × UF × prioridade × categoria.
+
+    Cada célula guarda contagens e somas de fcr, reopen, ait_min e tnps. Qualquer
+    combinação de filtros é respondida somando as células que casam, então KPIs e
+    séries custam proporcional ao número de células do período, não ao de tickets,
+    e as médias continuam exatas (soma/contagem). Valores ausentes de dimensão
+    (ex.: convênio fora do Consignado) viram células próprias, como nas linhas brutas.
+
+    As somas por grupo usam `np.bincount` sobre as posições selecionadas (dia e
+    códigos das dimensões já em inteiros), sem montar o frame das células do recorte.
+    """
+
+    def __init__(self, cells: pd.DataFrame):
+        self.cells = cells
+        self.index = TableIndex(cells, "day", TICKET_DIMENSIONS)
+        self.measures = cell_measures(cells)
+        # Arrays por posição original das células (o índice guarda a ordem por tempo)
+        self._days = cells["day"].to_numpy(dtype="datetime64[D]").astype(np.int64)
+        self._arrays = {col: cells[col].to_numpy() for col in self.measures}
+
+    @classmethod
+    def from_tickets(cls, tickets: pd.DataFrame) -> "DailyCube":
+        return cls(rollup_cells(ticket_cells(tickets)))
+
+    def cells_before(self, day: pd.Timestamp) -> pd.DataFrame:
+        """Células dos dias anteriores a `day` (base para refazer só os dias seguintes)."""
+        return self.cells[self.cells["day"] < day].reset_index(drop=True)
+
+    def positions(self, filters: dict) -> np.ndarray:
+        """Posições das células que casam com os filtros (período por dia, inclusive nas duas pontas)."""
+        start, end = date_bounds(filters)
+        selections = {key: filters.get(key, []) for key in TICKET_DIMENSIONS}
+        return self.index.positions(start, end, selections)
+
+    def _codes(self, dimension: str) -> np.ndarray:
+        return self.cells[dimension].cat.codes.to_numpy()
+
+    def _sum_by(
+        self,
+        positions: np.ndarray,
+        by_day: bool,
+        dimension: Optional[str] = None,
+        measures: Sequence[str] = MEASURES,
+    ) -> pd.DataFrame:
+        """Somas de `measures` nas células `positions` (crescentes), por dia e/ou `dimension`.
+
+        Só grupos com tickets saem no resultado (como `groupby(observed=True)`), em
+        ordem de dia e código da categoria; contagens opcionais omitidas nas células
+        saem iguais a `tickets`, no formato das consultas agregadas.
+        """
+        stored = ["tickets", *(col for col in measures if col != "tickets" and col in self._arrays)]
+        if by_day and dimension is None and self.index.order is None and len(positions):
+            # Células ordenadas por dia: soma por faixas contíguas, sem bincount
+            days = self._days[positions]
+            starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+            sums = {
+                col: np.add.reduceat(self._take(col, positions), starts, dtype=np.float64 if col in ("ait_sum", "tnps_sum") else np.int64)
+                for col in stored
+            }
+            used = np.flatnonzero(sums["tickets"] > 0)
+            out = {"timestamp": days[starts].astype("datetime64[D]").astype("datetime64[ns]")[used]}
+        else:
+            n_groups, first_day, n_cats = 1, 0, 1
+            if dimension is not None:
+                codes = self._codes(dimension)[positions].astype(np.int64)
+                keep = codes >= 0
+                if not keep.all():
+                    positions, codes = positions[keep], codes[keep]
+                n_cats = len(self.cells[dimension].cat.categories)
+            group = np.zeros(len(positions), dtype=np.int64)
+            if by_day and len(positions):
+                days = self._days[positions]
+                first_day = int(days.min())
+                n_groups = int(days.max()) - first_day + 1
+                group = days - first_day
+            if dimension is not None:
+                group = group * n_cats + codes
+                n_groups *= n_cats
+            sums = {col: np.bincount(group, weights=self._take(col, positions), minlength=n_groups) for col in stored}
+            used = np.flatnonzero(sums["tickets"] > 0)
+            out = {}
+            if by_day:
+                out["timestamp"] = (used // n_cats + first_day).astype("datetime64[D]").astype("datetime64[ns]")
+            if dimension is not None:
+                out[dimension] = pd.Categorical.from_codes(used % n_cats, dtype=self.cells[dimension].dtype)
+
+        for col in measures:
+            values = sums.get(col, sums["tickets"])[used]
+            out[col] = values.astype(np.float64) if col in ("ait_sum", "tnps_sum") else values.astype(np.int64)
+        return pd.DataFrame(out)
+
+    def _take(self, col: str, positions: np.ndarray) -> np.ndarray:
+        values = self._arrays[col]
+        if len(positions) and positions[-1] - positions[0] + 1 == len(positions):
+            return values[positions[0]:positions[-1] + 1]  # faixa contígua: view, sem cópia
+        return values[positions]
+
+    def aggregates(self, filters: dict, jobs_total: int) -> TicketAggregates:
+        positions = self.positions(filters)
+        daily_sums = self._sum_by(positions, by_day=True)
+        categoria_sums = self._sum_by(positions, by_day=False, dimension="categoria", measures=_CATEGORIA_MEASURES)
+        consignado = self.cells["produto"].cat.categories.get_indexer(["Consignado"])[0]
+        on_consignado = positions[self._codes("produto")[positions] == consignado] if consignado >= 0 else positions[:0]
+        convenio_sums = self._sum_by(on_consignado, by_day=False, dimension="convenio", measures=_CONVENIO_MEASURES)
+        return ticket_aggregates_from_sums(daily_sums, categoria_sums, convenio_sums, jobs_total)
+
+    def daily_group_sums(self, filters: dict, dimension: str) -> pd.DataFrame:
+        """Somas por dia × dimensão (mesmo formato de `build_ticket_daily_group_sums`)."""
+        return self._sum_by(self.positions(filters), by_day=True, dimension=dimension)
+
+
+def get_cube(ds: DataSource) -> DailyCube:
+    """Cubo do DataSource, construído uma vez (por versão dos dados) e guardado no objeto."""
+    if ds.cube is None:
+        with span("cube.build") as s:
+            ds.cube = DailyCube.from_tickets(ds.tickets)
+            s.set(rows=len(ds.cube.cells), tickets=len(ds.tickets))
+    return ds.cube
+
+
+@traced("cube.cube_aggregates")
+def cube_aggregates(ds: DataSource, filters: dict, jobs_total: Optional[int] = None) -> TicketAggregates:
+    """KPIs e séries de tickets a partir do cubo, sem tocar nas linhas brutas."""
+    if jobs_total is None:
+        jobs_total = len(filter_positions(ds, "jobs", filters))
+    return get_cube(ds).aggregates(filters, jobs_total)
+
+
+@traced("cube.cube_daily_group_sums")
+def cube_daily_group_sums(ds: DataSource, filters: dict, dimension: str) -> pd.DataFrame:
+    """Séries diárias por valor de `dimension`, a partir do cubo."""
+    return get_cube(ds).daily_group_sums(filters, dimension)
@@ -1,12 +1,113 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Optional
+import contextvars
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 
 from .config import DatabricksConfig
 from .databricks_client import run_query
+from .disk_cache import get_disk_cache, query_key
+from .instrumentation import frame_size, span, traced
+from .metrics import TicketAggregates, ticket_aggregates_from_sums
 from .mock_data import generate_mock_tickets, generate_mock_jobs, generate_mock_product_metrics
+from .query_builder import (
+    TABLE_COLUMNS,
+    TIME_COLUMNS,
+    build_count,
+    build_select,
+    build_ticket_daily_group_sums,
+    build_ticket_daily_sums,
+    build_ticket_group_sums,
+    build_ticket_quantiles,
+    build_watermark,
+)
+
+
+# Tempo máximo de espera pelas consultas paralelas de carga
+LOAD_TIMEOUT_S = 300.0
+
+# Nomes lógicos das tabelas = atributos de DataSource
+TABLES = ("tickets", "jobs", "product_metrics")
+
+
+@dataclass
+class TableLoad:
+    name: str
+    seconds: float
+    rows: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class LoadReport:
+    """Tempo, linhas e erro (se houver) de cada consulta de uma carga paralela."""
+    tables: Dict[str, TableLoad] = field(default_factory=dict)
+
+    @property
+    def failed(self) -> List[str]:
+        return [name for name, t in self.tables.items() if t.error]
+
+    @property
+    def wall_seconds(self) -> float:
+        return max((t.seconds for t in self.tables.values()), default=0.0)
+
+
+# Tipos compactos por coluna, aplicados na carga (ver normalize_schema):
+# - category: dimensões de baixa cardinalidade
+# - flag: 0/1 -> int8
+# - int: downcast para o menor inteiro que comporta os valores
+# - float: float32 só quando todos os valores sobrevivem exatos à ida e volta float64 -> float32
+SCHEMA: Dict[str, Dict[str, str]] = {
+    "tickets": {
+        "ticket_id": "int",
+        "canal": "category",
+        "produto": "category",
+        "convenio": "category",
+        "segmento": "category",
+        "estado": "category",
+        "prioridade": "category",
+        "categoria": "category",
+        "fcr": "flag",
+        "reopen": "flag",
+        "ait_min": "float",
+        "tnps": "float",
+    },
+    "jobs": {"job": "category", "status": "category", "duration_s": "int"},
+    "product_metrics": {
+        "product": "category",
+        "applications": "int",
+        "approvals": "int",
+        "conversions": "int",
+        "eligibility_rate": "float",
+    },
+}
+
+
+@dataclass
+class SchemaReport:
+    table: str
+    bytes_before: int
+    bytes_after: int
+
+    @property
+    def ratio(self) -> float:
+        return self.bytes_before / self.bytes_after if self.bytes_after else 1.0
+
+
+@dataclass(frozen=True)
+class TableWatermark:
+    """Metadados de versão de uma tabela: número de linhas e maior valor da coluna temporal.
+
+    `min_time` (lido junto no warehouse) dá o início do período disponível; não entra na versão.
+    """
+    rows: int
+    max_time: Optional[pd.Timestamp]
+    min_time: Optional[pd.Timestamp] = None
 
 
 @dataclass
@@ -14,30 +115,427 @@ class DataSource:
     tickets: pd.DataFrame
     jobs: pd.DataFrame
     product_metrics: pd.DataFrame
+    load_report: Optional[LoadReport] = None
+    version: str = ""
+    refreshed_at: Optional[pd.Timestamp] = None
+    schema_report: Dict[str, SchemaReport] = field(default_factory=dict)
+    # Linhas e watermark por tabela (no modo Databricks, a base guarda só isto)
+    watermarks: Dict[str, TableWatermark] = field(default_factory=dict)
+    # Visões do warehouse: watermarks da base na leitura (ponto de partida do refresh incremental)
+    source_watermarks: Dict[str, TableWatermark] = field(default_factory=dict)
+    # Índice de filtros (src.filters.FilterIndex), construído sob demanda uma vez por DataSource
+    filter_index: Optional[Any] = field(default=None, repr=False, compare=False)
+    # Cubo diário pré-agregado (src.cube.DailyCube), idem
+    cube: Optional[Any] = field(default=None, repr=False, compare=False)
+    # Catálogo de dimensões da sidebar (src.catalog.DimensionCatalog), idem
+    catalog: Optional[Any] = field(default=None, repr=False, compare=False)
+    # Sketches de quantis de AIT/tNPS (src.sketch.QuantileSketches), idem
+    sketches: Optional[Any] = field(default=None, repr=False, compare=False)
+
+
+def compute_data_version(tickets: pd.DataFrame, jobs: pd.DataFrame, product: pd.DataFrame) -> str:
+    """Identificador curto da versão dos dados (linhas + watermark por tabela).
+
+    Muda sempre que uma carga/refresh traz linhas novas; serve de chave para caches
+    que dependem do conteúdo do `DataSource`.
+    """
+    return watermark_version(frame_watermarks({"tickets": tickets, "jobs": jobs, "product_metrics": product}))
+
+
+def frame_watermarks(frames: Dict[str, pd.DataFrame]) -> Dict[str, TableWatermark]:
+    return {name: TableWatermark(rows=len(df), max_time=table_watermark(name, df)) for name, df in frames.items()}
+
+
+def watermark_version(watermarks: Dict[str, TableWatermark]) -> str:
+    """Hash curto dos metadados de versão (mesmo formato para frames em memória e warehouse)."""
+    parts = []
+    for name in TABLES:
+        parts.append(f"{name}:{_watermark_key(watermarks.get(name, TableWatermark(rows=0, max_time=None)))}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def table_watermark(table: str, df: pd.DataFrame) -> Optional[pd.Timestamp]:
+    """Maior valor da coluna temporal da tabela (None se vazia)."""
+    col = TIME_COLUMNS[table]
+    if col not in df.columns or len(df) == 0:
+        return None
+    wm = pd.to_datetime(df[col]).max()
+    return None if pd.isna(wm) else pd.Timestamp(wm)
+
+
+@traced("data_access.make_data_source")
+def make_data_source(
+    tickets: pd.DataFrame,
+    jobs: pd.DataFrame,
+    product: pd.DataFrame,
+    load_report: Optional[LoadReport] = None,
+) -> DataSource:
+    frames = {}
+    schema_report = {}
+    for table, df in (("tickets", tickets), ("jobs", jobs), ("product_metrics", product)):
+        df, schema_report[table] = normalize_schema(table, normalize_time_column(table, df))
+        frames[table] = df
+    watermarks = frame_watermarks(frames)
+    return DataSource(
+        tickets=frames["tickets"],
+        jobs=frames["jobs"],
+        product_metrics=frames["product_metrics"],
+        load_report=load_report,
+        version=watermark_version(watermarks),
+        refreshed_at=pd.Timestamp.now(tz="UTC"),
+        schema_report=schema_report,
+        watermarks=watermarks,
+    )
+
+
+def _compact_column(values: pd.Series, kind: str) -> pd.Series:
+    if kind == "category":
+        return values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype("category")
+    if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return values
+    if kind == "flag":
+        if values.isna().any() or not values.isin([0, 1]).all():
+            return values
+        return values.astype("int8")
+    if kind == "int":
+        if values.isna().any() or not pd.api.types.is_integer_dtype(values):
+            return values
+        return pd.to_numeric(values, downcast="integer")
+    if kind == "float":
+        if values.dtype == "float32":
+            return values
+        compact = values.astype("float32")
+        # Só aceita float32 se cada valor volta idêntico ao float64 original (ex.: centavos
+        # acima de 2^24 perdem dígitos em float32 e mantêm a coluna em float64)
+        if not np.array_equal(compact.to_numpy(dtype="float64"), values.to_numpy(dtype="float64"), equal_nan=True):
+            return values
+        return compact
+    return values
+
+
+def normalize_schema(table: str, df: pd.DataFrame) -> Tuple[pd.DataFrame, SchemaReport]:
+    """Converte as colunas de `SCHEMA[table]` para tipos compactos e mede a memória.
+
+    Dimensões viram `category` (códigos inteiros + dicionário), flags 0/1 viram int8,
+    inteiros são reduzidos e métricas viram float32 quando a conversão é exata. Colunas fora do
+    esperado (ex.: flag com NaN) ficam como estão.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    converted = {}
+    for col, kind in SCHEMA.get(table, {}).items():
+        if col in df.columns:
+            original = df[col]
+            compact = _compact_column(original, kind)
+            if compact is not original:
+                converted[col] = compact
+    if converted:
+        df = df.assign(**converted)
+    after = int(df.memory_usage(deep=True).sum()) if converted else before
+    return df, SchemaReport(table=table, bytes_before=before, bytes_after=after)
+
+
+def run_concurrently(
+    tasks: Dict[str, Callable[[], Any]],
+    timeout_s: float = LOAD_TIMEOUT_S,
+) -> Tuple[Dict[str, Any], LoadReport]:
+    """Executa tarefas independentes em paralelo (threads; o trabalho é I/O no warehouse).
+
+    Retorna (resultados, relatório). Tarefas que falham ou estouram `timeout_s` ficam
+    fora de `resultados` e aparecem em `report.failed` com a mensagem de erro.
+    """
+    report = LoadReport()
+    results: Dict[str, Any] = {}
+    started = time.perf_counter()
 
+    def _timed(fn: Callable[[], Any]) -> Tuple[Any, float, Optional[str]]:
+        t0 = time.perf_counter()
+        try:
+            return fn(), time.perf_counter() - t0, None
+        except Exception as exc:
+            return None, time.perf_counter() - t0, f"{type(exc).__name__}: {exc}"
 
-def load_all_data(use_databricks: bool, cfg: Optional[DatabricksConfig] = None) -> DataSource:
+    executor = ThreadPoolExecutor(max_workers=max(1, len(tasks)), thread_name_prefix="load")
+    try:
+        # copy_context: spans de instrumentação abertos nas threads entram no rerun corrente
+        futures = {executor.submit(contextvars.copy_context().run, _timed, fn): name for name, fn in tasks.items()}
+        done, _ = wait(futures, timeout=timeout_s)
+        for future, name in futures.items():
+            if future not in done:
+                elapsed = time.perf_counter() - started
+                report.tables[name] = TableLoad(name=name, seconds=elapsed, error=f"timeout após {timeout_s:.0f}s")
+                continue
+            result, seconds, error = future.result()
+            rows = len(result) if error is None and hasattr(result, "__len__") else 0
+            report.tables[name] = TableLoad(name=name, seconds=seconds, rows=rows, error=error)
+            if error is None:
+                results[name] = result
+    finally:
+        # Não bloqueia em tarefas que estouraram o timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results, report
+
+
+def _table_name(table: str, cfg: DatabricksConfig) -> str:
+    return {
+        "tickets": cfg.table_tickets,
+        "jobs": cfg.table_jobs,
+        "product_metrics": cfg.table_product_metrics,
+    }[table]
+
+
+def load_table(
+    table: str,
+    cfg: DatabricksConfig,
+    filters: Optional[dict] = None,
+    watermark: Optional[TableWatermark] = None,
+) -> pd.DataFrame:
+    """Lê uma tabela lógica do warehouse (com filtros/projeção) e normaliza datas.
+
+    Com `watermark` (metadados de versão da tabela, ver `load_watermarks`), o extrato
+    passa pelo cache Parquet em disco (ver `src.disk_cache`), que sobrevive a restarts
+    e é compartilhado por réplicas no mesmo volume. O watermark entra na chave: linhas
+    novas na tabela geram outra entrada em vez de servir um recorte desatualizado.
+    Sem ele não há como saber se o extrato em disco ainda vale, então o disco é ignorado.
+    O watermark também entra na chave do cache de consultas do processo.
+    """
+    with span("data_access.load_table", table=table) as s:
+        sql_text, params = build_select(table, _table_name(table, cfg), filters)
+        version = _watermark_key(watermark) if watermark is not None else ""
+        cache = get_disk_cache() if watermark is not None else None
+        key = query_key(sql_text, params, version=version) if cache is not None else ""
+        df = cache.get(table, key) if cache is not None else None
+        s.set(disk_cache_hit=df is not None)
+        if df is None:
+            df = run_query(sql_text, params, cfg=cfg, version=version)
+            if cache is not None:
+                try:
+                    cache.put(table, key, df, time_column=TIME_COLUMNS[table])
+                except OSError:
+                    pass  # cache é best-effort (disco cheio/sem permissão)
+
+        df = normalize_time_column(table, df)
+        rows, nbytes = frame_size(df)
+        s.set(rows=rows, bytes=nbytes)
+        return df
+
+
+def _watermark_key(watermark: TableWatermark) -> str:
+    return f"{watermark.rows}:{watermark.max_time.isoformat() if watermark.max_time is not None else '-'}"
+
+
+def can_extend(previous: Optional[TableWatermark], current: TableWatermark) -> bool:
+    """As mudanças entre os dois watermarks são só linhas novas a partir de `previous.max_time`?
+
+    Tabela que encolheu ou cujo último registro voltou no tempo foi reescrita: nesse
+    caso (ou sem watermark anterior) o recorte precisa ser relido inteiro.
+    """
+    return (
+        previous is not None
+        and previous.max_time is not None
+        and current.max_time is not None
+        and current.rows >= previous.rows
+        and current.max_time >= previous.max_time
+    )
+
+
+def load_table_since(
+    table: str,
+    cfg: DatabricksConfig,
+    filters: Optional[dict],
+    since: pd.Timestamp,
+    watermark: TableWatermark,
+) -> pd.DataFrame:
+    """Só as linhas do recorte com coluna temporal >= `since` (refresh incremental)."""
+    with span("data_access.load_table_since", table=table) as s:
+        sql_text, params = build_select(table, _table_name(table, cfg), filters, since=since)
+        df = normalize_time_column(table, run_query(sql_text, params, cfg=cfg, version=_watermark_key(watermark)))
+        s.set(rows=len(df))
+        return df
+
+
+def merge_since(table: str, frame: pd.DataFrame, delta: pd.DataFrame, since: pd.Timestamp) -> pd.DataFrame:
+    """Troca as linhas de `frame` a partir de `since` pelas de `delta`, relidas do warehouse.
+
+    `since` é inclusivo nas duas leituras, então linhas no próprio instante do watermark
+    anterior não duplicam. Linhas sem tempo (NaT) ficam, pois nunca casam com `since`.
+    """
+    col = TIME_COLUMNS[table]
+    keep = frame[~(frame[col] >= since)] if col in frame.columns else frame
+    if len(delta) == 0:
+        return keep
+    return normalize_time_column(table, pd.concat([keep, delta], ignore_index=True))
+
+
+def refresh_table(view: DataSource, table: str, cfg: DatabricksConfig, filters: Optional[dict], watermark: TableWatermark) -> pd.DataFrame:
+    """Frame de `table` da visão atualizado para `watermark`.
+
+    Se a tabela só cresceu desde o watermark em que a visão foi lida, busca apenas as
+    linhas novas (`since`) e as junta ao frame; senão relê o recorte inteiro.
+    """
+    previous = view.source_watermarks.get(table)
+    if not can_extend(previous, watermark):
+        return load_table(table, cfg, filters, watermark=watermark)
+    delta = load_table_since(table, cfg, filters, previous.max_time, watermark)
+    return merge_since(table, getattr(view, table), delta, previous.max_time)
+
+
+def changed_tables(view: DataSource, watermarks: Dict[str, TableWatermark]) -> List[str]:
+    """Tabelas cujo watermark mudou desde a leitura da visão."""
+    return [t for t in TABLES if t in watermarks and view.source_watermarks.get(t) != watermarks[t]]
+
+
+def source_after(view: DataSource, watermarks: Dict[str, TableWatermark], report: LoadReport) -> Dict[str, TableWatermark]:
+    """Watermarks de origem da visão atualizada: tabela que falhou mantém o anterior (e é refeita no próximo refresh)."""
+    out = {}
+    for t in TABLES:
+        wm = view.source_watermarks.get(t) if t in report.failed else watermarks.get(t, view.source_watermarks.get(t))
+        if wm is not None:
+            out[t] = wm
+    return out
+
+
+def normalize_time_column(table: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Converte a coluna temporal para datetime64 (datas truncadas ao dia) e ordena por ela.
+
+    Feito uma vez na carga, para que os filtros possam recortar o período por busca
+    binária sem reprocessar timestamps a cada rerun. Idempotente e barato quando o
+    frame já está normalizado.
+    """
+    col = TIME_COLUMNS[table]
+    if col not in df.columns:
+        return df
+    original = values = df[col]
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values)
+    if col == "date":
+        values = values.dt.floor("D")  # standardize to datetime
+    if values is not original:
+        df = df.assign(**{col: values})
+    if not df[col].is_monotonic_increasing:
+        df = df.sort_values(col, kind="stable", na_position="last")
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        df = df.reset_index(drop=True)
+    return df
+
+
+@traced("data_access.load_all_data")
+def load_all_data(
+    use_databricks: bool,
+    cfg: Optional[DatabricksConfig] = None,
+    filters: Optional[dict] = None,
+    watermarks: Optional[Dict[str, TableWatermark]] = None,
+) -> DataSource:
+    """Carrega tickets, jobs e métricas de produto.
+
+    No modo Databricks, `filters` (mesmo formato da sidebar) é empurrado para o
+    warehouse como WHERE parametrizado, junto com uma projeção explícita de colunas.
+    `watermarks` (da base, ver `load_watermarks`) habilita o cache em disco por tabela
+    e fica na visão como `source_watermarks`, ponto de partida do refresh incremental.
+    No modo mock, `filters` é ignorado: a base inteira fica em memória e cada recorte
+    sai do índice de filtros (`FilterIndex`, via `filter_positions` em `src.filters`),
+    construído uma vez por `DataSource`.
+    """
     if use_databricks:
         # Expecting table names in cfg
         assert cfg is not None
-        tickets = run_query(f"SELECT * FROM {cfg.table_tickets}")
-        jobs = run_query(f"SELECT * FROM {cfg.table_jobs}")
-        product = run_query(f"SELECT * FROM {cfg.table_product_metrics}")
-
-        # Normalize column names/time
-        if "timestamp" in tickets.columns:
-            tickets["timestamp"] = pd.to_datetime(tickets["timestamp"])
-        if "timestamp" in jobs.columns:
-            jobs["timestamp"] = pd.to_datetime(jobs["timestamp"])
-        if "date" in product.columns:
-            product["date"] = pd.to_datetime(product["date"]).dt.date
-            product["date"] = pd.to_datetime(product["date"])  # standardize to datetime
-        return DataSource(tickets=tickets, jobs=jobs, product_metrics=product)
+        # Tabelas independentes: consultas em paralelo; tabela que falhar vem vazia e fica no relatório
+        frames, report = run_concurrently({
+            t: (lambda t=t: load_table(t, cfg, filters, watermark=(watermarks or {}).get(t))) for t in TABLES
+        })
+        for t in TABLES:
+            if t not in frames:
+                frames[t] = pd.DataFrame(columns=TABLE_COLUMNS[t])
+        ds = make_data_source(frames["tickets"], frames["jobs"], frames["product_metrics"], load_report=report)
+        ds.source_watermarks = {t: wm for t, wm in (watermarks or {}).items() if t not in report.failed}
+        return ds
 
     # Fallback: mock data
     tickets = generate_mock_tickets()
     jobs = generate_mock_jobs()
     product = generate_mock_product_metrics()
-    return DataSource(tickets=tickets, jobs=jobs, product_metrics=product)
+    return make_data_source(tickets, jobs, product)
+
+
+@traced("data_access.load_watermarks")
+def load_watermarks(cfg: DatabricksConfig, previous: Optional[Dict[str, TableWatermark]] = None) -> DataSource:
+    """Base do modo Databricks: só `COUNT(*)` e `MIN`/`MAX` da coluna temporal de cada tabela.
+
+    Nenhuma linha é baixada; o `DataSource` tem frames vazios e a versão vem dos
+    metadados, então muda exatamente quando chegam linhas novas. As visões filtradas
+    são buscadas sob demanda com essa versão na chave. Tabela cuja consulta falhar
+    mantém o metadado de `previous` (se houver) e aparece no relatório.
+    """
+    queries = {t: build_watermark(t, _table_name(t, cfg)) for t in TABLES}
+    # Fora do cache de consultas: o resultado depende do instante, não da SQL
+    results, report = run_concurrently({t: (lambda q=q: run_query(*q, cfg=cfg, cache=False)) for t, q in queries.items()})
+    previous = previous or {}
+    watermarks = {}
+    for t in TABLES:
+        if t not in results:
+            watermarks[t] = previous.get(t, TableWatermark(rows=0, max_time=None))
+            continue
+        row = results[t]
+        watermarks[t] = TableWatermark(
+            rows=int(row["n"].iloc[0]) if len(row) else 0,
+            max_time=_first_timestamp(row, "max_time"),
+            min_time=_first_timestamp(row, "min_time"),
+        )
+    empty = {t: normalize_time_column(t, pd.DataFrame(columns=TABLE_COLUMNS[t])) for t in TABLES}
+    return DataSource(
+        tickets=empty["tickets"],
+        jobs=empty["jobs"],
+        product_metrics=empty["product_metrics"],
+        load_report=report,
+        version=watermark_version(watermarks),
+        refreshed_at=pd.Timestamp.now(tz="UTC"),
+        watermarks=watermarks,
+    )
+
+
+def _first_timestamp(row: pd.DataFrame, col: str) -> Optional[pd.Timestamp]:
+    if col not in row.columns or len(row) == 0 or pd.isna(row[col].iloc[0]):
+        return None
+    return pd.Timestamp(row[col].iloc[0])
+
+
+@traced("data_access.load_ticket_aggregates")
+def load_ticket_aggregates(cfg: DatabricksConfig, filters: Optional[dict] = None, version: str = "") -> TicketAggregates:
+    """Modo agregado: KPIs e séries de tickets calculados via GROUP BY no warehouse.
+
+    Devolve apenas frames pequenos (um registro por dia/categoria/convênio), no mesmo
+    formato de `compute_ticket_aggregates`, que continua sendo o caminho dos dados mock.
+    `version` (versão da base) entra na chave do cache de consultas.
+    """
+    queries = {
+        "daily": build_ticket_daily_sums(cfg.table_tickets, filters),
+        "categoria": build_ticket_group_sums(cfg.table_tickets, "categoria", filters),
+        "convenio": build_ticket_group_sums(cfg.table_tickets, "convenio", filters, condition="`produto` = 'Consignado'"),
+        "jobs": build_count("jobs", cfg.table_jobs, filters),
+    }
+    results, report = run_concurrently({name: (lambda q=q: run_query(*q, cfg=cfg, version=version)) for name, q in queries.items()})
+    if report.failed:
+        # Sem todos os agregados não há KPI consistente: propaga o primeiro erro
+        first = report.tables[report.failed[0]]
+        raise RuntimeError(f"Falha na consulta agregada '{first.name}': {first.error}")
+    daily_sums, categoria_sums, convenio_sums, jobs_count = (results[k] for k in ("daily", "categoria", "convenio", "jobs"))
+    jobs_total = int(jobs_count["n"].iloc[0]) if len(jobs_count) else 0
+    return ticket_aggregates_from_sums(daily_sums, categoria_sums, convenio_sums, jobs_total)
+
+
+def load_ticket_daily_group_sums(cfg: DatabricksConfig, filters: Optional[dict], dimension: str, version: str = "") -> pd.DataFrame:
+    """Modo agregado: somas de tickets por dia × `dimension` via GROUP BY no warehouse."""
+    return run_query(*build_ticket_daily_group_sums(cfg.table_tickets, dimension, filters), cfg=cfg, version=version)
 
 
+def load_ticket_quantiles(
+    cfg: DatabricksConfig,
+    filters: Optional[dict],
+    column: str,
+    quantiles: Tuple[float, ...],
+    dimension: Optional[str] = None,
+    condition: Optional[str] = None,
+    version: str = "",
+) -> pd.DataFrame:
+    """Modo agregado: percentis de `column` (total ou por `dimension`) via `PERCENTILE_APPROX`."""
+    sql_text, params = build_ticket_quantiles(cfg.table_tickets, column, quantiles, dimension, filters, condition)
+    return run_query(sql_text, params, cfg=cfg, version=version)
@@ -1,11 +1,25 @@
 from __future__ import annotations
 
 import contextlib
-from typing import Any, Dict, Iterable, Optional
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import pandas as pd
 
-from .config import DatabricksConfig, load_databricks_config, is_databricks_configured
+from .config import (
+    DatabricksConfig,
+    QueryCacheConfig,
+    is_databricks_configured,
+    load_databricks_config,
+    load_query_cache_config,
+)
+from .instrumentation import span, traced
+from .memo import estimate_bytes
 
 
 def _connect(cfg: Optional[DatabricksConfig] = None):
@@ -22,29 +36,417 @@ def _connect(cfg: Optional[DatabricksConfig] = None):
     )
 
 
-def run_query(sql_text: str, params: Optional[Dict[str, Any]] = None, cfg: Optional[DatabricksConfig] = None) -> pd.DataFrame:
+# Pool de conexões por processo (compartilhado entre sessões do Streamlit)
+POOL_MAX_SIZE = 8
+POOL_IDLE_TIMEOUT_S = 600.0
+POOL_HEALTH_CHECK_AFTER_S = 60.0
+
+
+class ConnectionPool:
+    """Pool de conexões reutilizáveis para um SQL Warehouse.
+
+    - `max_size`: máximo de conexões abertas ao mesmo tempo; chamadas excedentes aguardam.
+    - `idle_timeout_s`: conexões ociosas por mais tempo que isso são fechadas (evicção).
+    - `health_check_after_s`: conexões ociosas por mais tempo que isso passam por um
+      `SELECT 1` antes de serem reutilizadas; as que falham são descartadas.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        max_size: int = POOL_MAX_SIZE,
+        idle_timeout_s: float = POOL_IDLE_TIMEOUT_S,
+        health_check_after_s: float = POOL_HEALTH_CHECK_AFTER_S,
+    ):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout_s = idle_timeout_s
+        self.health_check_after_s = health_check_after_s
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[Any, float]] = []  # (conexão, último uso) — LIFO
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Empresta uma conexão; ela volta ao pool se o bloco terminar sem erro."""
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._acquire()
+            yield conn
+        except BaseException:
+            # Conexão possivelmente quebrada: não devolve ao pool
+            if conn is not None:
+                _close_quietly(conn)
+            raise
+        else:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def _acquire(self):
+        self.evict_idle()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if self._is_healthy(conn, time.monotonic() - last_used):
+                return conn
+            _close_quietly(conn)
+        return self._connect()
+
+    def _is_healthy(self, conn, idle_s: float) -> bool:
+        if not getattr(conn, "open", True):
+            return False
+        if idle_s < self.health_check_after_s:
+            return True
+        try:
+            with contextlib.closing(conn.cursor()) as cur:
+                cur.execute("SELECT 1")
+                cur.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def evict_idle(self) -> int:
+        """Fecha conexões ociosas além de `idle_timeout_s`; retorna quantas foram fechadas."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [c for c, t in self._idle if now - t > self.idle_timeout_s]
+            self._idle = [(c, t) for c, t in self._idle if now - t <= self.idle_timeout_s]
+        for conn in expired:
+            _close_quietly(conn)
+        return len(expired)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"idle": len(self._idle), "max_size": self.max_size}
+
+
+def _close_quietly(conn) -> None:
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+_POOLS: Dict[Tuple[Optional[str], Optional[str], Optional[str]], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_connection_pool(cfg: DatabricksConfig) -> ConnectionPool:
+    """Retorna o pool do processo para (host, http_path, token), criando-o sob demanda."""
+    key = (cfg.host, cfg.http_path, cfg.token)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = ConnectionPool(lambda: _connect(cfg))
+            _POOLS[key] = pool
+        return pool
+
+
+class _Flight:
+    """Consulta em andamento: quem chega depois espera aqui em vez de repetir a SQL."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class QueryResultCache:
+    """Cache de resultados do warehouse no processo, compartilhado entre sessões.
+
+    - Chave: warehouse + credencial + SQL normalizada + parâmetros + versão dos dados
+      (`query_cache_key`).
+    - Single-flight: chamadas concorrentes com a mesma chave esperam a consulta em
+      andamento em vez de dispará-la de novo — N sessões abrindo juntas custam uma
+      consulta. Erros não são guardados: quem esperava recebe a mesma exceção.
+    - `ttl_s`: resultados mais velhos que isso são descartados na leitura.
+    - `max_bytes`: ao passar do limite, remove os usados há mais tempo (LRU); tamanho
+      estimado em profundidade (`memo.estimate_bytes`).
+    - Contadores: hits, misses, waits (chamadas coalescidas), evictions, expirations, errors.
+    """
+
+    def __init__(self, ttl_s: float, max_bytes: int):
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._inflight: Dict[str, _Flight] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "waits": 0, "evictions": 0, "expirations": 0, "errors": 0}
+
+    def get_or_run(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, str]:
+        """Retorna (resultado, origem), com origem "hit", "wait" ou "miss"."""
+        with self._lock:
+            found = self._entries.get(key)
+            if found is not None:
+                if time.monotonic() < found[2]:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return _shared(found[0]), "hit"
+                self._drop(key)
+                self.counters["expirations"] += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.counters["misses"] += 1
+            else:
+                self.counters["waits"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return _shared(flight.value), "wait"
+
+        try:
+            flight.value = fn()
+        except BaseException as exc:
+            flight.error = exc
+            with self._lock:
+                self.counters["errors"] += 1
+            raise
+        else:
+            self._put(key, flight.value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+        return _shared(flight.value), "miss"
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _put(self, key: str, value: Any) -> None:
+        # Tamanho profundo (strings em colunas object contam o conteúdo, não só o ponteiro)
+        size = estimate_bytes(value)
+        with self._lock:
+            if self.ttl_s <= 0 or size > self.max_bytes:
+                return  # maior que o cache inteiro: não guarda
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl_s)
+            self._bytes += size
+            while self._entries and self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "inflight": len(self._inflight),
+                "max_bytes": self.max_bytes,
+                **self.counters,
+            }
+
+
+def _shared(value: Any) -> Any:
+    # Mesmo resultado servido a várias sessões: cópia rasa (copy-on-write) para que
+    # atribuições de coluna de um chamador não apareçam nos demais
+    return value.copy(deep=False) if isinstance(value, pd.DataFrame) else value
+
+
+_SQL_WHITESPACE = re.compile(r"('(?:[^']|'')*')|\s+")
+
+
+def normalize_sql(sql_text: str) -> str:
+    """Colapsa espaços/quebras de linha fora de literais (a mesma consulta, formatada diferente, vira a mesma chave)."""
+    return _SQL_WHITESPACE.sub(lambda m: m.group(1) or " ", sql_text).strip()
+
+
+def query_cache_key(
+    sql_text: str,
+    params: Optional[Dict[str, Any]],
+    cfg: DatabricksConfig,
+    as_arrow: bool = False,
+    version: str = "",
+) -> str:
+    # Credencial na chave: resultados nunca são compartilhados entre tokens (permissões distintas).
+    # Versão na chave: a mesma SQL depois de um watermark novo é outra entrada, não um hit antigo.
+    bound = json.dumps(params or {}, sort_keys=True, default=str)
+    payload = "\x1f".join([cfg.host or "", cfg.http_path or "", cfg.token or "", str(as_arrow), version, normalize_sql(sql_text), bound])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+_QUERY_CACHE: Optional[QueryResultCache] = None
+_QUERY_CACHE_LOCK = threading.Lock()
+
+
+def get_query_cache(cfg: Optional[QueryCacheConfig] = None) -> Optional[QueryResultCache]:
+    """Cache de consultas do processo (QUERY_CACHE_TTL_S / QUERY_CACHE_MAX_MB), ou None se desligado."""
+    global _QUERY_CACHE
+    with _QUERY_CACHE_LOCK:
+        if _QUERY_CACHE is None:
+            cfg = cfg or load_query_cache_config()
+            if not cfg.enabled:
+                return None
+            _QUERY_CACHE = QueryResultCache(ttl_s=cfg.ttl_s, max_bytes=cfg.max_bytes)
+        return _QUERY_CACHE
+
+
+# Linhas por lote Arrow em fetchmany_arrow: limita o pico de memória do conector
+ARROW_BATCH_ROWS = 100_000
+
+
+@traced("databricks.run_query")
+def run_query(
+    sql_text: str,
+    params: Optional[Dict[str, Any]] = None,
+    cfg: Optional[DatabricksConfig] = None,
+    as_arrow: bool = False,
+    batch_rows: int = ARROW_BATCH_ROWS,
+    cache: bool = True,
+    version: str = "",
+):
     """Executa uma consulta SQL em um SQL Warehouse do Databricks e retorna um DataFrame.
 
-    Observação: parâmetros são interpolados pelo conector (se suportado) ou por formatação simples.
-    Evite passar entradas de usuário diretamente. Aqui mantemos simples com format().
+    O resultado é lido em lotes Arrow (`fetchmany_arrow`) e convertido para pandas sem
+    passar por tuplas Python; com `as_arrow=True` devolve a `pyarrow.Table` diretamente.
+
+    Com `cache=True` (padrão), passa pelo cache de resultados do processo
+    (`QueryResultCache`): a mesma SQL pedida por várias sessões ao mesmo tempo vira
+    uma única consulta, e repetições dentro do TTL não vão ao warehouse. `version`
+    (versão dos dados ou watermark da tabela) entra na chave: quem já guarda o
+    resultado por versão não recebe, depois de um refresh, o extrato anterior.
+
+    `params` preenche os marcadores `:nome` da SQL como parâmetros nativos do conector
+    (`cursor.execute(sql, parameters=...)`): os valores nunca são interpolados no texto.
     """
     cfg = cfg or load_databricks_config()
     if not is_databricks_configured(cfg):
         raise RuntimeError("Databricks não configurado.")
 
-    formatted_sql = sql_text
-    if params:
-        formatted_sql = sql_text.format(**{k: _format_sql_value(v) for k, v in params.items()})
+    query_cache = get_query_cache() if cache else None
+    if query_cache is None:
+        return _execute(sql_text, params, cfg, as_arrow, batch_rows)
+    with span("databricks.query_cache") as s:
+        result, outcome = query_cache.get_or_run(
+            query_cache_key(sql_text, params, cfg, as_arrow, version),
+            lambda: _execute(sql_text, params, cfg, as_arrow, batch_rows),
+        )
+        s.set(outcome=outcome)
+    return result
+
 
-    with contextlib.closing(_connect(cfg)) as conn:
+def _execute(sql_text: str, params: Optional[Dict[str, Any]], cfg: DatabricksConfig, as_arrow: bool, batch_rows: int):
+    with get_connection_pool(cfg).connection() as conn:
         with contextlib.closing(conn.cursor()) as cur:
-            cur.execute(formatted_sql)
-            rows = cur.fetchall()
-            cols = [c[0] for c in cur.description]
-            return pd.DataFrame.from_records(rows, columns=cols)
+            with span("databricks.execute", sql=render_sql_for_log(sql_text, params)[:200]):
+                cur.execute(sql_text, parameters=params or None)
+            if not hasattr(cur, "fetchmany_arrow"):
+                # Conector antigo/sem pyarrow: caminho por tuplas
+                rows = cur.fetchall()
+                cols = [c[0] for c in cur.description]
+                df = pd.DataFrame.from_records(rows, columns=cols)
+                if as_arrow:
+                    import pyarrow as pa  # lazy import
+
+                    return pa.Table.from_pandas(df, preserve_index=False)
+                return df
+            with span("databricks.fetch_arrow") as s:
+                table = _fetch_arrow(cur, batch_rows)
+                s.set(rows=table.num_rows, bytes=table.nbytes)
+
+    if as_arrow:
+        return table
+    with span("databricks.arrow_to_pandas"):
+        return arrow_to_pandas(table)
+
+
+def iter_query(
+    sql_text: str,
+    params: Optional[Dict[str, Any]] = None,
+    cfg: Optional[DatabricksConfig] = None,
+    batch_rows: int = ARROW_BATCH_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Executa a consulta e entrega o resultado em DataFrames de até `batch_rows` linhas.
+
+    Nada é concatenado: cada lote Arrow é convertido e entregue ao chamador, então a
+    memória fica limitada a um lote (mais o que o chamador acumular). A conexão fica
+    emprestada do pool até o gerador terminar; se ele for abandonado no meio, a
+    conexão é fechada em vez de voltar ao pool com um resultado pela metade.
+    """
+    cfg = cfg or load_databricks_config()
+    if not is_databricks_configured(cfg):
+        raise RuntimeError("Databricks não configurado.")
+
+    with get_connection_pool(cfg).connection() as conn:
+        with contextlib.closing(conn.cursor()) as cur:
+            with span("databricks.execute", sql=render_sql_for_log(sql_text, params)[:200], streaming=True):
+                cur.execute(sql_text, parameters=params or None)
+            if not hasattr(cur, "fetchmany_arrow"):
+                cols = [c[0] for c in cur.description]
+                while True:
+                    rows = cur.fetchmany(batch_rows)
+                    if not rows:
+                        return
+                    yield pd.DataFrame.from_records(rows, columns=cols)
+            while True:
+                batch = cur.fetchmany_arrow(batch_rows)
+                if batch.num_rows == 0:
+                    return
+                yield arrow_to_pandas(batch)
+
+
+_PARAM_MARKER = re.compile(r"(?<!:):([A-Za-z_]\w*)")
+
+
+def render_sql_for_log(sql_text: str, params: Optional[Dict[str, Any]]) -> str:
+    """SQL com os valores dos parâmetros no lugar dos marcadores — só para logs/spans.
+
+    Nunca é enviada ao warehouse: a execução usa os parâmetros nativos do conector.
+    """
+    if not params:
+        return sql_text
+    return _PARAM_MARKER.sub(lambda m: _format_sql_value(params[m.group(1)]) if m.group(1) in params else m.group(0), sql_text)
+
+
+def _fetch_arrow(cur, batch_rows: int):
+    import pyarrow as pa  # lazy import
+
+    batches = []
+    while True:
+        batch = cur.fetchmany_arrow(batch_rows)
+        if batch.num_rows == 0:
+            if not batches:
+                batches.append(batch)  # preserva o schema em resultados vazios
+            break
+        batches.append(batch)
+    return batches[0] if len(batches) == 1 else pa.concat_tables(batches)
+
+
+def arrow_to_pandas(table) -> pd.DataFrame:
+    """Converte uma `pyarrow.Table` em DataFrame evitando cópias quando possível.
+
+    `split_blocks` mantém uma coluna por bloco (sem consolidar/copiar) e `self_destruct`
+    libera os buffers Arrow à medida que cada coluna é convertida, então o pico de RSS
+    fica perto de uma cópia do resultado em vez de duas.
+    """
+    return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
 
 
 def _format_sql_value(value: Any) -> str:
+    # Apenas para exibição (render_sql_for_log); não é um escape seguro para execução
     if value is None:
         return "NULL"
     if isinstance(value, (int, float)):
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .config import DiskCacheConfig, load_disk_cache_config
+from .databricks_client import arrow_to_pandas
+
+
+# Coluna auxiliar de partição (um diretório por dia); removida na leitura
+PARTITION_COLUMN = "cache_day"
+_META_FILE = "_meta.json"
+
+
+def query_key(sql_text: str, params: Optional[Dict[str, Any]] = None, version: str = "") -> str:
+    """Hash estável de SQL + parâmetros + versão dos dados (identifica o extrato no cache)."""
+    payload = json.dumps({"sql": " ".join(sql_text.split()), "params": params or {}, "version": version}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+class ParquetCache:
+    """Cache em disco de extratos do warehouse em Parquet particionado por dia.
+
+    Layout: `<root>/<tabela>/<hash da consulta>/cache_day=YYYY-MM-DD/*.parquet` + `_meta.json`.
+    - TTL: entradas mais antigas que `ttl_s` são ignoradas e removidas.
+    - LRU: quando o total passa de `max_bytes`, remove as entradas acessadas há mais tempo
+      (o acesso é registrado no mtime de `_meta.json`).
+    - Leitura com memory map: o SO pagina os arquivos sob demanda em vez de copiá-los.
+    Escritas vão para um diretório temporário e são publicadas com rename, então
+    réplicas/processos concorrentes nunca leem um extrato pela metade.
+    """
+
+    def __init__(self, root: str | os.PathLike, ttl_s: float, max_bytes: int):
+        self.root = Path(root)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, table: str, key: str) -> Path:
+        return self.root / table / key
+
+    def get(self, table: str, key: str) -> Optional[pd.DataFrame]:
+        entry = self._entry_dir(table, key)
+        meta = _read_meta(entry)
+        if meta is None:
+            return None
+        if time.time() - meta["created_at"] > self.ttl_s:
+            _remove_entry(entry)
+            return None
+
+        import pyarrow.parquet as pq  # lazy import
+
+        try:
+            if meta.get("time_column"):
+                arrow_table = pq.read_table(entry, memory_map=True, partitioning="hive")
+                arrow_table = arrow_table.drop_columns([PARTITION_COLUMN])
+            else:
+                arrow_table = pq.read_table(entry / "data.parquet", memory_map=True)
+        except Exception:
+            # Entrada corrompida/incompleta: descarta e deixa o chamador ir ao warehouse
+            _remove_entry(entry)
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(entry / _META_FILE)  # marca acesso para o LRU
+        return arrow_to_pandas(arrow_table)
+
+    def put(self, table: str, key: str, df: pd.DataFrame, time_column: Optional[str] = None) -> None:
+        entry = self._entry_dir(table, key)
+        tmp = entry.parent / f".tmp-{key}-{uuid.uuid4().hex[:8]}"
+        tmp.mkdir(parents=True, exist_ok=True)
+        try:
+            partitioned = bool(time_column and time_column in df.columns and len(df) > 0)
+            if partitioned:
+                days = pd.to_datetime(df[time_column]).dt.strftime("%Y-%m-%d")
+                df.assign(**{PARTITION_COLUMN: days}).to_parquet(
+                    tmp, partition_cols=[PARTITION_COLUMN], index=False
+                )
+            else:
+                df.to_parquet(tmp / "data.parquet", index=False)
+            size = sum(f.stat().st_size for f in tmp.rglob("*.parquet"))
+            meta = {
+                "created_at": time.time(),
+                "rows": int(len(df)),
+                "bytes": int(size),
+                "time_column": time_column if partitioned else None,
+            }
+            (tmp / _META_FILE).write_text(json.dumps(meta))
+            _remove_entry(entry)
+            os.replace(tmp, entry)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict()
+
+    def entries(self) -> List[Tuple[Path, dict, float]]:
+        """(diretório, meta, último acesso) de cada entrada válida."""
+        found = []
+        if not self.root.exists():
+            return found
+        for meta_path in self.root.glob(f"*/*/{_META_FILE}"):
+            meta = _read_meta(meta_path.parent)
+            if meta is not None:
+                found.append((meta_path.parent, meta, meta_path.stat().st_mtime))
+        return found
+
+    def evict(self) -> int:
+        """Remove entradas expiradas e, se preciso, as menos usadas até caber em `max_bytes`."""
+        with self._lock:
+            now = time.time()
+            removed = 0
+            live = []
+            for entry, meta, accessed in self.entries():
+                if now - meta["created_at"] > self.ttl_s:
+                    _remove_entry(entry)
+                    removed += 1
+                else:
+                    live.append((accessed, meta["bytes"], entry))
+            total = sum(size for _, size, _ in live)
+            for _, size, entry in sorted(live, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                _remove_entry(entry)
+                total -= size
+                removed += 1
+            return removed
+
+    def stats(self) -> Dict[str, int]:
+        items = self.entries()
+        return {"entries": len(items), "bytes": sum(m["bytes"] for _, m, _ in items), "max_bytes": self.max_bytes}
+
+
+def _read_meta(entry: Path) -> Optional[dict]:
+    try:
+        return json.loads((entry / _META_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_entry(entry: Path) -> None:
+    shutil.rmtree(entry, ignore_errors=True)
+
+
+_CACHE: Optional[ParquetCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_disk_cache(cfg: Optional[DiskCacheConfig] = None) -> Optional[ParquetCache]:
+    """Cache do processo (None se desabilitado via DISK_CACHE_ENABLED=false)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            cfg = cfg or load_disk_cache_config()
+            if not cfg.enabled:
+                return None
+            _CACHE = ParquetCache(cfg.path, ttl_s=cfg.ttl_s, max_bytes=cfg.max_bytes)
+        return _CACHE
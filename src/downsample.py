@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import span
+
+# Granularidades tentadas, da mais fina à mais grossa, para períodos longos
+RESAMPLE_FREQS = (("D", "dia"), ("W-MON", "semana"), ("MS", "mês"))
+
+
+def minmax_indices(values: np.ndarray, n_buckets: int) -> np.ndarray:
+    """Índices que preservam mínimo e máximo de cada coluna em `n_buckets` faixas iguais.
+
+    `values` é (linhas × séries). As linhas são divididas em faixas contíguas; de cada
+    faixa ficam as posições do mínimo e do máximo de cada série (e sempre a primeira e
+    a última linha), então picos e vales continuam visíveis. Tudo vetorizado: as faixas
+    viram uma matriz (faixas × tamanho) e argmin/argmax rodam por eixo.
+    """
+    n = len(values)
+    if n_buckets <= 0 or n <= 2 * n_buckets:
+        return np.arange(n)
+    values = values.reshape(n, -1).astype(np.float64)
+    size = int(np.ceil(n / n_buckets))
+    n_buckets = int(np.ceil(n / size))
+    padded = np.full((n_buckets * size, values.shape[1]), np.nan)
+    padded[:n] = values
+    blocks = padded.reshape(n_buckets, size, -1)
+    offsets = (np.arange(n_buckets) * size)[:, None]
+    # NaN nunca vence: vira +inf no mínimo e -inf no máximo
+    lo = offsets + np.argmin(np.where(np.isnan(blocks), np.inf, blocks), axis=1)
+    hi = offsets + np.argmax(np.where(np.isnan(blocks), -np.inf, blocks), axis=1)
+    keep = np.concatenate([lo.ravel(), hi.ravel(), [0, n - 1]])
+    return np.unique(keep[keep < n])
+
+
+def resample_series(
+    df: pd.DataFrame,
+    x: str,
+    sum_cols: Sequence[str] = (),
+    mean_cols: Sequence[str] = (),
+    freq: str = "D",
+    weights: Optional[Mapping[str, str]] = None,
+) -> pd.DataFrame:
+    """Reagrega por `freq` (dia/semana/mês): contagens somadas, médias recompostas.
+
+    Uma média diária com peso em `weights` (coluna de contagem de não nulos, ex.:
+    `tnps` -> `tnps_n`) é refeita como Σ(média·n)/Σn, igual à média dos tickets do
+    período; sem peso, vale a média simples das médias diárias.
+    """
+    weights = {col: weights[col] for col in mean_cols if weights and col in weights}
+    totals = {f"{col}__total": df[col].fillna(0.0) * df[n] for col, n in weights.items()}
+    grouped = (df.assign(**totals) if totals else df).groupby(pd.Grouper(key=x, freq=freq, label="left", closed="left"))
+    parts = []
+    if sum_cols:
+        parts.append(grouped[list(sum_cols)].sum(min_count=1))
+    for col in mean_cols:
+        if col in weights:
+            n = grouped[weights[col]].sum()
+            parts.append((grouped[f"{col}__total"].sum() / n.where(n > 0)).rename(col))
+        else:
+            parts.append(grouped[col].mean())
+    out = pd.concat(parts, axis=1) if parts else pd.DataFrame(index=grouped.size().index)
+    return out.dropna(how="all").reset_index()
+
+
+def chart_series(
+    df: pd.DataFrame,
+    x: str,
+    sum_cols: Sequence[str] = (),
+    mean_cols: Sequence[str] = (),
+    max_points: int = 1200,
+    name: Optional[str] = None,
+    weights: Optional[Mapping[str, str]] = None,
+) -> tuple[pd.DataFrame, str]:
+    """Prepara uma série para o Plotly com no máximo ~`max_points` pontos por traço.
+
+    1. Se o período tem mais pontos que `max_points`, reagrega para a menor granularidade
+       (dia, semana, mês) que cabe — contagens somadas, médias ponderadas pelas
+       contagens de `weights` (ver `resample_series`).
+    2. Se ainda não couber, aplica o downsampling min/max (`minmax_indices`).
+
+    Retorna (frame, granularidade usada) — "original" quando nada foi feito.
+    """
+    with span("downsample.chart_series", chart=name or "", rows_in=len(df)) as s:
+        cols = [*sum_cols, *mean_cols]
+        out, grain = df, "original"
+        if len(df) > max_points and pd.api.types.is_datetime64_any_dtype(df[x]):
+            span_days = (df[x].max() - df[x].min()) / pd.Timedelta(days=1)
+            for freq, label in RESAMPLE_FREQS:
+                step_days = {"D": 1, "W-MON": 7, "MS": 30.4}[freq]
+                if span_days / step_days <= max_points or freq == RESAMPLE_FREQS[-1][0]:
+                    out, grain = resample_series(df, x, sum_cols, mean_cols, freq, weights), label
+                    break
+        if len(out) > max_points:
+            idx = minmax_indices(out[cols].to_numpy(dtype=np.float64), max_points // 2)
+            out, grain = out.iloc[idx], f"{grain}, min/max"
+        s.set(rows=len(out), grain=grain)
+        return out, grain
@@ -1,58 +1,178 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
 from datetime import date
+from typing import Optional
+
+import numpy as np
 import pandas as pd
 
 from .data_access import DataSource
+from .instrumentation import span, traced
 
 
-def build_filter_options(ds: DataSource) -> dict:
-    tickets = ds.tickets.copy()
-    tickets["timestamp"] = pd.to_datetime(tickets["timestamp"])  # ensure datetime
-    return {
-        "min_date": tickets["timestamp"].min().date(),
-        "max_date": tickets["timestamp"].max().date(),
-        "canal": sorted(tickets["canal"].dropna().unique().tolist()) if "canal" in tickets else [],
-        "produto": sorted(tickets["produto"].dropna().unique().tolist()) if "produto" in tickets else [],
-        "convenio": sorted(tickets["convenio"].dropna().unique().tolist()) if "convenio" in tickets else [],
-        "segmento": sorted(tickets["segmento"].dropna().unique().tolist()) if "segmento" in tickets else [],
-        "estado": sorted(tickets["estado"].dropna().unique().tolist()) if "estado" in tickets else [],
-        "prioridade": sorted(tickets["prioridade"].dropna().unique().tolist()) if "prioridade" in tickets else [],
-        "categoria": sorted(tickets["categoria"].dropna().unique().tolist()) if "categoria" in tickets else [],
-    }
+# Chave do filtro (sidebar) -> coluna, por tabela
+TICKET_DIMENSIONS = {
+    "canal": "canal",
+    "produto": "produto",
+    "convenio": "convenio",
+    "segmento": "segmento",
+    "estado": "estado",
+    "prioridade": "prioridade",
+    "categoria": "categoria",
+}
+PRODUCT_DIMENSIONS = {"produto": "product"}
 
 
-def apply_filters(ds: DataSource, filters: dict):
-    tickets = ds.tickets.copy()
-    jobs = ds.jobs.copy()
-    product = ds.product_metrics.copy()
+class TableIndex:
+    """Índice de filtro de uma tabela: tempo ordenado + códigos inteiros por dimensão.
+
+    - Período: `searchsorted` no vetor de tempo ordenado (O(log n)) devolve a fatia.
+    - Dimensões: cada coluna vira códigos inteiros; a seleção vira uma tabela booleana
+      por código, e `lookup[codes]` dá a máscara da fatia sem comparar strings.
+    - As máscaras são combinadas com AND in-place e as linhas saem com um único `take`.
+    """
+
+    def __init__(self, df: pd.DataFrame, time_col: str, dimensions: dict):
+        times = df[time_col]
+        if not pd.api.types.is_datetime64_any_dtype(times):
+            times = pd.to_datetime(times)
+        values = times.to_numpy(dtype="datetime64[ns]")
+        # Frames vindos de make_data_source já estão ordenados; outros recebem permutação
+        self.order = None if times.is_monotonic_increasing else np.argsort(values, kind="stable")
+        self.times = values if self.order is None else values[self.order]
+
+        self.codes: dict = {}
+        self.categories: dict = {}
+        self.has_na: dict = {}
+        for key, col in dimensions.items():
+            if col not in df.columns:
+                continue
+            column = df[col]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                codes, cats = column.cat.codes.to_numpy(), column.cat.categories
+            else:
+                codes, cats = pd.factorize(column, use_na_sentinel=True)
+                cats = pd.Index(cats)
+            codes = codes.astype(np.int16 if len(cats) < 2**15 else np.int32)
+            self.codes[key] = codes if self.order is None else codes[self.order]
+            self.categories[key] = cats
+            self.has_na[key] = bool((codes < 0).any())
+
+    def _selection_lookup(self, key: str, values: list) -> Optional[np.ndarray]:
+        """Tabela booleana por código (última posição = NaN/-1, nunca selecionada).
+
+        Retorna None quando a seleção não elimina nenhuma linha.
+        """
+        cats = self.categories[key]
+        lookup = np.zeros(len(cats) + 1, dtype=bool)
+        positions = cats.get_indexer(pd.Index(values))
+        lookup[positions[positions >= 0]] = True
+        if lookup[:-1].all() and not self.has_na[key]:
+            return None
+        return lookup
+
+    def positions(self, start: pd.Timestamp, end: pd.Timestamp, selections: dict) -> np.ndarray:
+        """Posições (no frame original) com start <= tempo <= end e dimensões selecionadas."""
+        i0 = int(np.searchsorted(self.times, np.datetime64(start.to_datetime64(), "ns"), side="left"))
+        i1 = int(np.searchsorted(self.times, np.datetime64(end.to_datetime64(), "ns"), side="right"))
+        i1 = max(i0, i1)
+
+        mask = None
+        for key, values in selections.items():
+            if key not in self.codes or not values:
+                continue
+            lookup = self._selection_lookup(key, values)
+            if lookup is None:
+                continue
+            m = lookup[self.codes[key][i0:i1]]
+            if mask is None:
+                mask = m
+            else:
+                mask &= m
+
+        local = np.arange(i0, i1) if mask is None else i0 + np.flatnonzero(mask)
+        return local if self.order is None else self.order[local]
+
+
+@dataclass
+class FilterIndex:
+    tickets: TableIndex
+    jobs: TableIndex
+    product: TableIndex
+
 
-    # Normalizações
-    tickets["timestamp"] = pd.to_datetime(tickets["timestamp"])
-    jobs["timestamp"] = pd.to_datetime(jobs["timestamp"])
-    product["date"] = pd.to_datetime(product["date"]).dt.floor("D")
+def get_filter_index(ds: DataSource) -> FilterIndex:
+    """Índice de filtros do DataSource, construído uma vez e guardado no próprio objeto."""
+    if ds.filter_index is None:
+        with span("filters.build_index") as s:
+            s.set(rows=len(ds.tickets))
+            ds.filter_index = FilterIndex(
+                tickets=TableIndex(ds.tickets, "timestamp", TICKET_DIMENSIONS),
+                jobs=TableIndex(ds.jobs, "timestamp", {}),
+                product=TableIndex(ds.product_metrics, "date", PRODUCT_DIMENSIONS),
+            )
+    return ds.filter_index
 
+
+def date_bounds(filters: dict):
     start, end = filters["date_range"]
-    tickets = tickets[(tickets["timestamp"] >= pd.to_datetime(start)) & (tickets["timestamp"] <= pd.to_datetime(end) + pd.Timedelta(days=1))]
-    jobs = jobs[(jobs["timestamp"] >= pd.to_datetime(start)) & (jobs["timestamp"] <= pd.to_datetime(end) + pd.Timedelta(days=1))]
-    product = product[(product["date"] >= pd.to_datetime(start)) & (product["date"] <= pd.to_datetime(end))]
-
-    def multi_filter(df: pd.DataFrame, col: str, values: list):
-        if col in df.columns and values:
-            return df[df[col].isin(values)]
-        return df
-
-    tickets = multi_filter(tickets, "canal", filters.get("canal", []))
-    tickets = multi_filter(tickets, "produto", filters.get("produto", []))
-    tickets = multi_filter(tickets, "convenio", filters.get("convenio", []))
-    tickets = multi_filter(tickets, "segmento", filters.get("segmento", []))
-    tickets = multi_filter(tickets, "estado", filters.get("estado", []))
-    tickets = multi_filter(tickets, "prioridade", filters.get("prioridade", []))
-    tickets = multi_filter(tickets, "categoria", filters.get("categoria", []))
-
-    # Produto: filtrar por produto e possivelmente segmento
-    product = multi_filter(product, "product", filters.get("produto", []))
+    return pd.to_datetime(start), pd.to_datetime(end)
+
+
+def filter_positions(ds: DataSource, table: str, filters: dict) -> np.ndarray:
+    """Posições das linhas de `table` ("tickets", "jobs", "product_metrics") que passam nos filtros."""
+    index = get_filter_index(ds)
+    start, end = date_bounds(filters)
+    # Tickets/jobs: até o fim do último dia (inclusive, como antes); produto: por data
+    end_ts = end + pd.Timedelta(days=1)
+    if table == "tickets":
+        return index.tickets.positions(start, end_ts, {key: filters.get(key, []) for key in TICKET_DIMENSIONS})
+    if table == "jobs":
+        return index.jobs.positions(start, end_ts, {})
+    if table == "product_metrics":
+        # Produto: filtrar por produto e possivelmente segmento
+        return index.product.positions(start, end, {"produto": filters.get("produto", [])})
+    raise ValueError(f"Tabela desconhecida: {table}")
+
+
+def filter_mask(table: str, df: pd.DataFrame, filters: dict) -> np.ndarray:
+    """Máscara booleana dos filtros sobre um frame avulso (ex.: um bloco em streaming).
+
+    Mesma semântica de `filter_positions`, sem índice: usada quando as linhas chegam
+    aos pedaços e não existe um `DataSource` inteiro para indexar.
+    """
+    start, end = date_bounds(filters)
+    if table == "product_metrics":
+        time_col, dimensions = "date", PRODUCT_DIMENSIONS
+    elif table in ("tickets", "jobs"):
+        time_col, dimensions = "timestamp", TICKET_DIMENSIONS if table == "tickets" else {}
+        end = end + pd.Timedelta(days=1)
+    else:
+        raise ValueError(f"Tabela desconhecida: {table}")
+    times = pd.to_datetime(df[time_col])
+    mask = ((times >= start) & (times <= end)).to_numpy(copy=True)
+    for key, col in dimensions.items():
+        values = filters.get(key, [])
+        if values and col in df.columns:
+            mask &= df[col].isin(values).to_numpy()
+    return mask
 
-    return tickets, jobs, product
 
+def filter_table(ds: DataSource, table: str, filters: dict) -> pd.DataFrame:
+    return getattr(ds, table).take(filter_positions(ds, table, filters))
 
+
+def build_filter_options(ds: DataSource) -> dict:
+    """Opções da sidebar; mantido aqui por compatibilidade (implementação em `src.catalog`)."""
+    from .catalog import build_filter_options as from_catalog  # lazy import: catalog importa este módulo
+
+    return from_catalog(ds)
+
+
+@traced("filters.apply_filters")
+def apply_filters(ds: DataSource, filters: dict):
+    tickets = filter_table(ds, "tickets", filters)
+    jobs = filter_table(ds, "jobs", filters)
+    product = filter_table(ds, "product_metrics", filters)
+    return tickets, jobs, product
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+
+@dataclass
+class Span:
+    """Uma etapa medida: duração, linhas e bytes do resultado (quando aplicável)."""
+    id: int
+    name: str
+    parent: Optional[int]
+    start: float
+    seconds: float = 0.0
+    rows: Optional[int] = None
+    bytes: Optional[int] = None
+    thread: str = ""
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, rows: Optional[int] = None, bytes: Optional[int] = None, **attrs: Any) -> None:
+        if rows is not None:
+            self.rows = rows
+        if bytes is not None:
+            self.bytes = bytes
+        self.attrs.update(attrs)
+
+
+class Recorder:
+    """Coleta os spans de um rerun (ou de qualquer bloco em `recording()`)."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def new_span(self, name: str, parent: Optional[int], attrs: Dict[str, Any]) -> Span:
+        with self._lock:
+            s = Span(
+                id=next(self._ids),
+                name=name,
+                parent=parent,
+                start=time.time(),
+                thread=threading.current_thread().name,
+                attrs=dict(attrs),
+            )
+            self.spans.append(s)
+        return s
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame([asdict(s) for s in self.spans])
+
+    def to_jsonl(self, **extra: Any) -> str:
+        return "".join(json.dumps({**extra, **asdict(s)}, default=str) + "\n" for s in self.spans)
+
+
+# Recorder/span ativos no contexto atual. Sem recorder ativo, `span()` e `@traced`
+# custam um ContextVar.get() e nada mais.
+_RECORDER: contextvars.ContextVar[Optional[Recorder]] = contextvars.ContextVar("recorder", default=None)
+_PARENT: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("span_parent", default=None)
+
+
+class _NullSpan:
+    def set(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def is_profiling_enabled() -> bool:
+    """Instrumentação ligada para todo o processo via DASHBOARD_PROFILING=true."""
+    return os.getenv("DASHBOARD_PROFILING", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def is_recording() -> bool:
+    return _RECORDER.get() is not None
+
+
+@contextlib.contextmanager
+def recording() -> Iterator[Recorder]:
+    """Ativa a coleta de spans no contexto atual (ex.: um rerun do Streamlit)."""
+    recorder = Recorder()
+    token = _RECORDER.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _RECORDER.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """Mede o bloco como um span filho do span corrente; no-op fora de `recording()`."""
+    recorder = _RECORDER.get()
+    if recorder is None:
+        yield _NULL_SPAN
+        return
+    s = recorder.new_span(name, _PARENT.get(), attrs)
+    token = _PARENT.set(s.id)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except BaseException as exc:
+        s.attrs["error"] = type(exc).__name__
+        raise
+    finally:
+        s.seconds = time.perf_counter() - t0
+        _PARENT.reset(token)
+
+
+def frame_size(obj: Any) -> tuple[Optional[int], Optional[int]]:
+    """(linhas, bytes rasos) de um DataFrame/Series, ou da soma de uma tupla/lista/dataclass deles."""
+    if isinstance(obj, pd.DataFrame):
+        return len(obj), int(obj.memory_usage(index=False).sum())
+    if isinstance(obj, pd.Series):
+        return len(obj), int(obj.memory_usage(index=False))
+    if isinstance(obj, (tuple, list)) and obj and all(isinstance(o, (pd.DataFrame, pd.Series)) for o in obj):
+        sizes = [frame_size(o) for o in obj]
+        return sum(r or 0 for r, _ in sizes), sum(b or 0 for _, b in sizes)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        # DataSource, TicketAggregates...: soma dos frames do objeto
+        frames = [v for v in vars(obj).values() if isinstance(v, pd.DataFrame)]
+        if frames:
+            return frame_size(frames)
+    if hasattr(obj, "num_rows") and hasattr(obj, "nbytes"):  # pyarrow.Table
+        return int(obj.num_rows), int(obj.nbytes)
+    if hasattr(obj, "__len__") and hasattr(obj, "nbytes"):  # numpy
+        return len(obj), int(obj.nbytes)
+    return None, None
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorador: registra a chamada como span, com linhas/bytes do retorno."""
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _RECORDER.get() is None:
+                return fn(*args, **kwargs)
+            with span(span_name) as s:
+                result = fn(*args, **kwargs)
+                rows, nbytes = frame_size(result)
+                s.set(rows=rows, bytes=nbytes)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def export_jsonl(recorder: Recorder, path: str, **extra: Any) -> None:
+    """Anexa os spans do recorder a um arquivo JSON lines."""
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write(recorder.to_jsonl(**extra))
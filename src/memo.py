@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import MemoConfig, load_memo_config
+from .instrumentation import span
+
+
+def _canonical(value: Any) -> Any:
+    """Forma canônica de um valor de filtro: ordem e tipo não mudam a chave."""
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, tuple):
+        # Tuplas têm ordem (ex.: date_range = (início, fim))
+        return [_canonical(v) for v in value]
+    if isinstance(value, (list, set, frozenset)):
+        # Seleções de multiselect: a ordem de clique não importa
+        return sorted({json.dumps(_canonical(v), sort_keys=True, default=str) for v in value})
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def filter_key(filters: Optional[dict]) -> str:
+    """Hash canônico do dicionário de filtros da sidebar."""
+    payload = json.dumps(_canonical(filters or {}), sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def estimate_bytes(obj: Any, _seen: Optional[set] = None) -> int:
+    """Estimativa do tamanho em memória, percorrendo o objeto em profundidade.
+
+    Frames e séries usam `memory_usage(deep=True)` (inclui strings e dicionários de
+    categóricas); dataclasses e objetos com atributos (ex.: `DailyCube`,
+    `QuantileSketches`, `FilterIndex`) somam os frames e arrays que guardam. Um mesmo
+    objeto referenciado duas vezes (ex.: células do cubo e o índice sobre elas) conta uma vez.
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, pd.Categorical):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        # Views contam a memória do array base (uma vez, mesmo com várias views dele)
+        base = obj
+        while isinstance(base.base, np.ndarray):
+            base = base.base
+        if base is not obj and id(base) in seen:
+            return 0
+        seen.add(id(base))
+        return int(base.nbytes)
+    if hasattr(obj, "num_rows") and hasattr(obj, "nbytes"):  # pyarrow.Table / RecordBatch
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_bytes(v, seen) for v in obj.values())
+    if isinstance(obj, (tuple, list, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_bytes(v, seen) for v in obj)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None), np.generic, date, datetime, type)):
+        return sys.getsizeof(obj)
+    if dataclasses.is_dataclass(obj) or hasattr(obj, "__dict__"):
+        return sys.getsizeof(obj) + sum(estimate_bytes(v, seen) for v in vars(obj).values())
+    return sys.getsizeof(obj)
+
+
+class MemoCache:
+    """Memo em memória de resultados por (namespace, versão dos dados, filtros).
+
+    Compartilhado pelo processo todo: combinações de filtro repetidas — pela mesma
+    sessão ou por outros usuários — são servidas sem recomputar. Limitado por número
+    de entradas e por bytes estimados (na inserção); ao passar do limite, remove as
+    entradas usadas há mais tempo (LRU). Contadores de hit/miss/evicção por namespace.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, event: str) -> None:
+        ns = self.counters.setdefault(namespace, {"hits": 0, "misses": 0, "evictions": 0})
+        ns[event] += 1
+
+    def get_or_compute(self, namespace: str, version: str, filters: Optional[dict], fn: Callable[[], Any]) -> Any:
+        key = (namespace, version, filter_key(filters))
+        with self._lock:
+            found = self._entries.get(key)
+            if found is not None:
+                self._entries.move_to_end(key)
+                self._count(namespace, "hits")
+                return found[0]
+            self._count(namespace, "misses")
+
+        # Calcula fora do lock: outras chaves continuam sendo servidas em paralelo
+        with span(f"memo.{namespace}") as s:
+            value = fn()
+            size = estimate_bytes(value)
+            s.set(bytes=size)
+        self._put(key, value, size)
+        return value
+
+    def latest(self, namespace: str, filters: Optional[dict]) -> Optional[Any]:
+        """Entrada de `namespace` para os mesmos filtros em qualquer versão (a usada mais
+        recentemente), ou None. Ponto de partida para estender um resultado após um refresh."""
+        fkey = filter_key(filters)
+        with self._lock:
+            for (ns, _, key), (value, _) in reversed(self._entries.items()):
+                if ns == namespace and key == fkey:
+                    return value
+        return None
+
+    def _put(self, key: Tuple[str, str, str], value: Any, size: int) -> None:
+        with self._lock:
+            if size > self.max_bytes:
+                return  # maior que o cache inteiro: não guarda
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                (namespace, _, _), (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._count(namespace, "evictions")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> pd.DataFrame:
+        """Uma linha por namespace: entradas, bytes e contadores."""
+        with self._lock:
+            rows = {ns: {"namespace": ns, "entries": 0, "bytes": 0, **c} for ns, c in self.counters.items()}
+            for (ns, _, _), (_, size) in self._entries.items():
+                rows[ns]["entries"] += 1
+                rows[ns]["bytes"] += size
+        return pd.DataFrame(list(rows.values()), columns=["namespace", "entries", "bytes", "hits", "misses", "evictions"])
+
+
+_MEMO: Optional[MemoCache] = None
+_MEMO_LOCK = threading.Lock()
+
+
+def get_memo(cfg: Optional[MemoConfig] = None) -> MemoCache:
+    """Memo do processo (limites via MEMO_MAX_ENTRIES / MEMO_MAX_MB)."""
+    global _MEMO
+    with _MEMO_LOCK:
+        if _MEMO is None:
+            cfg = cfg or load_memo_config()
+            _MEMO = MemoCache(max_entries=cfg.max_entries, max_bytes=cfg.max_bytes)
+        return _MEMO
+
+
+def memoized(namespace: str, version: str, filters: Optional[dict], fn: Callable[[], Any]) -> Any:
+    """Atalho para `get_memo().get_or_compute(...)`."""
+    return get_memo().get_or_compute(namespace, version, filters, fn)
@@ -1,9 +1,14 @@
 from __future__ import annotations
 
 import math
+from dataclasses import dataclass
+
 import pandas as pd
 
+from .instrumentation import traced
+
 
+@traced("metrics.compute_operational_kpis")
 def compute_operational_kpis(tickets: pd.DataFrame, jobs: pd.DataFrame) -> dict:
     tickets_total = int(len(tickets))
     backlog = int((tickets["reopen"] == 1).sum()) if "reopen" in tickets.columns else 0
@@ -24,6 +29,7 @@ def compute_operational_kpis(tickets: pd.DataFrame, jobs: pd.DataFrame) -> dict:
     }
 
 
+@traced("metrics.compute_product_kpis")
 def compute_product_kpis(product: pd.DataFrame) -> dict:
     if len(product) == 0:
         return {"conversion_rate": 0.0, "eligibility_rate": 0.0}
@@ -32,3 +38,148 @@ def compute_product_kpis(product: pd.DataFrame) -> dict:
     return {"conversion_rate": conv_rate, "eligibility_rate": elig_rate}
 
 
+@dataclass
+class TicketAggregates:
+    """Agregados de tickets consumidos pela linha de KPIs e pelos gráficos.
+
+    Pode ser produzido em pandas (`compute_ticket_aggregates`, dados mock) ou a partir
+    de consultas GROUP BY no warehouse (`ticket_aggregates_from_sums`).
+    """
+    kpis: dict
+    daily: pd.DataFrame  # [timestamp, tickets, tnps, ait, tnps_n, ait_n] (médias e contagens de não nulos)
+    by_categoria: pd.DataFrame  # [categoria, qtd, fcr (%)]
+    by_convenio: pd.DataFrame  # [convenio, tickets, tnps, ait] (apenas Consignado)
+
+
+# Colunas de somas/contagens devolvidas pelas consultas agregadas (ver query_builder).
+SUM_COLUMNS = ["tickets", "backlog", "fcr_sum", "fcr_n", "reopen_sum", "reopen_n", "ait_sum", "ait_n", "tnps_sum", "tnps_n"]
+
+
+def _safe_mean(total: pd.Series, n: pd.Series) -> pd.Series:
+    return (total / n.where(n > 0)).astype(float)
+
+
+@traced("metrics.compute_ticket_aggregates")
+def compute_ticket_aggregates(tickets: pd.DataFrame, jobs: pd.DataFrame) -> TicketAggregates:
+    """Caminho pandas (fallback para dados mock): agrega a partir das linhas brutas."""
+    daily = tickets.groupby(pd.Grouper(key="timestamp", freq="D")).agg(
+        tickets=("ticket_id", "size"),
+        tnps=("tnps", "mean"),
+        ait=("ait_min", "mean"),
+        tnps_n=("tnps", "count"),
+        ait_n=("ait_min", "count"),
+    ).reset_index()
+
+    by_categoria = tickets.groupby("categoria", observed=True).agg(qtd=("ticket_id", "size"), fcr=("fcr", "mean")).reset_index()
+    by_categoria["fcr"] *= 100
+
+    by_convenio = tickets[tickets["produto"] == "Consignado"].groupby("convenio", observed=True).agg(
+        tickets=("ticket_id", "count"),
+        tnps=("tnps", "mean"),
+        ait=("ait_min", "mean"),
+    ).reset_index()
+
+    return TicketAggregates(
+        kpis=compute_operational_kpis(tickets, jobs),
+        daily=daily,
+        by_categoria=by_categoria,
+        by_convenio=by_convenio,
+    )
+
+
+@traced("metrics.ticket_aggregates_from_sums")
+def ticket_aggregates_from_sums(
+    daily_sums: pd.DataFrame,
+    categoria_sums: pd.DataFrame,
+    convenio_sums: pd.DataFrame,
+    jobs_total: int,
+) -> TicketAggregates:
+    """Monta `TicketAggregates` a partir de somas/contagens por grupo.
+
+    As médias são recompostas como soma/contagem, então o resultado é exato e
+    equivalente ao caminho pandas.
+    """
+    daily_sums = daily_sums.copy()
+    for col in SUM_COLUMNS:
+        daily_sums[col] = pd.to_numeric(daily_sums[col]).fillna(0)
+    totals = daily_sums[SUM_COLUMNS].sum()
+    tickets_total = int(totals["tickets"])
+
+    def _pct(total_key: str, n_key: str) -> float:
+        return float(totals[total_key] / totals[n_key]) * 100 if tickets_total > 0 and totals[n_key] > 0 else 0.0
+
+    def _mean(total_key: str, n_key: str) -> float:
+        return float(totals[total_key] / totals[n_key]) if tickets_total > 0 and totals[n_key] > 0 else 0.0
+
+    kpis = {
+        "tickets_total": tickets_total,
+        "backlog": int(totals["backlog"]),
+        "fcr": _pct("fcr_sum", "fcr_n"),
+        "reopen_rate": _pct("reopen_sum", "reopen_n"),
+        "ait_mean": _mean("ait_sum", "ait_n"),
+        "tnps_mean": _mean("tnps_sum", "tnps_n"),
+        "jobs_total": int(jobs_total),
+    }
+
+    daily = pd.DataFrame({"timestamp": pd.to_datetime(daily_sums["timestamp"]).dt.floor("D")})
+    daily["tickets"] = daily_sums["tickets"].astype(int).to_numpy()
+    daily["tnps"] = _safe_mean(daily_sums["tnps_sum"], daily_sums["tnps_n"]).to_numpy()
+    daily["ait"] = _safe_mean(daily_sums["ait_sum"], daily_sums["ait_n"]).to_numpy()
+    daily["tnps_n"] = daily_sums["tnps_n"].astype(int).to_numpy()
+    daily["ait_n"] = daily_sums["ait_n"].astype(int).to_numpy()
+    if len(daily) > 0:
+        # Mesmo formato do pd.Grouper: dias sem tickets aparecem com contagem 0
+        full_range = pd.date_range(daily["timestamp"].min(), daily["timestamp"].max(), freq="D", name="timestamp")
+        daily = daily.set_index("timestamp").reindex(full_range)
+        for col in ("tickets", "tnps_n", "ait_n"):
+            daily[col] = daily[col].fillna(0).astype(int)
+        daily = daily.reset_index()
+
+    categoria_sums = categoria_sums.dropna(subset=["categoria"])
+    by_categoria = pd.DataFrame({
+        "categoria": categoria_sums["categoria"].to_numpy(),
+        "qtd": pd.to_numeric(categoria_sums["tickets"]).astype(int).to_numpy(),
+        "fcr": (_safe_mean(pd.to_numeric(categoria_sums["fcr_sum"]), pd.to_numeric(categoria_sums["fcr_n"])) * 100).to_numpy(),
+    })
+
+    convenio_sums = convenio_sums.dropna(subset=["convenio"])
+    by_convenio = pd.DataFrame({
+        "convenio": convenio_sums["convenio"].to_numpy(),
+        "tickets": pd.to_numeric(convenio_sums["tickets"]).astype(int).to_numpy(),
+        "tnps": _safe_mean(pd.to_numeric(convenio_sums["tnps_sum"]), pd.to_numeric(convenio_sums["tnps_n"])).to_numpy(),
+        "ait": _safe_mean(pd.to_numeric(convenio_sums["ait_sum"]), pd.to_numeric(convenio_sums["ait_n"])).to_numpy(),
+    })
+
+    return TicketAggregates(kpis=kpis, daily=daily, by_categoria=by_categoria, by_convenio=by_convenio)
+
+
+# Métricas de série diária: (coluna de soma, coluna de contagem); sem contagem = soma
+SERIES_METRICS = {
+    "volume": ("tickets", None),
+    "ait": ("ait_sum", "ait_n"),
+    "tnps": ("tnps_sum", "tnps_n"),
+}
+
+
+def series_matrix(daily_group_sums: pd.DataFrame, dimension: str, metric: str) -> pd.DataFrame:
+    """Matriz larga (dias × valores da dimensão) a partir de somas por dia × dimensão.
+
+    Volume em dia sem tickets vale 0; médias (AIT, tNPS) ficam NaN nesses dias.
+    """
+    total_col, n_col = SERIES_METRICS[metric]
+    sums = daily_group_sums.dropna(subset=[dimension])
+    if len(sums) == 0:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="timestamp"))
+    day = pd.to_datetime(sums["timestamp"]).dt.floor("D")
+    total = pd.to_numeric(sums[total_col])
+    values = total if n_col is None else _safe_mean(total, pd.to_numeric(sums[n_col]))
+    matrix = (
+        pd.DataFrame({"timestamp": day.to_numpy(), "key": sums[dimension].astype(str).to_numpy(), "value": values.to_numpy()})
+        .pivot_table(index="timestamp", columns="key", values="value", aggfunc="sum", dropna=False)
+    )
+    full_range = pd.date_range(matrix.index.min(), matrix.index.max(), freq="D", name="timestamp")
+    matrix = matrix.reindex(full_range)
+    if n_col is None:
+        matrix = matrix.fillna(0.0)
+    matrix.columns.name = dimension
+    return matrix
@@ -1,12 +1,138 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
+
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import StandardScaler
-from sklearn.pipeline import make_pipeline
+from .instrumentation import traced
+from .model_registry import get_model_registry, predict_proba
+
+
+@dataclass
+class BatchForecast:
+    """Resultado de `forecast_batch`: uma coluna por série.
+
+    - `y`: valores observados (interpolados), índice diário.
+    - `fitted`: ajuste dentro da amostra, mesmo índice de `y`.
+    - `forecast`: previsão dos próximos `horizon` dias.
+    """
+    y: pd.DataFrame
+    fitted: pd.DataFrame
+    forecast: pd.DataFrame
+
+    def __getitem__(self, key) -> "BatchForecast":
+        """Subconjunto das séries (ex.: um nível de colunas MultiIndex)."""
+        return BatchForecast(y=self.y[key], fitted=self.fitted[key], forecast=self.forecast[key])
+
+    def series(self, key) -> pd.DataFrame:
+        """Uma série no formato de `forecast_series_stub`: [ds, y, yhat]."""
+        valid = self.y[key].notna()
+        df_in = pd.DataFrame({"ds": self.y.index[valid], "y": self.y[key][valid].to_numpy(), "yhat": self.fitted[key][valid].to_numpy()})
+        df_future = pd.DataFrame({"ds": self.forecast.index, "y": np.nan, "yhat": self.forecast[key].to_numpy()})
+        return pd.concat([df_in, df_future], ignore_index=True)
+
+    def long(self) -> pd.DataFrame:
+        """Todas as séries empilhadas: [ds, serie, y, yhat] (para gráficos com `color`)."""
+        frames = []
+        for key in self.y.columns:
+            df = self.series(key)
+            df.insert(1, "serie", key)
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame({"ds": [], "serie": [], "y": [], "yhat": []})
+
+
+def _fit_trend_ma(y: np.ndarray, window: int, horizon: int) -> tuple[np.ndarray, np.ndarray]:
+    """Tendência linear + média móvel para todas as colunas de `y` (dias × séries) de uma vez.
+
+    NaN marca dias fora do intervalo observado de cada série: ficam de fora da
+    regressão e da média móvel. Retorna (ajuste na amostra, previsão).
+    """
+    n_days, _ = y.shape
+    valid = ~np.isnan(y)
+    w = valid.astype(float)
+    yv = np.where(valid, y, 0.0)
+    x = np.arange(n_days, dtype=float)[:, None]
+
+    # Mínimos quadrados fechados por coluna: slope = cov(x, y) / var(x)
+    n = w.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = (w * x).sum(axis=0) / n
+        y_mean = yv.sum(axis=0) / n
+        dx = np.where(valid, x - x_mean, 0.0)
+        var_x = (dx * dx).sum(axis=0)
+        slope = np.where(var_x > 0, (dx * (yv - y_mean)).sum(axis=0) / np.where(var_x > 0, var_x, 1.0), 0.0)
+    intercept = y_mean - slope * x_mean
+    trend = slope * x + intercept
+
+    # Média móvel via soma acumulada; janelas incompletas recebem a primeira média válida
+    csum = np.vstack([np.zeros((1, y.shape[1])), np.cumsum(yv, axis=0)])
+    ccount = np.vstack([np.zeros((1, y.shape[1])), np.cumsum(w, axis=0)])
+    ma = np.full(y.shape, np.nan)
+    if n_days >= window:
+        full = (ccount[window:] - ccount[:-window]) == window
+        ma[window - 1:] = np.where(full, (csum[window:] - csum[:-window]) / window, np.nan)
+    ma = pd.DataFrame(ma).bfill().ffill().to_numpy()
+    fitted = np.where(valid, (ma + trend) / 2, np.nan)
+
+    # Última média móvel de cada série (no seu último dia observado)
+    last = n_days - 1 - np.argmax(valid[::-1], axis=0)
+    last_ma = ma[last, np.arange(y.shape[1])]
+    future_x = np.arange(n_days, n_days + horizon, dtype=float)[:, None]
+    forecast = (slope * future_x + intercept + last_ma) / 2
+    return fitted, forecast
+
 
+def _fit_block(args: tuple) -> tuple[np.ndarray, np.ndarray]:
+    return _fit_trend_ma(*args)
 
+
+@traced("ml.forecast_batch")
+def forecast_batch(matrix: pd.DataFrame, horizon: int = 14, n_jobs: int = 1) -> BatchForecast:
+    """Forecast de várias séries diárias de uma vez (tendência linear + média móvel).
+
+    `matrix` é larga: índice de datas, uma coluna por série (ex.: volume por
+    produto). Buracos internos são interpolados; dias antes/depois dos dados de
+    cada série ficam de fora do ajuste. A janela da média móvel é
+    `min(7, max(1, dias // 4))`, como no stub de série única.
+
+    Com `n_jobs > 1`, as colunas são divididas em blocos e ajustadas num pool de
+    processos; compensa só para modelos mais pesados ou milhares de séries.
+    """
+    if matrix.empty:
+        empty = pd.DataFrame(columns=matrix.columns, dtype=float)
+        return BatchForecast(y=empty, fitted=empty, forecast=empty)
+
+    frame = matrix.sort_index().astype(float)
+    frame = frame.asfreq("D").interpolate(limit_area="inside")
+    # Dias sem nenhuma série observada nas pontas não entram no ajuste
+    frame = frame.loc[frame.first_valid_index():frame.last_valid_index()]
+    frame = frame.loc[:, frame.notna().any()]
+    if frame.empty:
+        empty = pd.DataFrame(columns=matrix.columns, dtype=float)
+        return BatchForecast(y=empty, fitted=empty, forecast=empty)
+
+    y = frame.to_numpy()
+    window = min(7, max(1, len(frame) // 4))
+    if n_jobs > 1 and y.shape[1] > n_jobs:
+        from concurrent.futures import ProcessPoolExecutor  # lazy import
+
+        blocks = np.array_split(np.arange(y.shape[1]), n_jobs)
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            parts = list(pool.map(_fit_block, [(y[:, b], window, horizon) for b in blocks]))
+        fitted = np.hstack([p[0] for p in parts])
+        forecast = np.hstack([p[1] for p in parts])
+    else:
+        fitted, forecast = _fit_trend_ma(y, window, horizon)
+
+    future_idx = pd.date_range(frame.index[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
+    return BatchForecast(
+        y=frame,
+        fitted=pd.DataFrame(fitted, index=frame.index, columns=frame.columns),
+        forecast=pd.DataFrame(forecast, index=future_idx, columns=frame.columns),
+    )
+
+
+@traced("ml.forecast_series_stub")
 def forecast_series_stub(series: pd.Series, horizon: int = 14) -> pd.DataFrame:
     """Stub simples: média móvel + tendência linear.
     Retorna DataFrame com colunas [ds, y, yhat].
@@ -14,39 +140,18 @@ def forecast_series_stub(series: pd.Series, horizon: int = 14) -> pd.DataFrame:
     s = series.dropna().astype(float)
     if s.empty:
         return pd.DataFrame({"ds": [], "y": [], "yhat": []})
+    return forecast_batch(s.to_frame("y"), horizon=horizon).series("y")
 
-    s = s.asfreq("D").interpolate()
-    y = s.values
-    x = np.arange(len(y))
-    # ajuste linear
-    A = np.vstack([x, np.ones(len(x))]).T
-    slope, intercept = np.linalg.lstsq(A, y, rcond=None)[0]
-    # média móvel simples
-    ma = pd.Series(y).rolling(window=min(7, max(1, len(y)//4))).mean().bfill().values
-    yhat_in = (ma + (slope * x + intercept)) / 2
-
-    # forecast
-    future_x = np.arange(len(y), len(y) + horizon)
-    future_trend = slope * future_x + intercept
-    future_ma = np.full(horizon, ma[-1])
-    yhat_future = (future_trend + future_ma) / 2
-
-    idx = s.index
-    future_idx = pd.date_range(idx[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
 
-    df_in = pd.DataFrame({"ds": idx, "y": y, "yhat": yhat_in})
-    df_future = pd.DataFrame({"ds": future_idx, "y": np.nan, "yhat": yhat_future})
-    return pd.concat([df_in, df_future], ignore_index=True)
-
-
-def score_conversion_propensity_stub(X: pd.DataFrame, y: pd.Series) -> np.ndarray:
-    """Treina rapidamente um classificador logístico e retorna probabilidades positivas.
+@traced("ml.score_conversion_propensity_stub")
+def score_conversion_propensity_stub(X: pd.DataFrame, y: pd.Series, data_key: str | None = None) -> np.ndarray:
+    """Retorna probabilidades positivas de um classificador logístico.
     Se y não for fornecido completo, usa rótulos binários simples com base em mediana.
+    O modelo é treinado uma vez por (dados, features) e servido do registry
+    (memória/disco); `data_key` dispensa o hash das linhas de treino.
     """
     if y is None or y.isna().all():
         y = (X.mean(axis=1) > X.mean(axis=1).median()).astype(int)
-    model = make_pipeline(StandardScaler(with_mean=False), LogisticRegression(max_iter=200))
-    model.fit(X.fillna(0.0), y)
-    return model.predict_proba(X.fillna(0.0))[:, 1]
-
-
+    features = list(X.columns)
+    model = get_model_registry().get_or_train(X, y, features=features, data_key=data_key)
+    return predict_proba(model, X, features=features)
@@ -9,44 +9,107 @@ random.seed(42)
 np.random.seed(42)
 
 
-def generate_mock_tickets(days: int = 120) -> pd.DataFrame:
-    start = pd.to_datetime(datetime.utcnow().date() - timedelta(days=days))
-    rows = []
-    categorias = ["Onboarding", "Cobrança", "Cartão", "Consignado", "Crédito", "Outros"]
-    canais = ["App", "Chat", "Telefone", "Email"]
-    produtos = ["Pessoal", "Cartão", "Consignado"]
-    convenios = ["INSS", "SIAPE", "SEDUC", "PM", "OUTROS"]
-    ufs = ["SP", "RJ", "MG", "RS", "BA", "PR", "SC", "DF"]
-    prioridades = ["Baixa", "Média", "Alta"]
-
-    ticket_id = 1
-    for d in pd.date_range(start, periods=days, freq="D"):
-        num = np.random.poisson(lam=180)
-        for _ in range(num):
-            produto = random.choice(produtos)
-            convenio = random.choice(convenios) if produto == "Consignado" else None
-            ait = max(2, np.random.normal(loc=25 if produto != "Consignado" else 35, scale=10))
-            tnps = np.clip(np.random.normal(loc=55 if produto != "Consignado" else 50, scale=15), -100, 100)
-            fcr = np.random.rand() < 0.75
-            reopen = np.random.rand() < 0.08
+CATEGORIAS = ["Onboarding", "Cobrança", "Cartão", "Consignado", "Crédito", "Outros"]
+CANAIS = ["App", "Chat", "Telefone", "Email"]
+PRODUTOS = ["Pessoal", "Cartão", "Consignado"]
+CONVENIOS = ["INSS", "SIAPE", "SEDUC", "PM", "OUTROS"]
+UFS = ["SP", "RJ", "MG", "RS", "BA", "PR", "SC", "DF"]
+PRIORIDADES = ["Baixa", "Média", "Alta"]
+SEGMENTOS = ["PF", "PJ"]
 
-            rows.append({
-                "ticket_id": ticket_id,
-                "timestamp": d + timedelta(minutes=random.randint(0, 24*60-1)),
-                "canal": random.choice(canais),
-                "produto": produto,
-                "convenio": convenio,
-                "segmento": random.choice(["PF", "PJ"]),
-                "estado": random.choice(ufs),
-                "prioridade": random.choice(prioridades),
-                "categoria": random.choice(categorias),
-                "fcr": 1 if fcr else 0,
-                "reopen": 1 if reopen else 0,
-                "ait_min": float(ait),
-                "tnps": float(tnps),
-            })
-            ticket_id += 1
-    return pd.DataFrame(rows)
+_CONSIGNADO = PRODUTOS.index("Consignado")
+
+
+def _categorical(codes: np.ndarray, categories: list) -> pd.Categorical:
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def iter_mock_ticket_chunks(
+    days: int = 120,
+    tickets_per_day: float = 180,
+    seed: int = 42,
+    chunk_days: int = 30,
+    start: pd.Timestamp | None = None,
+):
+    """Gera tickets mock em blocos de `chunk_days` dias (DataFrames independentes).
+
+    Cada coluna é sorteada de uma vez em NumPy, com as mesmas distribuições do
+    gerador original: volume diário ~ Poisson(`tickets_per_day`), dimensões
+    uniformes, convênio só para Consignado, AIT ~ N(25|35, 10) com piso 2,
+    tNPS ~ N(55|50, 15) em [-100, 100], FCR 75% e reabertura 8%.
+    Memória proporcional ao bloco, não ao total — serve para gerar milhões de linhas.
+    """
+    rng = np.random.default_rng(seed)
+    if start is None:
+        start = pd.to_datetime(datetime.utcnow().date() - timedelta(days=days))
+    start64 = np.datetime64(pd.Timestamp(start).to_datetime64(), "ns")
+    next_id = 1
+    for first_day in range(0, days, chunk_days):
+        n_days = min(chunk_days, days - first_day)
+        per_day = rng.poisson(lam=tickets_per_day, size=n_days)
+        n = int(per_day.sum())
+        day_offset = np.repeat(np.arange(first_day, first_day + n_days), per_day)
+
+        produto = rng.integers(0, len(PRODUTOS), size=n)
+        consignado = produto == _CONSIGNADO
+        convenio = np.where(consignado, rng.integers(0, len(CONVENIOS), size=n), -1)
+        ait = np.maximum(2, rng.normal(loc=np.where(consignado, 35, 25), scale=10))
+        tnps = np.clip(rng.normal(loc=np.where(consignado, 50, 55), scale=15), -100, 100)
+        minutes = rng.integers(0, 24 * 60, size=n)
+
+        yield pd.DataFrame({
+            "ticket_id": np.arange(next_id, next_id + n, dtype=np.int64),
+            "timestamp": start64 + day_offset.astype("timedelta64[D]") + minutes.astype("timedelta64[m]"),
+            "canal": _categorical(rng.integers(0, len(CANAIS), size=n), CANAIS),
+            "produto": _categorical(produto, PRODUTOS),
+            "convenio": _categorical(convenio, CONVENIOS),
+            "segmento": _categorical(rng.integers(0, len(SEGMENTOS), size=n), SEGMENTOS),
+            "estado": _categorical(rng.integers(0, len(UFS), size=n), UFS),
+            "prioridade": _categorical(rng.integers(0, len(PRIORIDADES), size=n), PRIORIDADES),
+            "categoria": _categorical(rng.integers(0, len(CATEGORIAS), size=n), CATEGORIAS),
+            "fcr": (rng.random(n) < 0.75).astype(np.int8),
+            "reopen": (rng.random(n) < 0.08).astype(np.int8),
+            "ait_min": ait,
+            "tnps": tnps,
+        })
+        next_id += n
+
+
+def generate_mock_tickets(days: int = 120, tickets_per_day: float = 180, seed: int = 42) -> pd.DataFrame:
+    chunks = list(iter_mock_ticket_chunks(days=days, tickets_per_day=tickets_per_day, seed=seed))
+    if not chunks:
+        return pd.DataFrame(columns=["ticket_id", "timestamp", "canal", "produto", "convenio", "segmento",
+                                     "estado", "prioridade", "categoria", "fcr", "reopen", "ait_min", "tnps"])
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_mock_tickets_parquet(
+    path: str,
+    days: int = 120,
+    tickets_per_day: float = 180,
+    seed: int = 42,
+    chunk_days: int = 30,
+) -> int:
+    """Grava tickets mock em um arquivo Parquet bloco a bloco; retorna o total de linhas.
+
+    Útil para testes de carga em escala de produção sem montar tudo em memória.
+    """
+    import pyarrow as pa  # lazy import
+    import pyarrow.parquet as pq
+
+    total = 0
+    writer = None
+    try:
+        for chunk in iter_mock_ticket_chunks(days=days, tickets_per_day=tickets_per_day, seed=seed, chunk_days=chunk_days):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            total += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
 
 
 def generate_mock_jobs(days: int = 120) -> pd.DataFrame:
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .config import load_disk_cache_config
+from .instrumentation import span, traced
+
+
+# Versão da receita do modelo: mudar o pipeline invalida os modelos já salvos
+PROPENSITY_SPEC = "standard-scaler+logreg-v1"
+PREDICT_CHUNK_ROWS = 100_000
+MEMORY_MAX_MODELS = 32
+
+
+class ConstantPropensity:
+    """Modelo degenerado para alvo com uma única classe: probabilidade constante.
+
+    `LogisticRegression` recusa treinar nesse caso; devolver a taxa observada
+    (0 ou 1) mantém a aba funcionando e deixa claro que não há sinal para aprender.
+    """
+
+    def __init__(self, rate: float, features: Sequence[str] = ()):
+        self.rate = float(rate)
+        # Mesmo atributo que o sklearn grava no fit, para `predict_proba` selecionar as colunas
+        self.feature_names_in_ = np.asarray(list(features), dtype=object)
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        n = len(X)
+        return np.column_stack([np.full(n, 1.0 - self.rate), np.full(n, self.rate)])
+
+
+def model_key(X: pd.DataFrame, y: pd.Series, features: Sequence[str], data_key: Optional[str] = None) -> str:
+    """Chave do modelo: receita + conjunto de features + dados de treino.
+
+    Com `data_key` (ex.: versão dos dados + filtros), o hash das linhas é dispensado.
+    """
+    h = hashlib.sha1()
+    h.update(PROPENSITY_SPEC.encode())
+    h.update("\0".join(features).encode())
+    if data_key is not None:
+        h.update(str(data_key).encode())
+    else:
+        h.update(pd.util.hash_pandas_object(X[list(features)], index=False).to_numpy().tobytes())
+        h.update(pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:20]
+
+
+def _train(X: pd.DataFrame, y: pd.Series) -> Any:
+    if y.nunique(dropna=True) < 2:
+        return ConstantPropensity(float(y.iloc[0]) if len(y) else 0.0, X.columns)
+
+    from sklearn.linear_model import LogisticRegression  # lazy import
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    model = make_pipeline(StandardScaler(with_mean=False), LogisticRegression(max_iter=200))
+    model.fit(X, y)
+    return model
+
+
+class ModelRegistry:
+    """Modelos de propensão treinados uma vez por (dados, features) e reaproveitados.
+
+    Busca em memória (LRU de `MEMORY_MAX_MODELS`), depois em disco (`<root>/<chave>.joblib`,
+    compartilhado entre processos/réplicas) e só então treina. Escritas vão para um
+    arquivo temporário e são publicadas com rename.
+
+    Cada versão dos dados gera modelos novos, então o diretório é limpo como o cache
+    Parquet: arquivos sem uso há mais de `ttl_s` são removidos e, se o total passar de
+    `max_bytes`, saem os usados há mais tempo (o acesso é registrado no mtime).
+    """
+
+    def __init__(
+        self,
+        root: Optional[str | os.PathLike] = None,
+        ttl_s: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.root = Path(root) if root is not None else None
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.trainings = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Optional[Path]:
+        return self.root / f"{key}.joblib" if self.root is not None else None
+
+    def _remember(self, key: str, model: Any) -> None:
+        with self._lock:
+            self._memory[key] = model
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_MAX_MODELS:
+                self._memory.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        if path is None or not path.exists():
+            return None
+        import joblib  # lazy import
+
+        try:
+            model = joblib.load(path)
+            os.utime(path)  # último acesso, para TTL/LRU
+            return model
+        except FileNotFoundError:
+            return None  # removido por outra réplica entre o exists() e o load
+        except Exception:
+            # Arquivo corrompido/incompatível: descarta e treina de novo
+            path.unlink(missing_ok=True)
+            return None
+
+    def _save(self, key: str, model: Any) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+        import joblib  # lazy import
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".tmp-{key}-{uuid.uuid4().hex[:8]}")
+            joblib.dump(model, tmp)
+            os.replace(tmp, path)
+        except OSError:
+            return  # sem disco gravável: o modelo continua em memória
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove modelos sem uso há mais de `ttl_s` e, se preciso, os menos usados até caber em `max_bytes`."""
+        if self.root is None or not self.root.exists():
+            return 0
+        now = time.time()
+        removed = 0
+        live = []
+        for path in self.root.glob("*.joblib"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if self.ttl_s is not None and now - st.st_mtime > self.ttl_s:
+                path.unlink(missing_ok=True)
+                removed += 1
+            else:
+                live.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in live)
+        for _, size, path in sorted(live):
+            if self.max_bytes is None or total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        self.evictions += removed
+        return removed
+
+    def get_or_train(
+        self,
+        X: pd.DataFrame,
+        y: pd.Series,
+        features: Optional[Sequence[str]] = None,
+        data_key: Optional[str] = None,
+    ) -> Any:
+        features = list(features) if features is not None else list(X.columns)
+        key = model_key(X, y, features, data_key)
+        with self._lock:
+            model = self._memory.get(key)
+            if model is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return model
+        with span("model_registry.load", key=key) as s:
+            model = self._load(key)
+            s.set(found=model is not None)
+        if model is not None:
+            self.disk_hits += 1
+        else:
+            with span("model_registry.train", key=key) as s:
+                model = _train(X[features].fillna(0.0), y)
+                s.set(rows=len(X))
+            self.trainings += 1
+            self._save(key, model)
+        self._remember(key, model)
+        return model
+
+    def stats(self) -> dict:
+        return {
+            "memory": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "trainings": self.trainings,
+            "evictions": self.evictions,
+        }
+
+
+@traced("model_registry.predict_proba")
+def predict_proba(
+    model: Any,
+    X: pd.DataFrame,
+    features: Optional[Sequence[str]] = None,
+    chunk_rows: int = PREDICT_CHUNK_ROWS,
+) -> np.ndarray:
+    """Probabilidade da classe positiva, pontuando `X` em blocos de `chunk_rows` linhas.
+
+    Pontua só as `features` do treino (padrão: as gravadas no modelo em `feature_names_in_`),
+    na ordem do treino; colunas a mais em `X` são ignoradas e as que faltarem geram `KeyError`.
+    Mantém o pico de memória proporcional ao bloco (não ao frame inteiro).
+    """
+    if features is None:
+        features = getattr(model, "feature_names_in_", None)
+    if features is not None:
+        X = X[list(features)]
+    out = np.empty(len(X), dtype=np.float64)
+    for start in range(0, len(X), chunk_rows):
+        chunk = X.iloc[start:start + chunk_rows].fillna(0.0)
+        out[start:start + len(chunk)] = model.predict_proba(chunk)[:, 1]
+    return out
+
+
+_REGISTRY: Optional[ModelRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Registry do processo; persiste em `<DISK_CACHE_DIR>/models` quando o cache em disco está ligado."""
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            cfg = load_disk_cache_config()
+            root = Path(cfg.path) / "models" / "propensity" if cfg.enabled and cfg.path else None
+            _REGISTRY = ModelRegistry(root, ttl_s=cfg.ttl_s, max_bytes=cfg.models_max_bytes)
+            _REGISTRY.evict()  # modelos que expiraram enquanto o processo estava parado
+        return _REGISTRY
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+
+# Projeção explícita por tabela lógica: apenas as colunas que o app consome.
+TABLE_COLUMNS: Dict[str, List[str]] = {
+    "tickets": [
+        "ticket_id",
+        "timestamp",
+        "canal",
+        "produto",
+        "convenio",
+        "segmento",
+        "estado",
+        "prioridade",
+        "categoria",
+        "fcr",
+        "reopen",
+        "ait_min",
+        "tnps",
+    ],
+    "jobs": ["job", "timestamp", "status", "duration_s"],
+    "product_metrics": ["date", "product", "applications", "approvals", "conversions", "eligibility_rate"],
+}
+
+# Coluna temporal usada para recorte de período em cada tabela.
+TIME_COLUMNS: Dict[str, str] = {
+    "tickets": "timestamp",
+    "jobs": "timestamp",
+    "product_metrics": "date",
+}
+
+# Mapeia as chaves do dicionário de filtros (sidebar) para colunas de cada tabela.
+# Mantém a mesma semântica de `src.filters.apply_filters`.
+DIMENSION_COLUMNS: Dict[str, Dict[str, str]] = {
+    "tickets": {
+        "canal": "canal",
+        "produto": "produto",
+        "convenio": "convenio",
+        "segmento": "segmento",
+        "estado": "estado",
+        "prioridade": "prioridade",
+        "categoria": "categoria",
+    },
+    "jobs": {},
+    "product_metrics": {"produto": "product"},
+}
+
+
+def _quote_identifier(name: str) -> str:
+    return f"`{name.replace('`', '``')}`"
+
+
+def _with_condition(where: str, condition: str) -> str:
+    return f"{where} AND {condition}" if where else f"WHERE {condition}"
+
+
+def _join_sql(*parts: str) -> str:
+    return " ".join(p for p in parts if p)
+
+
+def _as_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.to_datetime(value).date()
+
+
+def build_where(table: str, filters: Optional[dict]) -> Tuple[str, Dict[str, Any]]:
+    """Converte o dicionário de filtros da sidebar em cláusula WHERE parametrizada.
+
+    Retorna (cláusula, params). A cláusula usa marcadores nomeados `:nome`, que
+    `run_query` envia ao conector como parâmetros nativos (os valores nunca entram no
+    texto da SQL). Listas viram um marcador por valor (`:f_canal_0, :f_canal_1...`).
+    Cláusula vazia significa "sem filtro".
+    """
+    if not filters:
+        return "", {}
+
+    conditions: List[str] = []
+    params: Dict[str, Any] = {}
+
+    date_range = filters.get("date_range")
+    if date_range and len(date_range) == 2:
+        start, end = (_as_date(v) for v in date_range)
+        time_col = _quote_identifier(TIME_COLUMNS[table])
+        params["start_date"] = start.isoformat()
+        if table == "product_metrics":
+            params["end_date"] = end.isoformat()
+            conditions.append(f"CAST({time_col} AS DATE) BETWEEN CAST(:start_date AS DATE) AND CAST(:end_date AS DATE)")
+        else:
+            # Limite superior inclusivo, como em apply_filters (end + 1 dia)
+            params["end_date"] = (end + timedelta(days=1)).isoformat()
+            conditions.append(
+                f"{time_col} >= CAST(:start_date AS TIMESTAMP) AND {time_col} <= CAST(:end_date AS TIMESTAMP)"
+            )
+
+    for key, column in DIMENSION_COLUMNS.get(table, {}).items():
+        values = [v for v in filters.get(key, []) or [] if v is not None]
+        if not values:
+            continue
+        names = []
+        for i, value in enumerate(sorted({str(v) for v in values})):
+            names.append(f":f_{key}_{i}")
+            params[f"f_{key}_{i}"] = value
+        conditions.append(f"{_quote_identifier(column)} IN ({', '.join(names)})")
+
+    if not conditions:
+        return "", {}
+    return "WHERE " + " AND ".join(conditions), params
+
+
+def build_select(
+    table: str,
+    table_name: str,
+    filters: Optional[dict] = None,
+    columns: Optional[Sequence[str]] = None,
+    since: Optional[Any] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """Monta `SELECT <projeção> FROM <tabela> [WHERE ...]` para uma tabela lógica.
+
+    `table` é o nome lógico ("tickets", "jobs", "product_metrics") e `table_name`
+    o nome totalmente qualificado no catálogo. `since` (watermark) restringe a linhas
+    com coluna temporal >= ao valor, para refresh incremental.
+    """
+    if table not in TABLE_COLUMNS:
+        raise ValueError(f"Tabela desconhecida: {table}")
+    cols = list(columns) if columns is not None else TABLE_COLUMNS[table]
+    projection = ", ".join(_quote_identifier(c) for c in cols)
+    where, params = build_where(table, filters)
+    if since is not None:
+        params["since"] = pd.Timestamp(since).isoformat(sep=" ")
+        where = _with_condition(where, f"{_quote_identifier(TIME_COLUMNS[table])} >= CAST(:since AS TIMESTAMP)")
+    return _join_sql(f"SELECT {projection} FROM {table_name}", where), params
+
+
+# Somas/contagens por grupo: médias são recompostas no app como soma/contagem
+# (ver `src.metrics.ticket_aggregates_from_sums`), mantendo o resultado exato.
+_TICKET_SUM_EXPRS = [
+    "COUNT(*) AS `tickets`",
+    "SUM(CASE WHEN `reopen` = 1 THEN 1 ELSE 0 END) AS `backlog`",
+    "SUM(`fcr`) AS `fcr_sum`",
+    "COUNT(`fcr`) AS `fcr_n`",
+    "SUM(`reopen`) AS `reopen_sum`",
+    "COUNT(`reopen`) AS `reopen_n`",
+    "SUM(`ait_min`) AS `ait_sum`",
+    "COUNT(`ait_min`) AS `ait_n`",
+    "SUM(`tnps`) AS `tnps_sum`",
+    "COUNT(`tnps`) AS `tnps_n`",
+]
+
+
+def build_ticket_daily_sums(table_name: str, filters: Optional[dict] = None) -> Tuple[str, Dict[str, Any]]:
+    """GROUP BY dia com somas/contagens de tickets (série diária e KPIs)."""
+    where, params = build_where("tickets", filters)
+    select = ", ".join(["DATE_TRUNC('DAY', `timestamp`) AS `timestamp`", *_TICKET_SUM_EXPRS])
+    sql_text = _join_sql(f"SELECT {select} FROM {table_name}", where, "GROUP BY 1 ORDER BY 1")
+    return sql_text, params
+
+
+def build_ticket_group_sums(
+    table_name: str,
+    dimension: str,
+    filters: Optional[dict] = None,
+    condition: Optional[str] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """GROUP BY em uma dimensão de tickets (ex.: categoria, convenio)."""
+    if dimension not in DIMENSION_COLUMNS["tickets"].values():
+        raise ValueError(f"Dimensão desconhecida: {dimension}")
+    where, params = build_where("tickets", filters)
+    if condition:
+        where = _with_condition(where, condition)
+    col = _quote_identifier(dimension)
+    select = ", ".join([col, *_TICKET_SUM_EXPRS])
+    sql_text = _join_sql(f"SELECT {select} FROM {table_name}", where, f"GROUP BY {col}")
+    return sql_text, params
+
+
+def build_ticket_daily_group_sums(
+    table_name: str,
+    dimension: str,
+    filters: Optional[dict] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """GROUP BY dia × dimensão (uma série diária por valor da dimensão, para forecast)."""
+    if dimension not in DIMENSION_COLUMNS["tickets"].values():
+        raise ValueError(f"Dimensão desconhecida: {dimension}")
+    where, params = build_where("tickets", filters)
+    col = _quote_identifier(dimension)
+    select = ", ".join(["DATE_TRUNC('DAY', `timestamp`) AS `timestamp`", col, *_TICKET_SUM_EXPRS])
+    sql_text = _join_sql(f"SELECT {select} FROM {table_name}", where, "GROUP BY 1, 2 ORDER BY 1")
+    return sql_text, params
+
+
+def build_ticket_quantiles(
+    table_name: str,
+    column: str,
+    quantiles: Sequence[float],
+    dimension: Optional[str] = None,
+    filters: Optional[dict] = None,
+    condition: Optional[str] = None,
+    accuracy: int = 10_000,
+) -> Tuple[str, Dict[str, Any]]:
+    """Percentis aproximados (`PERCENTILE_APPROX`) de `column`, no total ou por `dimension`.
+
+    Colunas de saída: [dimension?, n, p50, p90, ...], como `QuantileSketches.quantiles`.
+    O erro do warehouse é de posição (≈ 1/`accuracy` do total), não de valor.
+    """
+    if column not in ("ait_min", "tnps"):
+        raise ValueError(f"Coluna sem percentis: {column}")
+    if dimension is not None and dimension not in DIMENSION_COLUMNS["tickets"].values():
+        raise ValueError(f"Dimensão desconhecida: {dimension}")
+    where, params = build_where("tickets", filters)
+    if condition:
+        where = _with_condition(where, condition)
+    col = _quote_identifier(column)
+    where = _with_condition(where, f"{col} IS NOT NULL")
+    exprs = [f"COUNT({col}) AS `n`"]
+    exprs += [f"PERCENTILE_APPROX({col}, {q}, {int(accuracy)}) AS `p{q * 100:g}`" for q in quantiles]
+    if dimension is None:
+        return _join_sql(f"SELECT {', '.join(exprs)} FROM {table_name}", where), params
+    dim = _quote_identifier(dimension)
+    where = _with_condition(where, f"{dim} IS NOT NULL")
+    sql_text = _join_sql(f"SELECT {dim}, {', '.join(exprs)} FROM {table_name}", where, f"GROUP BY {dim} ORDER BY {dim}")
+    return sql_text, params
+
+
+def build_count(table: str, table_name: str, filters: Optional[dict] = None) -> Tuple[str, Dict[str, Any]]:
+    """`SELECT COUNT(*) AS n` com os mesmos filtros da tabela lógica."""
+    where, params = build_where(table, filters)
+    sql_text = _join_sql(f"SELECT COUNT(*) AS `n` FROM {table_name}", where)
+    return sql_text, params
+
+
+def build_time_bounds(table: str, table_name: str) -> Tuple[str, Dict[str, Any]]:
+    """`SELECT MIN/MAX` da coluna temporal (período disponível no catálogo de filtros)."""
+    col = _quote_identifier(TIME_COLUMNS[table])
+    return f"SELECT MIN({col}) AS `min_time`, MAX({col}) AS `max_time` FROM {table_name}", {}
+
+
+def build_watermark(table: str, table_name: str) -> Tuple[str, Dict[str, Any]]:
+    """`COUNT(*)` e `MIN`/`MAX` da coluna temporal: versão da tabela (refresh) e período disponível."""
+    col = _quote_identifier(TIME_COLUMNS[table])
+    return f"SELECT COUNT(*) AS `n`, MIN({col}) AS `min_time`, MAX({col}) AS `max_time` FROM {table_name}", {}
+
+
+def build_dimension_values(table: str, table_name: str) -> Tuple[str, Dict[str, Any]]:
+    """Valores distintos de todas as dimensões de `table` numa única varredura.
+
+    `GROUPING SETS` com um conjunto por dimensão: cada linha traz um valor de uma
+    dimensão e NULL nas demais (linhas de NULL da própria dimensão são descartadas
+    por quem lê).
+    """
+    columns = [_quote_identifier(c) for c in DIMENSION_COLUMNS[table].values()]
+    if not columns:
+        raise ValueError(f"Tabela sem dimensões: {table}")
+    sets = ", ".join(f"({c})" for c in columns)
+    sql_text = f"SELECT {', '.join(columns)} FROM {table_name} GROUP BY GROUPING SETS ({sets})"
+    return sql_text, {}
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import dataclasses
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+from .config import DatabricksConfig
+from .cube import CubeBuilder
+from .data_access import (
+    DataSource,
+    TableWatermark,
+    can_extend,
+    changed_tables,
+    load_all_data,
+    load_watermarks,
+    make_data_source,
+    refresh_table,
+    run_concurrently,
+    source_after,
+)
+from .instrumentation import traced
+from .sketch import SketchBuilder
+from .streaming import attach_cube, fold_ticket_chunks, iter_table_chunks
+
+
+class IncrementalLoader:
+    """Mantém o `DataSource` base em memória e detecta dados novos por watermark.
+
+    No modo Databricks a base não guarda linhas: só os metadados de versão de cada
+    tabela (`COUNT(*)` e `MAX` da coluna temporal, ver `load_watermarks`). As visões
+    filtradas são buscadas sob demanda com a versão na chave, então dados novos só
+    invalidam o que depende deles. A cada `interval_s` os metadados são relidos; se
+    não mudaram, a versão (e tudo que está em cache para ela) continua valendo; se
+    mudaram, cada visão já em cache é estendida só com as linhas novas (`refresh_view`).
+    No modo mock, a primeira chamada gera os dados em memória e não há refresh.
+
+    Cada refresh publica um novo `DataSource`, então leitores concorrentes sempre
+    veem um snapshot consistente. Pensado para ser compartilhado entre sessões
+    (ex.: `st.cache_resource`).
+    """
+
+    def __init__(self, cfg: Optional[DatabricksConfig], use_databricks: bool, interval_s: float):
+        self.cfg = cfg
+        self.use_databricks = use_databricks
+        self.interval_s = interval_s
+        self._ds: Optional[DataSource] = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> DataSource:
+        """Snapshot atual; dispara refresh dos watermarks se o intervalo venceu."""
+        ds = self._ds
+        if ds is None:
+            return self.refresh(force=False)
+        if self.use_databricks and self._is_due():
+            return self.refresh(blocking=False, force=False)
+        return ds
+
+    def _is_due(self) -> bool:
+        return time.monotonic() - self._last_refresh >= self.interval_s
+
+    def refresh(self, blocking: bool = True, force: bool = True) -> DataSource:
+        """Relê os watermarks de cada tabela e publica um novo `DataSource`.
+
+        Com `blocking=False`, se outra sessão já está atualizando, retorna o snapshot
+        atual; com `force=False`, não refaz um refresh que outra sessão acabou de concluir.
+        """
+        if not self._lock.acquire(blocking=blocking):
+            assert self._ds is not None
+            return self._ds
+        try:
+            current = self._ds
+            if current is None and not self.use_databricks:
+                self._ds = load_all_data(use_databricks=False)
+            elif current is None or (self.use_databricks and (force or self._is_due())):
+                assert self.cfg is not None
+                self._ds = self._fetch_watermarks(current, self.cfg)
+            else:
+                return current
+            self._last_refresh = time.monotonic()
+            return self._ds
+        finally:
+            self._lock.release()
+
+    def _fetch_watermarks(self, current: Optional[DataSource], cfg: DatabricksConfig) -> DataSource:
+        ds = load_watermarks(cfg, previous=current.watermarks if current is not None else None)
+        if current is not None and ds.version == current.version:
+            # Nada novo: mantém os objetos já construídos para a versão (ex.: catálogo)
+            return dataclasses.replace(current, load_report=ds.load_report, refreshed_at=ds.refreshed_at)
+        return ds
+
+
+@traced("refresh.refresh_view")
+def refresh_view(
+    view: DataSource,
+    cfg: DatabricksConfig,
+    filters: Optional[dict],
+    watermarks: Dict[str, TableWatermark],
+) -> DataSource:
+    """Atualiza uma visão lida em watermarks anteriores para `watermarks`, sem reler o período.
+
+    Cada tabela que mudou busca só as linhas com tempo >= ao watermark em que a visão
+    foi lida (`build_select(since=...)`) e as junta ao recorte (`merge_since`). Cubo e
+    sketches (da visão em streaming ou já construídos sobre as linhas) mantêm os dias
+    anteriores ao do watermark e refazem só daí em diante. Tabela reescrita (encolheu
+    ou voltou no tempo) é relida inteira; tabela que falhar fica como estava e aparece
+    no relatório. A visão anterior não é alterada: sai um novo `DataSource`, com nova versão.
+    """
+    changed = changed_tables(view, watermarks)
+    streamed = view.tickets.empty and view.cube is not None
+    previous = view.source_watermarks.get("tickets")
+    since_day = None
+    if "tickets" in changed and view.cube is not None and can_extend(previous, watermarks["tickets"]):
+        since_day = previous.max_time.floor("D")
+
+    tasks = {}
+    for t in changed:
+        if t == "tickets" and streamed:
+            # Sem linhas guardadas: relê do warehouse só os dias a refazer (ou tudo, se reescrita)
+            tasks[t] = lambda: _extend_rollups(view, since_day, iter_table_chunks("tickets", cfg, filters, since=since_day))
+        else:
+            tasks[t] = lambda t=t: refresh_table(view, t, cfg, filters, watermarks[t])
+    results, report = run_concurrently(tasks)
+
+    tickets, cube, sketches = view.tickets, view.cube, view.sketches
+    if "tickets" in results and streamed:
+        cube, sketches = results["tickets"]
+    elif "tickets" in results:
+        tickets = results["tickets"]
+        cube = sketches = None  # reconstruídos sob demanda a partir das linhas
+        if since_day is not None:
+            cube, sketches = _extend_rollups(view, since_day, [tickets[tickets["timestamp"] >= since_day]])
+    ds = make_data_source(
+        tickets,
+        results.get("jobs", view.jobs),
+        results.get("product_metrics", view.product_metrics),
+        load_report=report,
+    )
+    ds.source_watermarks = source_after(view, watermarks, report)
+    if streamed:
+        attach_cube(ds, cube, sketches)
+    else:
+        ds.cube, ds.sketches = cube, sketches
+    return ds
+
+
+def _extend_rollups(view: DataSource, since_day: Optional[pd.Timestamp], chunks: Iterable[pd.DataFrame]):
+    """Cubo e sketches da visão com os dias a partir de `since_day` refeitos a partir de `chunks`.
+
+    Sem `since_day`, os blocos são o recorte inteiro e nada da visão anterior é mantido.
+    """
+    cube = CubeBuilder()
+    sketches = SketchBuilder() if view.sketches is not None else None
+    if since_day is not None:
+        cube.add_cells(view.cube.cells_before(since_day))
+        if sketches is not None:
+            sketches.add_entries(view.sketches.entries_before(since_day))
+    built = fold_ticket_chunks(chunks, sketches=sketches, builder=cube)
+    return built, sketches.build() if sketches is not None else None
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .catalog import get_catalog
+from .cube import concat_cells
+from .data_access import DataSource
+from .filters import TICKET_DIMENSIONS, TableIndex, date_bounds, filter_table
+from .instrumentation import span, traced
+from .query_builder import TABLE_COLUMNS
+
+
+# Métricas com percentis (chave -> coluna de tickets) e percentis exibidos
+SKETCH_METRICS = {"ait": "ait_min", "tnps": "tnps"}
+QUANTILES = (0.5, 0.9, 0.99)
+# Grão dos sketches: dia × estas dimensões (as de abertura dos percentis). As demais
+# dimensões da sidebar ficam fora para o número de sketches não crescer com os tickets.
+SKETCH_DIMENSIONS = ("canal", "produto", "convenio")
+
+# Erro relativo máximo do valor de cada percentil (ver LogMapping)
+RELATIVE_ACCURACY = 0.01
+# |x| abaixo disso cai no bucket zero (erro absoluto < MIN_INDEXABLE); acima de
+# MAX_INDEXABLE é truncado no último bucket
+MIN_INDEXABLE = 1e-2
+MAX_INDEXABLE = 1e6
+
+
+class LogMapping:
+    """Buckets logarítmicos com sinal (estilo DDSketch).
+
+    O bucket `i > 0` cobre |x| em (γ^(j-1), γ^j] e devolve 2·γ^j/(γ+1), com
+    γ = (1+α)/(1-α): qualquer valor do bucket fica a no máximo α (relativo) do
+    representante. Negativos usam os mesmos buckets espelhados (`-i`) e |x| <
+    `min_indexable` vai para o bucket 0, então a ordem dos buckets é a ordem dos valores.
+    """
+
+    def __init__(self, alpha: float = RELATIVE_ACCURACY, min_indexable: float = MIN_INDEXABLE, max_indexable: float = MAX_INDEXABLE):
+        self.alpha = alpha
+        self.min_indexable = min_indexable
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.ceil(math.log(min_indexable) / self._log_gamma) - 1
+        self.max_bucket = math.ceil(math.log(max_indexable) / self._log_gamma) - self._offset
+        # Buckets com deslocamento (0..n_buckets-1) para bincount: deslocado = bucket + max_bucket
+        self.n_buckets = 2 * self.max_bucket + 1
+
+    def to_bucket(self, values: np.ndarray) -> np.ndarray:
+        """Bucket deslocado (não negativo, ordenado como os valores) de cada valor."""
+        values = np.asarray(values, dtype=np.float64)
+        magnitude = np.abs(values)
+        with np.errstate(divide="ignore"):
+            i = np.ceil(np.log(np.maximum(magnitude, self.min_indexable)) / self._log_gamma) - self._offset
+        i = np.where(magnitude < self.min_indexable, 0, np.clip(i, 1, self.max_bucket))
+        return (np.sign(values) * i + self.max_bucket).astype(np.int16 if self.n_buckets < 2**15 else np.int32)
+
+    def to_value(self, buckets: np.ndarray) -> np.ndarray:
+        """Representante de cada bucket deslocado."""
+        signed = np.asarray(buckets, dtype=np.int64) - self.max_bucket
+        i = np.abs(signed)
+        magnitude = 2 * self.gamma ** (i + self._offset).astype(np.float64) / (self.gamma + 1)
+        return np.where(i == 0, 0.0, np.sign(signed) * magnitude)
+
+
+MAPPING = LogMapping()
+
+
+def sketch_entries(tickets: pd.DataFrame, column: str, mapping: LogMapping = MAPPING) -> pd.DataFrame:
+    """Histograma esparso de `column`: uma linha por (dia, dimensões, bucket) com a contagem.
+
+    Contagens somam ao juntar sketches (mesmos buckets fixos), então merges são exatos:
+    o erro vem só da largura do bucket, nunca da ordem em que os blocos chegam.
+    """
+    dims = [col for col in SKETCH_DIMENSIONS if col in tickets.columns]
+    values = tickets[column].astype("float64") if column in tickets.columns else pd.Series(dtype="float64")
+    valid = values.notna().to_numpy()
+    frame = pd.DataFrame({
+        "day": pd.to_datetime(tickets["timestamp"]).dt.floor("D").to_numpy()[valid] if "timestamp" in tickets else [],
+        **{col: tickets[col].astype("category").iloc[valid].reset_index(drop=True) for col in dims},
+        "bucket": mapping.to_bucket(values.to_numpy()[valid]),
+    })
+    return merge_entries([frame.assign(count=np.ones(len(frame), dtype=np.int64))])
+
+
+def merge_entries(parts: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """Junta sketches parciais (ex.: por bloco) somando contagens por (dia, dimensões, bucket)."""
+    cells = concat_cells(list(parts))
+    keys = [col for col in cells.columns if col != "count"]
+    return cells.groupby(keys, observed=True, dropna=False, sort=True)["count"].sum().reset_index()
+
+
+class QuantileSketches:
+    """Sketches de quantis por dia × canal × produto × convênio, para AIT e tNPS.
+
+    Qualquer recorte (período + seleção nas dimensões do grão) é respondido somando
+    os histogramas que casam e lendo o bucket da posição pedida — custo proporcional
+    ao número de entradas do período, sem ordenar tickets.
+
+    Garantia: para o percentil q de n valores, o resultado é o representante do bucket
+    do valor exato de posição ⌊q·(n-1)⌋ (definição "lower" do `np.quantile`), logo
+    |estimado − exato| ≤ α·|exato| (α = `RELATIVE_ACCURACY`, 1%), ou < `MIN_INDEXABLE`
+    em valor absoluto quando |exato| < `MIN_INDEXABLE`. Contra a interpolação linear
+    padrão, a diferença adicional é no máximo a distância até o valor vizinho.
+    """
+
+    def __init__(self, entries: Dict[str, pd.DataFrame], mapping: LogMapping = MAPPING):
+        self.entries = entries
+        self.mapping = mapping
+        self.index = {
+            metric: TableIndex(frame, "day", {key: col for key, col in TICKET_DIMENSIONS.items() if col in SKETCH_DIMENSIONS})
+            for metric, frame in entries.items()
+        }
+
+    @classmethod
+    def from_tickets(cls, tickets: pd.DataFrame) -> "QuantileSketches":
+        return cls({metric: sketch_entries(tickets, col) for metric, col in SKETCH_METRICS.items()})
+
+    def entries_before(self, day: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+        """Entradas dos dias anteriores a `day`, por métrica (base para refazer só os dias seguintes)."""
+        return {metric: frame[frame["day"] < day].reset_index(drop=True) for metric, frame in self.entries.items()}
+
+    def quantiles(
+        self,
+        metric: str,
+        filters: dict,
+        by: Optional[str] = None,
+        qs: Sequence[float] = QUANTILES,
+    ) -> pd.DataFrame:
+        """Percentis de `metric` no recorte, no total ou por valor de `by` (dimensão do grão).
+
+        Retorna [by?, n, p50, p90, p99...]; valores ausentes de `by` ficam de fora.
+        """
+        if by is not None and by not in SKETCH_DIMENSIONS:
+            raise ValueError(f"Dimensão fora do grão dos sketches: {by}")
+        frame, index = self.entries[metric], self.index[metric]
+        if by is not None and by not in frame.columns:
+            return pd.DataFrame(columns=[by, "n", *(f"p{q * 100:g}" for q in qs)])
+        start, end = date_bounds(filters)
+        selections = {key: filters.get(key, []) for key in index.codes}
+        # Só os arrays necessários (bucket, contagem e códigos de `by`), sem montar um frame
+        positions = index.positions(start, end, selections)
+        buckets = frame["bucket"].to_numpy()[positions].astype(np.int64)
+        counts = frame["count"].to_numpy()[positions].astype(np.float64)
+
+        if by is None:
+            groups, labels = np.zeros(len(positions), dtype=np.int64), None
+        else:
+            codes = frame[by].cat.codes.to_numpy()[positions].astype(np.int64)
+            keep = codes >= 0
+            buckets, counts, codes = buckets[keep], counts[keep], codes[keep]
+            labels, groups = np.unique(codes, return_inverse=True)
+        n_groups = 1 if labels is None else len(labels)
+        nb = self.mapping.n_buckets
+        hist = np.bincount(
+            groups * nb + buckets,
+            weights=counts,
+            minlength=n_groups * nb,
+        ).reshape(n_groups, nb)
+        cumulative = np.cumsum(hist, axis=1)
+        n = cumulative[:, -1]
+
+        columns = {} if labels is None else {by: pd.Categorical.from_codes(labels, dtype=frame[by].dtype)}
+        columns["n"] = n.astype(np.int64)
+        for q in qs:
+            rank = np.floor(q * (n - 1))
+            bucket = (cumulative > rank[:, None]).argmax(axis=1)
+            columns[f"p{q * 100:g}"] = np.where(n > 0, self.mapping.to_value(bucket), np.nan)
+        out = pd.DataFrame(columns)
+        return out.iloc[:0] if labels is None and n[0] == 0 else out
+
+
+class SketchBuilder:
+    """Acumula sketches bloco a bloco (ingestão em streaming), em paralelo ao `CubeBuilder`."""
+
+    def __init__(self, compact_rows: int = 1_000_000):
+        self.compact_rows = compact_rows
+        self._parts: Dict[str, list] = {metric: [] for metric in SKETCH_METRICS}
+        self._pending_rows = 0
+
+    def add(self, tickets: pd.DataFrame) -> None:
+        if len(tickets) == 0:
+            return
+        self.add_entries({metric: sketch_entries(tickets, col) for metric, col in SKETCH_METRICS.items()})
+
+    def add_entries(self, entries: Dict[str, pd.DataFrame]) -> None:
+        """Acrescenta sketches já prontos por métrica (ex.: entradas de sketches anteriores)."""
+        for metric, part in entries.items():
+            self._parts[metric].append(part)
+            self._pending_rows += len(part)
+        if self._pending_rows > self.compact_rows:
+            self._compact()
+
+    def _compact(self) -> None:
+        self._parts = {metric: [merge_entries(parts)] if parts else [] for metric, parts in self._parts.items()}
+        self._pending_rows = sum(len(p[0]) for p in self._parts.values() if p)
+
+    def build(self) -> QuantileSketches:
+        if not any(self._parts.values()):
+            return QuantileSketches.from_tickets(pd.DataFrame(columns=TABLE_COLUMNS["tickets"]))
+        self._compact()
+        return QuantileSketches({metric: parts[0] for metric, parts in self._parts.items()})
+
+
+def get_sketches(ds: DataSource) -> QuantileSketches:
+    """Sketches do DataSource, construídos uma vez (por versão dos dados) e guardados no objeto."""
+    if ds.sketches is None:
+        with span("sketch.build") as s:
+            ds.sketches = QuantileSketches.from_tickets(ds.tickets)
+            s.set(rows=sum(len(e) for e in ds.sketches.entries.values()), tickets=len(ds.tickets))
+    return ds.sketches
+
+
+def _narrows_outside_grain(ds: DataSource, filters: dict) -> bool:
+    """Algum filtro de dimensão fora do grão exclui valores existentes?"""
+    catalog = get_catalog(ds)
+    for key, col in TICKET_DIMENSIONS.items():
+        selected = filters.get(key) or []
+        if col not in SKETCH_DIMENSIONS and selected and not set(catalog.values.get(key, ())) <= set(selected):
+            return True
+    return False
+
+
+def exact_quantiles(tickets: pd.DataFrame, metric: str, by: Optional[str] = None, qs: Sequence[float] = QUANTILES) -> pd.DataFrame:
+    """Percentis exatos (definição "lower") sobre linhas de tickets, no formato de `quantiles`."""
+    col = SKETCH_METRICS[metric]
+    values = tickets[[col, *([by] if by else [])]].dropna(subset=[col])
+    if by is None:
+        if len(values) == 0:
+            return pd.DataFrame(columns=["n", *(f"p{q * 100:g}" for q in qs)])
+        return pd.DataFrame({"n": [len(values)], **{f"p{q * 100:g}": [values[col].quantile(q, interpolation="lower")] for q in qs}})
+    grouped = values.groupby(by, observed=True, sort=True)[col]
+    out = pd.DataFrame({"n": grouped.size(), **{f"p{q * 100:g}": grouped.quantile(q, interpolation="lower") for q in qs}})
+    return out.reset_index()
+
+
+def quantile_error(estimated: pd.DataFrame, exact: pd.DataFrame, by: Optional[str] = None) -> float:
+    """Maior erro relativo dos percentis estimados contra os exatos (mesmo formato de `quantiles`).
+
+    Grupos são casados pelo valor de `by`; |exato| < `MIN_INDEXABLE` conta como erro absoluto.
+    """
+    cols = [col for col in exact.columns if col.startswith("p")]
+    if by is not None:
+        estimated = estimated.set_index(estimated[by].astype(object))
+        exact = exact.set_index(exact[by].astype(object)).reindex(estimated.index)
+    worst = 0.0
+    for col in cols:
+        e, x = estimated[col].to_numpy(dtype=np.float64), exact[col].to_numpy(dtype=np.float64)
+        err = np.where(np.abs(x) >= MIN_INDEXABLE, np.abs(e - x) / np.maximum(np.abs(x), MIN_INDEXABLE), np.abs(e - x))
+        worst = max(worst, float(np.nanmax(err)) if len(err) else 0.0)
+    return worst
+
+
+@traced("sketch.sketch_quantiles")
+def sketch_quantiles(ds: DataSource, filters: dict, metric: str, by: Optional[str] = None) -> pd.DataFrame:
+    """Percentis (p50/p90/p99) de AIT ou tNPS no recorte, a partir dos sketches.
+
+    Se a sidebar restringe uma dimensão fora do grão (ex.: categoria) e há linhas de
+    tickets, os sketches não bastam: calcula exato sobre as linhas filtradas. Numa
+    visão em streaming os filtros já foram aplicados no warehouse, então o grão basta.
+    """
+    if len(ds.tickets) and _narrows_outside_grain(ds, filters):
+        return exact_quantiles(filter_table(ds, "tickets", filters), metric, by)
+    return get_sketches(ds).quantiles(metric, filters, by)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Dict, Iterable, Iterator, Optional, Sequence
+
+import pandas as pd
+
+from .config import DatabricksConfig
+from .cube import CubeBuilder, DailyCube
+from .data_access import (
+    DataSource,
+    TableWatermark,
+    _table_name,
+    load_table,
+    make_data_source,
+    normalize_time_column,
+    run_concurrently,
+)
+from .databricks_client import ARROW_BATCH_ROWS, arrow_to_pandas, iter_query
+from .filters import filter_mask
+from .instrumentation import span, traced
+from .query_builder import TABLE_COLUMNS, build_select
+from .sketch import QuantileSketches, SketchBuilder
+
+
+def iter_parquet_chunks(
+    path: str | os.PathLike,
+    batch_rows: int = ARROW_BATCH_ROWS,
+    columns: Optional[Sequence[str]] = None,
+) -> Iterator[pd.DataFrame]:
+    """Lê um Parquet (ex.: extrato histórico) em blocos de até `batch_rows` linhas."""
+    import pyarrow.parquet as pq  # lazy import
+
+    parquet = pq.ParquetFile(path, memory_map=True)
+    for batch in parquet.iter_batches(batch_size=batch_rows, columns=list(columns) if columns else None):
+        yield arrow_to_pandas(batch)
+
+
+def iter_table_chunks(
+    table: str,
+    cfg: DatabricksConfig,
+    filters: Optional[dict] = None,
+    batch_rows: int = ARROW_BATCH_ROWS,
+    since: Optional[pd.Timestamp] = None,
+) -> Iterator[pd.DataFrame]:
+    """Lê uma tabela lógica do warehouse em blocos (filtros/projeção empurrados no SQL).
+
+    Diferente de `load_table`, não passa pelo cache em disco: o resultado nunca é
+    materializado inteiro. `since` restringe a linhas com tempo >= ao valor.
+    """
+    sql_text, params = build_select(table, _table_name(table, cfg), filters, since=since)
+    for chunk in iter_query(sql_text, params, cfg=cfg, batch_rows=batch_rows):
+        yield normalize_time_column(table, chunk)
+
+
+@traced("streaming.fold_ticket_chunks")
+def fold_ticket_chunks(
+    chunks: Iterable[pd.DataFrame],
+    filters: Optional[dict] = None,
+    sketches: Optional[SketchBuilder] = None,
+    builder: Optional[CubeBuilder] = None,
+) -> DailyCube:
+    """Consome blocos de tickets e devolve o cubo diário com as somas acumuladas.
+
+    Cada bloco tem a coluna temporal normalizada e (se `filters`) é recortado antes
+    de entrar no acumulador. KPIs e séries saem do cubo (`DailyCube.aggregates`),
+    com as mesmas médias exatas do caminho em memória. Com `sketches`, os mesmos
+    blocos alimentam os sketches de percentis de AIT/tNPS. `builder` pode já trazer
+    células de um cubo anterior (refresh incremental).
+    """
+    builder = builder if builder is not None else CubeBuilder()
+    chunks_read = 0
+    with span("streaming.fold") as s:
+        for chunk in chunks:
+            chunk = normalize_time_column("tickets", chunk)
+            if filters is not None:
+                chunk = chunk[filter_mask("tickets", chunk, filters)]
+            builder.add(chunk)
+            if sketches is not None:
+                sketches.add(chunk)
+            chunks_read += 1
+        cube = builder.build()
+        s.set(rows=builder.rows_read, chunks=chunks_read, cells=len(cube.cells))
+    return cube
+
+
+@traced("streaming.load_streaming_view")
+def load_streaming_view(
+    cfg: DatabricksConfig,
+    filters: Optional[dict] = None,
+    watermarks: Optional[Dict[str, TableWatermark]] = None,
+) -> DataSource:
+    """Recorte do warehouse sem materializar tickets: eles chegam em blocos e viram o cubo.
+
+    Jobs e métricas de produto (tabelas pequenas) são lidos normalmente, com
+    `watermarks` habilitando o cache em disco (ver `load_table`). O
+    `DataSource` resultante tem `tickets` vazio e `cube` preenchido, que é o que
+    KPIs, séries e forecasts consultam (e `sketches`, para os percentis).
+    """
+    sketches = SketchBuilder()
+    results, report = run_concurrently({
+        "tickets": lambda: fold_ticket_chunks(iter_table_chunks("tickets", cfg, filters), sketches=sketches),
+        "jobs": lambda: load_table("jobs", cfg, filters, watermark=(watermarks or {}).get("jobs")),
+        "product_metrics": lambda: load_table("product_metrics", cfg, filters, watermark=(watermarks or {}).get("product_metrics")),
+    })
+    frames = {t: results.get(t, pd.DataFrame(columns=TABLE_COLUMNS[t])) for t in ("jobs", "product_metrics")}
+    ds = make_data_source(pd.DataFrame(columns=TABLE_COLUMNS["tickets"]), frames["jobs"], frames["product_metrics"], load_report=report)
+    ds.source_watermarks = {t: wm for t, wm in (watermarks or {}).items() if t not in report.failed}
+    cube = results.get("tickets")
+    if cube is not None:
+        attach_cube(ds, cube, sketches.build())
+    return ds
+
+
+def attach_cube(ds: DataSource, cube: DailyCube, sketches: QuantileSketches) -> None:
+    """Guarda cubo e sketches numa visão sem linhas de tickets e ajusta a versão."""
+    ds.cube = cube
+    ds.sketches = sketches
+    # Sem linhas de tickets, a versão também precisa refletir o conteúdo do cubo
+    summary = f"{ds.version}|cube:{len(cube.cells)}:{cube.cells['tickets'].sum() if len(cube.cells) else 0}"
+    ds.version = hashlib.sha1(summary.encode()).hexdigest()[:12]
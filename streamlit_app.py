@@ -1,37 +1,136 @@
 import os
+from dataclasses import dataclass
 from datetime import timedelta
 
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import streamlit as st
 
-from src.config import load_databricks_config, is_databricks_configured
-from src.data_access import DataSource, load_all_data
-from src.metrics import compute_operational_kpis, compute_product_kpis
-from src.ml import forecast_series_stub, score_conversion_propensity_stub
-from src.filters import apply_filters, build_filter_options
+from src.config import (
+    load_databricks_config,
+    is_databricks_configured,
+    is_aggregate_mode_enabled,
+    is_streaming_ingestion_enabled,
+    get_chart_width_px,
+    get_refresh_interval_s,
+)
+from src.databricks_client import get_query_cache
+from src.data_access import (
+    DataSource,
+    load_all_data,
+    load_table,
+    load_ticket_aggregates,
+    load_ticket_daily_group_sums,
+    load_ticket_quantiles,
+)
+from src.metrics import SERIES_METRICS, TicketAggregates, compute_product_kpis, series_matrix
+from src.ml import BatchForecast, forecast_batch, forecast_series_stub, score_conversion_propensity_stub
+from src.cube import cube_aggregates, cube_daily_group_sums
+from src.downsample import chart_series
+from src.catalog import DimensionCatalog, get_catalog, load_dimension_catalog
+from src.filters import filter_table
+from src.memo import get_memo, memoized
+from src.instrumentation import Recorder, export_jsonl, is_profiling_enabled, recording, span
+from src.refresh import IncrementalLoader, refresh_view
+from src.sketch import QUANTILES, SKETCH_METRICS, sketch_quantiles
+from src.streaming import load_streaming_view
 from src.ui_components import kpi_row
 
 
 st.set_page_config(page_title="Lending Ops & Product Dashboard", layout="wide")
 
 
-@st.cache_data(show_spinner=False)
-def _load_data_cached() -> DataSource:
+@st.cache_resource(show_spinner=False)
+def _get_loader() -> IncrementalLoader:
+    # Um loader por processo: no Databricks guarda só watermarks (linhas/MAX do tempo) por tabela
     cfg = load_databricks_config()
     use_db = is_databricks_configured(cfg)
-    return load_all_data(use_databricks=use_db, cfg=cfg)
+    return IncrementalLoader(cfg=cfg, use_databricks=use_db, interval_s=get_refresh_interval_s())
+
+
+def _load_data_cached() -> DataSource:
+    return _get_loader().get()
+
+
+def _load_view_cached(ds: DataSource, filters: dict) -> DataSource:
+    # Filtros empurrados para o SQL Warehouse: baixa só o recorte da visão atual.
+    # Chave = versão da base (muda quando um watermark muda) + filtros.
+    # Com STREAM_TICKETS (padrão), tickets chegam em blocos direto para o cubo diário.
+    cfg = load_databricks_config()
+    streaming = is_streaming_ingestion_enabled()
+    namespace = "warehouse_view_streaming" if streaming else "warehouse_view"
+
+    def load() -> DataSource:
+        # Mesmo recorte já lido numa versão anterior: busca só as linhas novas desde então
+        previous = get_memo().latest(namespace, filters)
+        if previous is not None:
+            return refresh_view(previous, cfg, filters, ds.watermarks)
+        if streaming:
+            return load_streaming_view(cfg, filters, ds.watermarks)
+        return load_all_data(use_databricks=True, cfg=cfg, filters=filters, watermarks=ds.watermarks)
+
+    return memoized(namespace, ds.version, filters, load)
+
+
+def _load_aggregates_cached(ds: DataSource, filters: dict) -> tuple[TicketAggregates, pd.DataFrame]:
+    # Modo agregado: tickets/jobs só chegam como GROUP BY; product_metrics já é pequeno
+    cfg = load_databricks_config()
+    return memoized(
+        "warehouse_aggregates",
+        ds.version,
+        filters,
+        lambda: (
+            load_ticket_aggregates(cfg, filters, ds.version),
+            load_table("product_metrics", cfg, filters, ds.watermarks.get("product_metrics")),
+        ),
+    )
+
+
+@st.cache_data(show_spinner=False, ttl=get_refresh_interval_s(), max_entries=64)
+def _forecast_by_dimension_cached(_view: DataSource | None, version: str, filters: dict, dimension: str) -> BatchForecast:
+    # Chave do cache: versão dos dados + filtros + dimensão (`_view` não entra no hash).
+    # Volume, AIT e tNPS de todos os valores da dimensão são ajustados numa única chamada.
+    if _view is None:
+        sums = load_ticket_daily_group_sums(load_databricks_config(), filters, dimension, version)
+    else:
+        sums = cube_daily_group_sums(_view, filters, dimension)
+    matrix = pd.concat({metric: series_matrix(sums, dimension, metric) for metric in SERIES_METRICS}, axis=1)
+    return forecast_batch(matrix, horizon=14)
+
+
+def _warn_partial_load(ds: DataSource):
+    report = ds.load_report
+    if report is not None and report.failed:
+        details = "; ".join(f"{name}: {report.tables[name].error}" for name in report.failed)
+        st.warning(f"Carga parcial — tabelas sem dados: {details}")
+
+
+def _dimension_catalog(ds: DataSource) -> DimensionCatalog:
+    # Uma vez por versão dos dados. No modo Databricks, MIN/MAX + valores distintos vêm
+    # do warehouse (consultas pequenas); se falharem, o período sai dos watermarks da base.
+    cfg = load_databricks_config()
+    if is_databricks_configured(cfg):
+        try:
+            return memoized("dimension_catalog", ds.version, None, lambda: load_dimension_catalog(cfg, ds.version))
+        except Exception:
+            pass
+    return get_catalog(ds)
 
 
 def _sidebar_filters(ds: DataSource):
+    if ds.refreshed_at is not None:
+        st.sidebar.caption(f"Dados atualizados em {ds.refreshed_at.tz_convert(None):%d/%m/%Y %H:%M:%S} UTC")
     st.sidebar.header("Filtros")
-    options = build_filter_options(ds)
+    options = _dimension_catalog(ds).as_options()
+    # Sem período conhecido (tabela vazia ou sem watermark): hoje, para o seletor continuar válido
+    max_date = options["max_date"] or pd.Timestamp.now().date()
+    min_date = options["min_date"] or max_date
 
     date_range = st.sidebar.date_input(
         "Período",
-        value=(options["min_date"], options["max_date"]),
-        min_value=options["min_date"],
-        max_value=options["max_date"],
+        value=(min_date, max_date),
+        min_value=min_date,
+        max_value=max_date,
     )
 
     canal = st.sidebar.multiselect("Canal", options["canal"], default=options["canal"])  # type: ignore[index]
@@ -54,17 +153,77 @@ def _sidebar_filters(ds: DataSource):
     }
 
 
+def _diagnostics_enabled() -> bool:
+    # Aba oculta: DASHBOARD_PROFILING=true (processo todo) ou ?diag=1 na URL (sessão)
+    return is_profiling_enabled() or st.query_params.get("diag") == "1"
+
+
+def _render_diagnostics(recorder: Recorder):
+    st.subheader("Tempo por etapa (rerun atual)")
+    frame = recorder.to_frame()
+    if frame.empty:
+        st.info("Nenhuma etapa registrada.")
+        return
+    names = dict(zip(frame["id"], frame["name"]))
+    frame["parent"] = frame["parent"].map(names)
+    frame["ms"] = frame["seconds"] * 1000
+    st.dataframe(frame[["name", "parent", "ms", "rows", "bytes", "thread", "attrs"]], hide_index=True)
+    st.download_button(
+        "Exportar JSON lines",
+        data=recorder.to_jsonl(),
+        file_name="dashboard_spans.jsonl",
+        mime="application/jsonl",
+    )
+
+    st.subheader("Cache por filtro (processo)")
+    memo = get_memo()
+    st.caption(f"Limites: {memo.max_entries} entradas / {memo.max_bytes / 2**20:.0f} MB")
+    st.dataframe(memo.stats(), hide_index=True)
+
+    query_cache = get_query_cache() if is_databricks_configured(load_databricks_config()) else None
+    if query_cache is not None:
+        st.subheader("Cache de consultas do warehouse (processo)")
+        st.caption(f"TTL: {query_cache.ttl_s:.0f} s / limite: {query_cache.max_bytes / 2**20:.0f} MB")
+        st.dataframe(pd.DataFrame([query_cache.stats()]), hide_index=True)
+
+
 def main():
+    if not _diagnostics_enabled():
+        _render_dashboard(None)
+        return
+    with recording() as recorder:
+        with span("app.rerun"):
+            _render_dashboard(recorder)
+    export_path = os.getenv("DASHBOARD_PROFILING_FILE")
+    if export_path:
+        export_jsonl(recorder, export_path, rerun_at=pd.Timestamp.now(tz="UTC").isoformat())
+
+
+def _render_dashboard(recorder: Recorder | None):
     st.title("Lending – Operação, Produto e Previsões")
-    ds = _load_data_cached()
-    filters = _sidebar_filters(ds)
+    with span("app.load"):
+        ds = _load_data_cached()
+    _warn_partial_load(ds)
+    with span("app.sidebar"):
+        filters = _sidebar_filters(ds)
 
-    # Filtrar dados
-    tickets_f, jobs_f, product_f = apply_filters(ds, filters)
+    use_db = is_databricks_configured()
+    with span("app.prepare", aggregate_mode=use_db and is_aggregate_mode_enabled()):
+        if use_db and is_aggregate_mode_enabled():
+            aggs, product_f = _load_aggregates_cached(ds, filters)
+            view = None
+        else:
+            # No Databricks, o recorte já vem do warehouse; o cubo diário responde KPIs e séries
+            view = _load_view_cached(ds, filters) if use_db else ds
+            if view is not ds:
+                _warn_partial_load(view)
+            aggs = memoized("ticket_aggregates", view.version, filters, lambda: cube_aggregates(view, filters))
+            product_f = memoized("product_metrics", view.version, filters, lambda: filter_table(view, "product_metrics", filters))
 
     # KPIs
-    op_kpis = compute_operational_kpis(tickets_f, jobs_f)
-    prod_kpis = compute_product_kpis(product_f)
+    op_kpis = aggs.kpis
+    version = view.version if view is not None else ds.version
+    prod_kpis = memoized("product_kpis", version, filters, lambda: compute_product_kpis(product_f))
     kpi_row({
         "Tickets": op_kpis["tickets_total"],
         "Backlog": op_kpis["backlog"],
@@ -77,94 +236,240 @@ def main():
         "Elegibilidade": f"{prod_kpis['eligibility_rate']:.1f}%",
     })
 
-    tab_overview, tab_oper, tab_prod, tab_consignado, tab_prev, tab_src = st.tabs([
-        "Visão Geral", "Operação", "Produto", "Consignado", "Previsões", "Fonte"
-    ])
+    state = ViewState(ds=ds, view=view, filters=filters, aggs=aggs, product_f=product_f)
 
-    with tab_overview:
-        st.subheader("Tendência de Tickets")
-        by_day = tickets_f.groupby(pd.Grouper(key="timestamp", freq="D")).size().reset_index(name="tickets")
-        if len(by_day) > 0:
-            fig = px.line(by_day, x="timestamp", y="tickets")
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("Sem dados para o período/filtros selecionados.")
-
-        st.subheader("tNPS e AIT (média por dia)")
-        agg = tickets_f.groupby(pd.Grouper(key="timestamp", freq="D")).agg(
-            tnps=("tnps", "mean"), ait=("ait_min", "mean")
-        ).reset_index()
-        fig2 = px.line(agg, x="timestamp", y=["tnps", "ait"], markers=True)
-        st.plotly_chart(fig2, use_container_width=True)
-
-    with tab_oper:
-        st.subheader("Distribuição por Categoria")
-        cat = tickets_f.groupby("categoria").size().reset_index(name="qtd")
-        st.plotly_chart(px.bar(cat, x="categoria", y="qtd"), use_container_width=True)
-
-        st.subheader("FCR por Categoria")
-        fcr_cat = tickets_f.groupby("categoria").agg(fcr=("fcr", "mean")).reset_index()
-        fcr_cat["fcr"] *= 100
-        st.plotly_chart(px.bar(fcr_cat, x="categoria", y="fcr"), use_container_width=True)
-
-    with tab_prod:
-        st.subheader("Funil: Aplicações → Aprovações → Conversões")
-        st.plotly_chart(px.line(product_f.sort_values("date"), x="date", y=["applications", "approvals", "conversions"], markers=True), use_container_width=True)
-
-        st.subheader("Elegibilidade por Produto")
-        elig = product_f.groupby("product").agg(rate=("eligibility_rate", "mean")).reset_index()
-        elig["rate"] *= 100
-        st.plotly_chart(px.bar(elig, x="product", y="rate"), use_container_width=True)
-
-    with tab_consignado:
-        st.subheader("KPIs por Convênio")
-        conv = tickets_f[tickets_f["produto"] == "Consignado"].groupby("convenio").agg(
-            tickets=("ticket_id", "count"),
-            tnps=("tnps", "mean"),
-            ait=("ait_min", "mean"),
-        ).reset_index()
-        st.plotly_chart(px.bar(conv, x="convenio", y="tickets"), use_container_width=True)
-        st.plotly_chart(px.bar(conv, x="convenio", y="tnps"), use_container_width=True)
-
-    with tab_prev:
-        st.subheader("Forecast de Tickets (próximos 14 dias)")
-        if 'by_day' in locals() and len(by_day) > 0:
-            fc = forecast_series_stub(by_day.set_index("timestamp")["tickets"], horizon=14)
-            if len(fc) > 0:
-                st.plotly_chart(px.line(fc.reset_index(), x="ds", y=["y", "yhat"], markers=True), use_container_width=True)
-            else:
-                st.info("Não foi possível gerar forecast com dados vazios.")
-        else:
-            st.info("Dados insuficientes para forecast.")
-
-        st.subheader("Propensão de Conversão (stub)")
-        if len(product_f) > 1:
-            demo_features = product_f.tail(30)[["applications", "approvals"]]
-            demo_target = product_f.tail(30)["conversions"].gt(0).astype(int)
-            scores = score_conversion_propensity_stub(demo_features, demo_target)
-            st.write("Distribuição de score (0-1):")
-            st.plotly_chart(px.histogram(pd.DataFrame({"score": scores})), use_container_width=True)
-        else:
-            st.info("Dados insuficientes para estimar propensão de conversão.")
-
-    with tab_src:
-        st.write("Fonte de dados em uso:")
-        cfg = load_databricks_config()
-        if is_databricks_configured(cfg):
-            st.success("Databricks (SQL Warehouse)")
-            st.code({
-                "host": cfg.host,
-                "http_path": cfg.http_path,
-                "tables": {
-                    "tickets": cfg.table_tickets,
-                    "jobs": cfg.table_jobs,
-                    "product_metrics": cfg.table_product_metrics,
-                    "eligibility": cfg.table_eligibility,
-                }
-            })
+    # Só a aba ativa é calculada e renderizada (st.tabs executaria todas a cada rerun)
+    tabs = dict(TABS)
+    if recorder is not None:
+        tabs["Diagnóstico"] = ("diagnostico", lambda _state: _render_diagnostics(recorder))
+    active = st.radio("Aba", list(tabs), horizontal=True, key="active_tab", label_visibility="collapsed")
+    slug, render = tabs.get(active, TABS["Visão Geral"])
+    with span(f"tab.{slug}"):
+        render(state)
+
+
+@dataclass
+class ViewState:
+    """Entradas das abas em um rerun: dados, filtros e agregados já calculados."""
+    ds: DataSource
+    view: DataSource | None  # fonte com linhas/cubo; None no modo agregado
+    filters: dict
+    aggs: TicketAggregates
+    product_f: pd.DataFrame
+
+    @property
+    def version(self) -> str:
+        return self.view.version if self.view is not None else self.ds.version
+
+
+FUNNEL_COLUMNS = ["applications", "approvals", "conversions"]
+
+
+# Preparação de cada aba: memoizada por versão dos dados + filtros (argumentos com `_`
+# não entram na chave do cache) e executada só quando a aba está ativa.
+@st.cache_data(show_spinner=False, ttl=get_refresh_interval_s(), max_entries=32)
+def _prep_produto(_product_f: pd.DataFrame, version: str, filters: dict, max_points: int) -> tuple[pd.DataFrame, str, pd.DataFrame]:
+    # Funil: soma dos produtos por data (uma linha por data), reduzido para o gráfico
+    daily = _product_f.groupby("date", observed=True)[FUNNEL_COLUMNS].sum().reset_index()
+    funnel, grain = chart_series(daily, "date", sum_cols=FUNNEL_COLUMNS, max_points=max_points, name="funil")
+    elig = _product_f.groupby("product", observed=True).agg(rate=("eligibility_rate", "mean")).reset_index()
+    elig["rate"] *= 100
+    return funnel, grain, elig
+
+
+@st.cache_data(show_spinner=False, ttl=get_refresh_interval_s(), max_entries=32)
+def _prep_forecast_total(_aggs: TicketAggregates, version: str, filters: dict) -> pd.DataFrame:
+    by_day = _aggs.daily[["timestamp", "tickets"]]
+    if len(by_day) == 0:
+        return pd.DataFrame({"ds": [], "y": [], "yhat": []})
+    return forecast_series_stub(by_day.set_index("timestamp")["tickets"], horizon=14)
+
+
+@st.cache_data(show_spinner=False, ttl=get_refresh_interval_s(), max_entries=32)
+def _prep_propensity(_product_f: pd.DataFrame, version: str, filters: dict) -> np.ndarray | None:
+    if len(_product_f) <= 1:
+        return None
+    demo_features = _product_f.tail(30)[["applications", "approvals"]]
+    demo_target = _product_f.tail(30)["conversions"].gt(0).astype(int)
+    return score_conversion_propensity_stub(demo_features, demo_target)
+
+
+@st.cache_data(show_spinner=False, ttl=get_refresh_interval_s(), max_entries=32)
+def _prep_quantiles(_view: DataSource | None, version: str, filters: dict, metric: str, by: str | None) -> pd.DataFrame:
+    # Percentis de AIT/tNPS: sketches do cubo (por dia × canal × produto × convênio) ou,
+    # no modo agregado, PERCENTILE_APPROX no warehouse. Convênio só conta Consignado.
+    consignado = by == "convenio"
+    if _view is None:
+        condition = "`produto` = 'Consignado'" if consignado else None
+        return load_ticket_quantiles(load_databricks_config(), filters, SKETCH_METRICS[metric], QUANTILES, by, condition, version)
+    if consignado:
+        if filters.get("produto") and "Consignado" not in filters["produto"]:
+            return pd.DataFrame(columns=[by, "n", *(f"p{q * 100:g}" for q in QUANTILES)])
+        filters = {**filters, "produto": ["Consignado"]}
+    return sketch_quantiles(_view, filters, metric, by)
+
+
+def _render_visao_geral(state: ViewState):
+    import plotly.express as px  # lazy import
+    aggs = state.aggs
+    max_points = get_chart_width_px()
+    st.subheader("Tendência de Tickets")
+    if len(aggs.daily) > 0:
+        by_day, grain = chart_series(aggs.daily, "timestamp", sum_cols=["tickets"], max_points=max_points, name="tickets")
+        fig = px.line(by_day, x="timestamp", y="tickets")
+        st.plotly_chart(fig, use_container_width=True)
+        _grain_caption(grain)
+    else:
+        st.info("Sem dados para o período/filtros selecionados.")
+
+    st.subheader("tNPS e AIT (média por dia)")
+    agg, grain = chart_series(
+        aggs.daily, "timestamp", mean_cols=["tnps", "ait"], max_points=max_points, name="tnps_ait",
+        weights={"tnps": "tnps_n", "ait": "ait_n"},
+    )
+    fig2 = px.line(agg, x="timestamp", y=["tnps", "ait"], markers=True)
+    st.plotly_chart(fig2, use_container_width=True)
+    _grain_caption(grain)
+
+
+def _grain_caption(grain: str):
+    # Séries longas chegam ao navegador reagregadas/reduzidas (ver src/downsample.py)
+    if grain != "original":
+        st.caption(f"Série exibida por {grain} (limite de {get_chart_width_px()} pontos por traço).")
+
+
+def _render_operacao(state: ViewState):
+    import plotly.express as px  # lazy import
+    aggs = state.aggs
+    st.subheader("Distribuição por Categoria")
+    st.plotly_chart(px.bar(aggs.by_categoria, x="categoria", y="qtd"), use_container_width=True)
+
+    st.subheader("FCR por Categoria")
+    st.plotly_chart(px.bar(aggs.by_categoria, x="categoria", y="fcr"), use_container_width=True)
+
+    st.subheader("Percentis de AIT (min) e tNPS por Canal")
+    parts = {label: _prep_quantiles(state.view, state.version, state.filters, metric, "canal")
+             for metric, label in (("ait", "AIT"), ("tnps", "tNPS"))}
+    table = pd.concat(parts, names=["métrica"]).reset_index(level=0)
+    if len(table) > 0:
+        st.dataframe(table.round(1), hide_index=True)
+        st.caption("Percentis aproximados (erro ≤ 1% do valor; ver src/sketch.py).")
+    else:
+        st.info("Sem dados para o período/filtros selecionados.")
+
+
+def _render_produto(state: ViewState):
+    import plotly.express as px  # lazy import
+    funnel, grain, elig = _prep_produto(state.product_f, state.version, state.filters, get_chart_width_px())
+    st.subheader("Funil: Aplicações → Aprovações → Conversões")
+    st.plotly_chart(px.line(funnel, x="date", y=FUNNEL_COLUMNS, markers=True), use_container_width=True)
+    _grain_caption(grain)
+
+    st.subheader("Elegibilidade por Produto")
+    st.plotly_chart(px.bar(elig, x="product", y="rate"), use_container_width=True)
+
+
+def _render_consignado(state: ViewState):
+    import plotly.express as px  # lazy import
+    st.subheader("KPIs por Convênio")
+    conv = state.aggs.by_convenio
+    st.plotly_chart(px.bar(conv, x="convenio", y="tickets"), use_container_width=True)
+    st.plotly_chart(px.bar(conv, x="convenio", y="tnps"), use_container_width=True)
+
+    st.subheader("AIT (min) por Convênio: p50 / p90 / p99")
+    ait = _prep_quantiles(state.view, state.version, state.filters, "ait", "convenio")
+    if len(ait) > 0:
+        columns = [f"p{q * 100:g}" for q in QUANTILES]
+        st.plotly_chart(px.bar(ait, x="convenio", y=columns, barmode="group"), use_container_width=True)
+    else:
+        st.info("Sem tickets de Consignado no recorte.")
+
+
+def _render_previsoes(state: ViewState):
+    import plotly.express as px  # lazy import
+    st.subheader("Forecast de Tickets (próximos 14 dias)")
+    if len(state.aggs.daily) > 0:
+        fc = _prep_forecast_total(state.aggs, state.version, state.filters)
+        if len(fc) > 0:
+            st.plotly_chart(px.line(fc.reset_index(), x="ds", y=["y", "yhat"], markers=True), use_container_width=True)
         else:
-            st.warning("Usando dados mockados (sem credenciais do Databricks)")
+            st.info("Não foi possível gerar forecast com dados vazios.")
+    else:
+        st.info("Dados insuficientes para forecast.")
+
+    st.subheader("Forecast por segmento (próximos 14 dias)")
+    metric_labels = {"volume": "Volume", "ait": "AIT (min)", "tnps": "tNPS"}
+    dimension_labels = {"produto": "Produto", "canal": "Canal", "convenio": "Convênio"}
+    col_metric, col_dim = st.columns(2)
+    metric = col_metric.selectbox("Métrica", list(metric_labels), format_func=metric_labels.get)
+    dimension = col_dim.selectbox("Abrir por", list(dimension_labels), format_func=dimension_labels.get)
+    fc_all = _forecast_by_dimension_cached(state.view, state.version, state.filters, dimension)
+    if metric in fc_all.y.columns.get_level_values(0):
+        fc_dim = fc_all[metric]
+        st.plotly_chart(px.line(fc_dim.long(), x="ds", y="yhat", color="serie"), use_container_width=True)
+        horizon = fc_dim.forecast.sum() if metric == "volume" else fc_dim.forecast.mean()
+        summary = pd.DataFrame({
+            dimension_labels[dimension]: fc_dim.forecast.columns,
+            "Últimos 14 dias": (fc_dim.y.tail(14).sum() if metric == "volume" else fc_dim.y.tail(14).mean()).to_numpy(),
+            "Próximos 14 dias": horizon.to_numpy(),
+        })
+        st.dataframe(summary.round(1), hide_index=True)
+    else:
+        st.info("Dados insuficientes para forecast.")
+
+    st.subheader("Propensão de Conversão (stub)")
+    scores = _prep_propensity(state.product_f, state.version, state.filters)
+    if scores is not None:
+        st.write("Distribuição de score (0-1):")
+        st.plotly_chart(px.histogram(pd.DataFrame({"score": scores})), use_container_width=True)
+    else:
+        st.info("Dados insuficientes para estimar propensão de conversão.")
+
+
+def _render_fonte(state: ViewState):
+    ds = state.ds
+    st.write("Fonte de dados em uso:")
+    cfg = load_databricks_config()
+    if is_databricks_configured(cfg):
+        st.success("Databricks (SQL Warehouse)")
+        st.code({
+            "host": cfg.host,
+            "http_path": cfg.http_path,
+            "tables": {
+                "tickets": cfg.table_tickets,
+                "jobs": cfg.table_jobs,
+                "product_metrics": cfg.table_product_metrics,
+                "eligibility": cfg.table_eligibility,
+            }
+        })
+        if ds.watermarks:
+            st.write("Watermarks por tabela:")
+            st.dataframe(pd.DataFrame([
+                {"tabela": name, "linhas": wm.rows, "primeiro registro": wm.min_time, "último registro": wm.max_time}
+                for name, wm in ds.watermarks.items()
+            ]), hide_index=True)
+        if ds.load_report is not None:
+            st.write("Última leitura de watermarks (consultas em paralelo):")
+            st.dataframe(pd.DataFrame([vars(t) for t in ds.load_report.tables.values()]), hide_index=True)
+    else:
+        st.warning("Usando dados mockados (sem credenciais do Databricks)")
+    if ds.schema_report:
+        st.write("Memória por tabela após tipos compactos:")
+        st.dataframe(pd.DataFrame([
+            {"tabela": r.table, "MB antes": r.bytes_before / 2**20, "MB depois": r.bytes_after / 2**20, "redução": f"{r.ratio:.1f}x"}
+            for r in ds.schema_report.values()
+        ]), hide_index=True)
+
 
+# Nome exibido -> (slug do span, função que renderiza a aba)
+TABS = {
+    "Visão Geral": ("visao_geral", _render_visao_geral),
+    "Operação": ("operacao", _render_operacao),
+    "Produto": ("produto", _render_produto),
+    "Consignado": ("consignado", _render_consignado),
+    "Previsões": ("previsoes", _render_previsoes),
+    "Fonte": ("fonte", _render_fonte),
+}
 
 if __name__ == "__main__":
     main()
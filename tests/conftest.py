@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Testes importam `src.*` a partir da raiz do repositório (como os benchmarks)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.catalog import build_filter_options
+from src.cube import cube_aggregates, cube_daily_group_sums
+from src.data_access import load_all_data
+from src.filters import TICKET_DIMENSIONS, apply_filters
+from src.metrics import compute_ticket_aggregates, ticket_aggregates_from_sums
+
+# `ait_min` pode chegar em float32 (normalize_schema): pandas soma em float32, o cubo em float64
+RTOL = 1e-5
+
+
+@pytest.fixture(scope="module")
+def ds():
+    return load_all_data(use_databricks=False)
+
+
+def _filters(ds, **overrides) -> dict:
+    options = build_filter_options(ds)
+    filters = {key: options[key] for key in TICKET_DIMENSIONS}
+    filters["date_range"] = (options["min_date"], options["max_date"])
+    return {**filters, **overrides}
+
+
+def _scenarios(ds) -> dict:
+    options = build_filter_options(ds)
+    end = options["max_date"]
+    return {
+        "full": _filters(ds),
+        "last_30_days": _filters(ds, date_range=(end - timedelta(days=30), end)),
+        "one_canal": _filters(ds, canal=options["canal"][:1]),
+        "consignado": _filters(ds, produto=["Consignado"], convenio=options["convenio"][:2]),
+        "single_day": _filters(ds, date_range=(end, end)),
+    }
+
+
+def _warehouse_sums(tickets: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """Mesmas somas/contagens de `_TICKET_SUM_EXPRS` (query_builder), calculadas em pandas."""
+    rows = tickets.assign(
+        timestamp=tickets["timestamp"].dt.floor("D"),
+        backlog=(tickets["reopen"] == 1).astype(int),
+    )
+    return rows.groupby(keys, observed=True).agg(
+        tickets=("ticket_id", "size"),
+        backlog=("backlog", "sum"),
+        fcr_sum=("fcr", "sum"),
+        fcr_n=("fcr", "count"),
+        reopen_sum=("reopen", "sum"),
+        reopen_n=("reopen", "count"),
+        ait_sum=("ait_min", "sum"),
+        ait_n=("ait_min", "count"),
+        tnps_sum=("tnps", "sum"),
+        tnps_n=("tnps", "count"),
+    ).reset_index()
+
+
+def _assert_equivalent(expected, actual, name: str) -> None:
+    assert expected.kpis.keys() == actual.kpis.keys(), name
+    for key, value in expected.kpis.items():
+        assert actual.kpis[key] == pytest.approx(value, rel=RTOL), (name, key)
+    pd.testing.assert_frame_equal(expected.daily, actual.daily, check_dtype=False, check_freq=False, rtol=RTOL, obj=name)
+    for attr in ("by_categoria", "by_convenio"):
+        left, right = getattr(expected, attr), getattr(actual, attr)
+        label = left.columns[0]
+        left = left.assign(**{label: left[label].astype(str)}).sort_values(label, ignore_index=True)
+        right = right.assign(**{label: right[label].astype(str)}).sort_values(label, ignore_index=True)
+        pd.testing.assert_frame_equal(left, right, check_dtype=False, rtol=RTOL, obj=f"{name}.{attr}")
+
+
+def test_cube_matches_pandas_path(ds):
+    for name, filters in _scenarios(ds).items():
+        tickets, jobs, _ = apply_filters(ds, filters)
+        _assert_equivalent(compute_ticket_aggregates(tickets, jobs), cube_aggregates(ds, filters), name)
+
+
+def test_sums_path_matches_pandas_path(ds):
+    for name, filters in _scenarios(ds).items():
+        tickets, jobs, _ = apply_filters(ds, filters)
+        aggs = ticket_aggregates_from_sums(
+            _warehouse_sums(tickets, ["timestamp"]),
+            _warehouse_sums(tickets, ["categoria"]),
+            _warehouse_sums(tickets[tickets["produto"] == "Consignado"], ["convenio"]),
+            jobs_total=len(jobs),
+        )
+        _assert_equivalent(compute_ticket_aggregates(tickets, jobs), aggs, name)
+
+
+@pytest.mark.parametrize("dimension", ["canal", "categoria", "convenio"])
+def test_cube_daily_group_sums_match_pandas(ds, dimension):
+    for name, filters in _scenarios(ds).items():
+        tickets, _, _ = apply_filters(ds, filters)
+        expected = _warehouse_sums(tickets, ["timestamp", dimension])
+        actual = cube_daily_group_sums(ds, filters, dimension)
+        key = ["timestamp", dimension]
+        expected = expected.assign(**{dimension: expected[dimension].astype(str)}).sort_values(key, ignore_index=True)
+        actual = actual.assign(**{dimension: actual[dimension].astype(str)}).sort_values(key, ignore_index=True)
+        assert actual["tickets"].tolist() == expected["tickets"].tolist(), name
+        for col in ("ait_sum", "ait_n", "tnps_sum", "tnps_n"):
+            assert np.allclose(actual[col].to_numpy(float), expected[col].to_numpy(float), rtol=RTOL), (name, col)
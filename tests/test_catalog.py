@@ -0,0 +1,37 @@
+from datetime import date
+
+import pandas as pd
+
+from src import catalog, data_access
+from src.config import DatabricksConfig
+from src.data_access import load_all_data, load_watermarks
+from src.filters import build_filter_options
+
+
+def _cfg() -> DatabricksConfig:
+    return DatabricksConfig(
+        host="https://example", http_path="/sql", token="t",
+        table_tickets="t_tickets", table_jobs="t_jobs", table_product_metrics="t_product", table_eligibility="t_elig",
+    )
+
+
+def test_filters_keeps_build_filter_options():
+    ds = load_all_data(use_databricks=False)
+    options = build_filter_options(ds)
+    assert options == catalog.build_filter_options(ds)
+    assert options["min_date"] == ds.tickets["timestamp"].min().date()
+    assert "App" in options["canal"]
+
+
+def test_watermark_only_base_has_date_bounds(monkeypatch):
+    def run_query(sql_text, params=None, cfg=None, **kwargs):
+        assert "MIN(" in sql_text
+        return pd.DataFrame({"n": [10], "min_time": [pd.Timestamp("2026-01-05 08:00")], "max_time": [pd.Timestamp("2026-03-01 17:30")]})
+
+    monkeypatch.setattr(data_access, "run_query", run_query)
+    base = load_watermarks(_cfg())
+    assert base.tickets.empty
+
+    options = catalog.get_catalog(base).as_options()
+    assert (options["min_date"], options["max_date"]) == (date(2026, 1, 5), date(2026, 3, 1))
+    assert options["canal"] == []
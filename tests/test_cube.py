@@ -0,0 +1,55 @@
+from datetime import date
+
+import pandas as pd
+
+from src.cube import CubeBuilder
+from src.data_access import load_all_data
+from src.filters import TICKET_DIMENSIONS
+from src.sketch import SketchBuilder
+from src.streaming import fold_ticket_chunks
+
+FILTERS = {"date_range": (date(2026, 1, 1), date(2026, 1, 31)), "canal": ["App"]}
+
+
+def test_empty_builder_keeps_dimension_columns():
+    cube = CubeBuilder().build()
+    for col in TICKET_DIMENSIONS.values():
+        assert isinstance(cube.cells[col].dtype, pd.CategoricalDtype)
+
+    aggs = cube.aggregates(FILTERS, jobs_total=0)
+    assert aggs.kpis["tickets_total"] == 0
+    assert len(aggs.daily) == 0
+    for dimension in ("canal", "categoria", "convenio"):
+        sums = cube.daily_group_sums(FILTERS, dimension)
+        assert len(sums) == 0 and dimension in sums.columns
+
+
+def test_fold_without_chunks_returns_empty_cube():
+    sketches = SketchBuilder()
+    cube = fold_ticket_chunks(iter(()), sketches=sketches)
+    assert cube.aggregates(FILTERS, jobs_total=0).kpis["tickets_total"] == 0
+    assert len(sketches.build().quantiles("ait", FILTERS, by="canal")) == 0
+
+
+def _tickets(n: int = 2_000) -> pd.DataFrame:
+    return load_all_data(use_databricks=False).tickets.head(n)
+
+
+def test_flag_counts_only_stored_when_there_are_nulls():
+    tickets = _tickets()
+    assert "fcr_n" not in CubeBuilder().build().cells.columns
+    builder = CubeBuilder()
+    builder.add(tickets)
+    assert "fcr_n" not in builder.build().cells.columns
+
+    with_nulls = tickets.assign(fcr=tickets["fcr"].astype("float64"))
+    with_nulls.loc[with_nulls.index[-100:], "fcr"] = float("nan")
+    builder = CubeBuilder(compact_rows=1)
+    for start in range(0, len(with_nulls), 500):
+        builder.add(with_nulls.iloc[start:start + 500])
+    cube = builder.build()
+    assert "fcr_n" in cube.cells.columns
+
+    filters = {"date_range": (tickets["timestamp"].min().date(), tickets["timestamp"].max().date())}
+    expected = with_nulls["fcr"].mean() * 100
+    assert abs(cube.aggregates(filters, jobs_total=0).kpis["fcr"] - expected) < 1e-9
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from src import data_access
+from src.config import DatabricksConfig
+from src.data_access import TableWatermark, load_table
+from src.disk_cache import ParquetCache
+
+
+def _cfg() -> DatabricksConfig:
+    return DatabricksConfig(
+        host="https://example", http_path="/sql", token="t",
+        table_tickets="t_tickets", table_jobs="t_jobs", table_product_metrics="t_product", table_eligibility="t_elig",
+    )
+
+
+def _setup(monkeypatch, tmp_path):
+    calls = []
+
+    def run_query(sql_text, params=None, cfg=None, **kwargs):
+        calls.append(sql_text)
+        return pd.DataFrame({
+            "timestamp": pd.date_range("2026-01-01", periods=3, freq="D"),
+            "job": ["a", "b", "c"],
+            "status": ["ok", "ok", "erro"],
+            "duration_s": [len(calls)] * 3,
+        })
+
+    monkeypatch.setattr(data_access, "run_query", run_query)
+    monkeypatch.setattr(data_access, "get_disk_cache", lambda: ParquetCache(tmp_path, ttl_s=3600, max_bytes=2**30))
+    return calls
+
+
+def test_same_watermark_hits_disk_cache(monkeypatch, tmp_path):
+    calls = _setup(monkeypatch, tmp_path)
+    wm = TableWatermark(rows=3, max_time=pd.Timestamp("2026-01-03"))
+    first = load_table("jobs", _cfg(), {"canal": ["App"]}, watermark=wm)
+    second = load_table("jobs", _cfg(), {"canal": ["App"]}, watermark=wm)
+    assert len(calls) == 1
+    assert second["duration_s"].tolist() == first["duration_s"].tolist()
+
+
+def test_new_watermark_misses_disk_cache(monkeypatch, tmp_path):
+    calls = _setup(monkeypatch, tmp_path)
+    load_table("jobs", _cfg(), watermark=TableWatermark(rows=3, max_time=pd.Timestamp("2026-01-03")))
+    fresh = load_table("jobs", _cfg(), watermark=TableWatermark(rows=4, max_time=pd.Timestamp("2026-01-04")))
+    assert len(calls) == 2
+    assert fresh["duration_s"].eq(2).all()
+
+
+def test_without_watermark_skips_disk_cache(monkeypatch, tmp_path):
+    calls = _setup(monkeypatch, tmp_path)
+    load_table("jobs", _cfg())
+    load_table("jobs", _cfg())
+    assert len(calls) == 2
+    assert not any(tmp_path.iterdir())
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.downsample import chart_series, resample_series
+from src.metrics import compute_ticket_aggregates
+
+
+@pytest.fixture(scope="module")
+def tickets():
+    rng = np.random.default_rng(7)
+    n = 5_000
+    # Volume e nulos variam por dia: média simples das médias diárias ≠ média dos tickets
+    day = pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 120, n) ** 2 // 120, unit="D")
+    tnps = rng.normal(50, 15, n)
+    tnps[rng.random(n) < 0.3] = np.nan
+    return pd.DataFrame({
+        "ticket_id": np.arange(n),
+        "timestamp": day + pd.to_timedelta(rng.integers(0, 86_400, n), unit="s"),
+        "tnps": tnps,
+        "ait_min": rng.gamma(4, 7, n),
+    }).sort_values("timestamp", ignore_index=True)
+
+
+def _daily(tickets: pd.DataFrame) -> pd.DataFrame:
+    rows = tickets.assign(categoria="x", produto="x", convenio="x", fcr=1, reopen=0)
+    return compute_ticket_aggregates(rows, tickets.iloc[:0]).daily
+
+
+@pytest.mark.parametrize("freq", ["W-MON", "MS"])
+def test_weighted_resample_matches_ticket_means(tickets, freq):
+    daily = _daily(tickets)
+    out = resample_series(daily, "timestamp", sum_cols=["tickets"], mean_cols=["tnps", "ait"], freq=freq,
+                          weights={"tnps": "tnps_n", "ait": "ait_n"})
+
+    expected = tickets.groupby(pd.Grouper(key="timestamp", freq=freq, label="left", closed="left")).agg(
+        tickets=("ticket_id", "size"), tnps=("tnps", "mean"), ait=("ait_min", "mean")
+    ).reset_index()
+    expected = expected[expected["tickets"] > 0].reset_index(drop=True)
+    pd.testing.assert_frame_equal(out, expected, check_dtype=False)
+
+
+def test_chart_series_passes_weights(tickets):
+    daily = _daily(tickets)
+    out, grain = chart_series(daily, "timestamp", mean_cols=["tnps"], max_points=30, weights={"tnps": "tnps_n"})
+    assert grain == "semana"
+    first_week = tickets[tickets["timestamp"] < out["timestamp"].iloc[1]]
+    assert out["tnps"].iloc[0] == pytest.approx(first_week["tnps"].mean())
@@ -0,0 +1,74 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from src.data_access import load_all_data, make_data_source
+from src.memo import MemoCache, estimate_bytes
+from src.query_builder import TABLE_COLUMNS
+from src.sketch import SketchBuilder
+from src.streaming import fold_ticket_chunks
+
+
+def test_estimate_bytes_counts_strings():
+    labels = pd.DataFrame({"label": [f"valor-{i:06d}" for i in range(10_000)]})
+    assert estimate_bytes(labels) >= 10_000 * len("valor-000000")
+
+
+def test_estimate_bytes_counts_shared_arrays_once():
+    values = np.zeros(100_000)
+    assert estimate_bytes([values, values, values[:10]]) < 2 * values.nbytes
+
+
+def test_estimate_bytes_includes_streamed_cube_and_sketches():
+    tickets = load_all_data(use_databricks=False).tickets
+    sketches = SketchBuilder()
+    cube = fold_ticket_chunks((tickets.iloc[i:i + 5_000] for i in range(0, len(tickets), 5_000)), sketches=sketches)
+    view = make_data_source(pd.DataFrame(columns=TABLE_COLUMNS["tickets"]), pd.DataFrame(), pd.DataFrame())
+    bare = estimate_bytes(view)
+    view.cube, view.sketches = cube, sketches.build()
+
+    expected = sum(
+        int(frame.memory_usage(deep=True).sum())
+        for frame in (cube.cells, *view.sketches.entries.values())
+    )
+    assert estimate_bytes(view) >= bare + expected
+
+
+def test_memo_hits_by_canonical_filters_and_evicts_lru():
+    memo = MemoCache(max_entries=2, max_bytes=2**30)
+    calls = []
+
+    def compute(tag):
+        calls.append(tag)
+        return tag
+
+    f1 = {"date_range": (date(2026, 1, 1), date(2026, 1, 31)), "canal": ["App", "Chat"]}
+    f1_reordered = {"canal": ["Chat", "App"], "date_range": (date(2026, 1, 1), date(2026, 1, 31))}
+    assert memo.get_or_compute("ns", "v1", f1, lambda: compute("a")) == "a"
+    assert memo.get_or_compute("ns", "v1", f1_reordered, lambda: compute("b")) == "a"
+    assert memo.get_or_compute("ns", "v2", f1, lambda: compute("c")) == "c"
+    memo.get_or_compute("ns", "v3", f1, lambda: compute("d"))
+    assert memo.get_or_compute("ns", "v1", f1, lambda: compute("e")) == "e"
+    assert calls == ["a", "c", "d", "e"]
+    stats = memo.stats().set_index("namespace").loc["ns"]
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 4, 2)
+
+
+def test_memo_skips_values_larger_than_budget():
+    memo = MemoCache(max_entries=8, max_bytes=1_000)
+    big = np.zeros(10_000)
+    assert memo.get_or_compute("ns", "v1", None, lambda: big) is big
+    assert memo.stats()["entries"].sum() == 0
+
+
+def test_latest_finds_same_filters_in_any_version():
+    memo = MemoCache(max_entries=8, max_bytes=2**30)
+    filters = {"canal": ["App"]}
+    assert memo.latest("view", filters) is None
+    memo.get_or_compute("view", "v1", filters, lambda: "v1")
+    memo.get_or_compute("view", "v2", {"canal": ["Chat"]}, lambda: "outro recorte")
+    memo.get_or_compute("other", "v3", filters, lambda: "outro namespace")
+    assert memo.latest("view", {"canal": ["App"]}) == "v1"
+    memo.get_or_compute("view", "v2", filters, lambda: "v2")
+    assert memo.latest("view", filters) == "v2"
@@ -0,0 +1,64 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.model_registry import ModelRegistry, predict_proba
+
+
+def _train(registry: ModelRegistry, key: str):
+    """Treina (ou carrega) o modelo de `key` e devolve o arquivo mais recente do diretório."""
+    X = pd.DataFrame({"applications": [1.0, 2.0, 3.0, 4.0], "approvals": [0.0, 1.0, 1.0, 2.0]})
+    y = pd.Series([0, 1, 0, 1])
+    registry.get_or_train(X, y, data_key=key)
+    return max(registry.root.glob("*.joblib"), key=lambda p: p.stat().st_mtime)
+
+
+def _age(path, seconds: float) -> None:
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_expired_models_are_removed(tmp_path):
+    registry = ModelRegistry(tmp_path, ttl_s=3600)
+    old = _train(registry, "v1")
+    _age(old, 7200)
+
+    _train(registry, "v2")
+    assert not old.exists()
+    assert len(list(tmp_path.glob("*.joblib"))) == 1
+    assert registry.stats()["evictions"] == 1
+
+
+def test_least_recently_used_models_leave_first(tmp_path):
+    registry = ModelRegistry(tmp_path)
+    paths = []
+    for age, key in ((300, "a"), (200, "b"), (100, "c")):
+        paths.append(_train(registry, key))
+        _age(paths[-1], age)
+
+    registry.max_bytes = paths[-1].stat().st_size
+    assert registry.evict() == 2
+    assert list(tmp_path.glob("*.joblib")) == [paths[-1]]
+
+
+def test_disk_hit_refreshes_last_access(tmp_path):
+    path = _train(ModelRegistry(tmp_path), "v1")
+    _age(path, 7200)
+
+    fresh = ModelRegistry(tmp_path, ttl_s=3600)
+    _train(fresh, "v1")
+    assert fresh.stats()["disk_hits"] == 1
+    assert fresh.evict() == 0 and path.exists()
+
+
+def test_scoring_uses_training_features_in_order(tmp_path):
+    registry = ModelRegistry(tmp_path)
+    X = pd.DataFrame({"applications": [1.0, 2.0, 3.0, 4.0], "approvals": [0.0, 1.0, 1.0, 2.0]})
+    model = registry.get_or_train(X, pd.Series([0, 1, 0, 1]), data_key="v1")
+
+    # Colunas fora de ordem e uma a mais: pontua o mesmo que o frame do treino
+    wide = X[["approvals", "applications"]].assign(conversions=[9.0, 9.0, 9.0, 9.0])
+    np.testing.assert_allclose(predict_proba(model, wide), predict_proba(model, X))
+    np.testing.assert_allclose(predict_proba(model, wide, features=["applications", "approvals"]), predict_proba(model, X))
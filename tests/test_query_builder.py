@@ -0,0 +1,94 @@
+import contextlib
+import re
+
+import pytest
+
+from src import databricks_client
+from src.config import DatabricksConfig
+from src.query_builder import build_select, build_ticket_daily_sums, build_where
+
+MARKER = re.compile(r"(?<!:):([A-Za-z_]\w*)")
+
+FILTERS = {
+    "date_range": ("2024-01-01", "2024-01-31"),
+    "canal": ["App", "Chat"],
+    "convenio": ["INSS' OR 1=1 --", "Prefeitura\\"],
+}
+
+
+def _cfg() -> DatabricksConfig:
+    return DatabricksConfig(
+        host="h", http_path="p", token="t",
+        table_tickets="cat.sch.tickets", table_jobs="cat.sch.jobs",
+        table_product_metrics="cat.sch.product_metrics", table_eligibility="cat.sch.eligibility",
+    )
+
+
+@pytest.mark.parametrize("table", ["tickets", "jobs", "product_metrics"])
+def test_markers_match_params(table):
+    sql_text, params = build_select(table, "t", FILTERS, since="2024-01-15")
+    assert set(MARKER.findall(sql_text)) == set(params)
+
+
+def test_values_never_reach_sql_text():
+    where, params = build_where("tickets", FILTERS)
+    for value in params.values():
+        assert str(value) not in where
+    assert "IN (:f_convenio_0, :f_convenio_1)" in where
+    assert sorted(v for k, v in params.items() if k.startswith("f_convenio")) == sorted(FILTERS["convenio"])
+    # Limite superior inclusivo: fim do período + 1 dia
+    assert params["start_date"] == "2024-01-01" and params["end_date"] == "2024-02-01"
+
+
+def test_empty_filters_mean_no_where():
+    assert build_where("tickets", None) == ("", {})
+    assert build_where("tickets", {"canal": []}) == ("", {})
+
+
+class _Cursor:
+    def __init__(self, calls):
+        self.calls = calls
+        self.description = [("n",)]
+
+    def execute(self, operation, parameters=None):
+        self.calls.append((operation, parameters))
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+class _Connection:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def cursor(self):
+        return _Cursor(self.calls)
+
+
+class _Pool:
+    def __init__(self):
+        self.calls = []
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield _Connection(self.calls)
+
+
+def test_run_query_binds_native_parameters(monkeypatch):
+    pool = _Pool()
+    monkeypatch.setattr(databricks_client, "get_connection_pool", lambda cfg: pool)
+    sql_text, params = build_ticket_daily_sums("cat.sch.tickets", FILTERS)
+    databricks_client.run_query(sql_text, params, cfg=_cfg(), cache=False)
+    (operation, bound), = pool.calls
+    assert operation == sql_text
+    assert bound == params
+    assert "Prefeitura\\" not in operation
+
+
+def test_cache_key_includes_params():
+    sql_text, params = build_where("tickets", {"canal": ["App"]})
+    other = {**params, "f_canal_0": "Chat"}
+    assert databricks_client.query_cache_key(sql_text, params, _cfg()) != databricks_client.query_cache_key(sql_text, other, _cfg())
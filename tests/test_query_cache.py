@@ -0,0 +1,130 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import data_access, databricks_client
+from src.config import DatabricksConfig
+from src.data_access import TableWatermark, load_table
+from src.databricks_client import QueryResultCache, query_cache_key
+from src.disk_cache import ParquetCache
+from src.memo import estimate_bytes
+
+
+def _frame(rows: int = 100) -> pd.DataFrame:
+    return pd.DataFrame({"value": np.arange(rows, dtype="float64")})
+
+
+def _cfg(token: str = "t") -> DatabricksConfig:
+    return DatabricksConfig(
+        host="https://example", http_path="/sql", token=token,
+        table_tickets="t_tickets", table_jobs="t_jobs", table_product_metrics="t_product", table_eligibility="t_elig",
+    )
+
+
+def test_concurrent_callers_share_one_query():
+    cache = QueryResultCache(ttl_s=60, max_bytes=2**20)
+    calls, release = [], threading.Event()
+
+    def query():
+        calls.append(1)
+        release.wait(5)
+        return _frame()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_run("k", query))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["waits"] < 7 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(origin for _, origin in results) == ["miss"] + ["wait"] * 7
+    assert cache.get_or_run("k", query)[1] == "hit"
+    # Cada chamador recebe a própria cópia rasa: atribuir coluna não vaza para os demais
+    results[0][0]["extra"] = 1
+    assert "extra" not in cache.get_or_run("k", query)[0].columns
+
+
+def test_expired_results_are_recomputed():
+    cache = QueryResultCache(ttl_s=0.05, max_bytes=2**20)
+    assert cache.get_or_run("k", _frame)[1] == "miss"
+    assert cache.get_or_run("k", _frame)[1] == "hit"
+    time.sleep(0.1)
+    assert cache.get_or_run("k", _frame)[1] == "miss"
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_results_leave_first():
+    size = estimate_bytes(_frame())
+    cache = QueryResultCache(ttl_s=60, max_bytes=2 * size)
+    cache.get_or_run("a", _frame)
+    cache.get_or_run("b", _frame)
+    cache.get_or_run("a", _frame)
+    cache.get_or_run("c", _frame)
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 2 * size
+    assert cache.get_or_run("a", _frame)[1] == "hit"
+    assert cache.get_or_run("b", _frame)[1] == "miss"
+
+    # Maior que o cache inteiro: devolvido, mas não guardado
+    assert cache.get_or_run("big", lambda: _frame(10_000))[1] == "miss"
+    assert cache.get_or_run("big", lambda: _frame(10_000))[1] == "miss"
+
+
+def test_entries_are_sized_deeply():
+    labels = pd.DataFrame({"label": pd.Series([f"convenio-{i:06d}" for i in range(10_000)], dtype=object)})
+    shallow = int(labels.memory_usage(index=False).sum())
+    cache = QueryResultCache(ttl_s=60, max_bytes=2 * shallow)
+    cache.get_or_run("k", lambda: labels)
+    # O conteúdo das strings passa do limite: não cabe, mesmo que os ponteiros caibam
+    assert cache.stats()["entries"] == 0
+
+
+def test_errors_are_not_cached():
+    cache = QueryResultCache(ttl_s=60, max_bytes=2**20)
+
+    def failing():
+        raise RuntimeError("warehouse indisponível")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_run("k", failing)
+    assert cache.get_or_run("k", _frame)[1] == "miss"
+    stats = cache.stats()
+    assert (stats["errors"], stats["entries"], stats["inflight"]) == (1, 1, 0)
+
+
+def test_cache_key_covers_params_credentials_and_formatting():
+    sql_text = "SELECT * FROM t WHERE canal = :canal"
+    base = query_cache_key(sql_text, {"canal": "App"}, _cfg())
+    assert query_cache_key("SELECT *\n  FROM t WHERE canal = :canal", {"canal": "App"}, _cfg()) == base
+    assert query_cache_key(sql_text, {"canal": "Chat"}, _cfg()) != base
+    assert query_cache_key(sql_text, {"canal": "App"}, _cfg(token="other")) != base
+    assert query_cache_key(sql_text, {"canal": "App"}, _cfg(), as_arrow=True) != base
+    assert query_cache_key(sql_text, {"canal": "App"}, _cfg(), version="v2") != base
+    assert query_cache_key("SELECT 'a  b'", None, _cfg()) != query_cache_key("SELECT 'a b'", None, _cfg())
+
+
+def test_new_watermark_bypasses_cached_result(monkeypatch, tmp_path):
+    calls = []
+
+    def execute(sql_text, params, cfg, as_arrow, batch_rows):
+        calls.append(sql_text)
+        return pd.DataFrame({"timestamp": pd.date_range("2026-01-01", periods=len(calls), freq="D"), "job": "a", "status": "ok", "duration_s": 1})
+
+    cache = QueryResultCache(ttl_s=300, max_bytes=2**30)
+    monkeypatch.setattr(databricks_client, "_execute", execute)
+    monkeypatch.setattr(databricks_client, "get_query_cache", lambda: cache)
+    monkeypatch.setattr(data_access, "get_disk_cache", lambda: ParquetCache(tmp_path, ttl_s=3600, max_bytes=2**30))
+
+    load_table("jobs", _cfg(), watermark=TableWatermark(rows=1, max_time=pd.Timestamp("2026-01-01")))
+    fresh = load_table("jobs", _cfg(), watermark=TableWatermark(rows=2, max_time=pd.Timestamp("2026-01-02")))
+    assert len(calls) == 2
+    assert len(fresh) == 2
@@ -0,0 +1,227 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from src import data_access, streaming
+from src.config import DatabricksConfig
+from src.cube import DailyCube, cube_aggregates
+from src.data_access import frame_watermarks, load_all_data
+from src.refresh import IncrementalLoader, refresh_view
+from src.sketch import QuantileSketches, get_sketches
+from src.streaming import load_streaming_view
+
+
+def _cfg() -> DatabricksConfig:
+    return DatabricksConfig(
+        host="https://example", http_path="/sql", token="t",
+        table_tickets="t_tickets", table_jobs="t_jobs", table_product_metrics="t_product", table_eligibility="t_elig",
+    )
+
+
+class _Warehouse:
+    """Responde às consultas de watermark; `rows` e `failing` mudam entre refreshes."""
+
+    def __init__(self):
+        self.rows = {"t_tickets": 100, "t_jobs": 10, "t_product": 5}
+        self.failing = set()
+        self.queries = []
+
+    def __call__(self, sql_text, params=None, cfg=None, cache=True, **kwargs):
+        self.queries.append(sql_text)
+        assert "COUNT(*)" in sql_text and cache is False
+        table = sql_text.rsplit("FROM ", 1)[1].strip()
+        if table in self.failing:
+            raise RuntimeError("warehouse indisponível")
+        return pd.DataFrame({"n": [self.rows[table]], "max_time": [pd.Timestamp("2026-01-01") + pd.Timedelta(days=self.rows[table])]})
+
+
+def test_databricks_loader_keeps_only_watermarks(monkeypatch):
+    warehouse = _Warehouse()
+    monkeypatch.setattr(data_access, "run_query", warehouse)
+    loader = IncrementalLoader(_cfg(), use_databricks=True, interval_s=0)
+
+    ds = loader.get()
+    assert len(warehouse.queries) == 3
+    assert ds.tickets.empty and ds.jobs.empty and ds.product_metrics.empty
+    assert ds.watermarks["tickets"].rows == 100
+
+
+def test_refresh_without_new_rows_keeps_version(monkeypatch):
+    warehouse = _Warehouse()
+    monkeypatch.setattr(data_access, "run_query", warehouse)
+    loader = IncrementalLoader(_cfg(), use_databricks=True, interval_s=0)
+
+    first = loader.get()
+    first.catalog = object()
+    same = loader.refresh()
+    assert same.version == first.version
+    assert same.catalog is first.catalog
+
+    warehouse.rows["t_tickets"] = 101
+    changed = loader.refresh()
+    assert changed.version != first.version
+    assert changed.catalog is None
+
+
+def test_failed_watermark_keeps_previous_value(monkeypatch):
+    warehouse = _Warehouse()
+    monkeypatch.setattr(data_access, "run_query", warehouse)
+    loader = IncrementalLoader(_cfg(), use_databricks=True, interval_s=0)
+
+    first = loader.get()
+    warehouse.failing.add("t_jobs")
+    ds = loader.refresh()
+    assert ds.load_report.failed == ["jobs"]
+    assert ds.watermarks["jobs"] == first.watermarks["jobs"]
+    assert ds.version == first.version
+
+
+def test_mock_loader_loads_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr("src.refresh.load_all_data", lambda use_databricks: calls.append(use_databricks) or data_access.make_data_source(
+        pd.DataFrame({"timestamp": [pd.Timestamp("2026-01-01")], "ticket_id": [1]}), pd.DataFrame(), pd.DataFrame()))
+    loader = IncrementalLoader(None, use_databricks=False, interval_s=0)
+    assert loader.get() is loader.get()
+    assert calls == [False]
+
+
+def test_concurrent_refresh_is_deduplicated(monkeypatch):
+    warehouse = _Warehouse()
+    monkeypatch.setattr(data_access, "run_query", warehouse)
+    loader = IncrementalLoader(_cfg(), use_databricks=True, interval_s=0)
+    first = loader.get()
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow_warehouse(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return warehouse(*args, **kwargs)
+
+    monkeypatch.setattr(data_access, "run_query", slow_warehouse)
+    worker = threading.Thread(target=loader.refresh)
+    worker.start()
+    assert started.wait(5)
+
+    # Refresh em andamento: leitores recebem o snapshot atual sem consultar de novo
+    assert loader.get() is first
+    release.set()
+    worker.join(5)
+    assert len(warehouse.queries) == 6
+
+    # Com o intervalo ainda válido, um refresh não forçado reaproveita o que acabou de ser publicado
+    loader.interval_s = 3600
+    published = loader.get()
+    assert loader.refresh(force=False) is published
+    assert len(warehouse.queries) == 6
+
+
+class _Tables:
+    """Tabelas do warehouse em memória: responde SELECTs (com `since`) e registra cada consulta."""
+
+    NAMES = {"t_tickets": "tickets", "t_jobs": "jobs", "t_product": "product_metrics"}
+
+    def __init__(self, frames: dict):
+        self.frames = frames
+        self.queries = []
+
+    def watermarks(self) -> dict:
+        return frame_watermarks({self.NAMES[name]: df for name, df in self.frames.items()})
+
+    def _rows(self, sql_text, params):
+        self.queries.append((sql_text, dict(params or {})))
+        name = sql_text.split(" FROM ", 1)[1].split()[0]
+        df = self.frames[name]
+        if params and "since" in params:
+            col = "date" if name == "t_product" else "timestamp"
+            df = df[df[col] >= pd.Timestamp(params["since"])]
+        return df.reset_index(drop=True)
+
+    def run_query(self, sql_text, params=None, cfg=None, **kwargs):
+        return self._rows(sql_text, params)
+
+    def iter_query(self, sql_text, params=None, cfg=None, batch_rows=1_000):
+        rows = self._rows(sql_text, params)
+        for start in range(0, len(rows), 1_000):
+            yield rows.iloc[start:start + 1_000]
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    mock = load_all_data(use_databricks=False)
+    full = mock.tickets.astype({col: object for col in mock.tickets.select_dtypes("category").columns})
+    warehouse = _Tables({"t_tickets": full.iloc[:-2_000], "t_jobs": mock.jobs, "t_product": mock.product_metrics})
+    warehouse.full_tickets = full
+    monkeypatch.setattr(data_access, "run_query", warehouse.run_query)
+    monkeypatch.setattr(data_access, "get_disk_cache", lambda: None)
+    monkeypatch.setattr(streaming, "iter_query", warehouse.iter_query)
+    return warehouse
+
+
+def _filters(tickets: pd.DataFrame) -> dict:
+    return {"date_range": (tickets["timestamp"].min().date(), tickets["timestamp"].max().date())}
+
+
+def _assert_same_rollups(view, tickets: pd.DataFrame) -> None:
+    filters = _filters(tickets)
+    expected = DailyCube.from_tickets(tickets).aggregates(filters, jobs_total=0)
+    actual = view.cube.aggregates(filters, jobs_total=0)
+    assert actual.kpis == pytest.approx(expected.kpis)
+    pd.testing.assert_frame_equal(actual.daily, expected.daily)
+    exact = QuantileSketches.from_tickets(tickets)
+    for metric in ("ait", "tnps"):
+        pd.testing.assert_frame_equal(view.sketches.quantiles(metric, filters, "canal"), exact.quantiles(metric, filters, "canal"))
+
+
+def _only_since_query(queries: list, table: str) -> pd.Timestamp:
+    assert len(queries) == 1
+    sql_text, params = queries[0]
+    assert f"FROM {table}" in sql_text and ">= CAST(:since AS TIMESTAMP)" in sql_text
+    return pd.Timestamp(params["since"])
+
+
+def test_refresh_fetches_only_rows_since_watermark(tables):
+    filters = _filters(tables.full_tickets)
+    first = tables.watermarks()
+    view = load_all_data(use_databricks=True, cfg=_cfg(), filters=filters, watermarks=first)
+    cube_aggregates(view, filters)
+    get_sketches(view)
+
+    tables.frames["t_tickets"] = tables.full_tickets
+    tables.queries.clear()
+    fresh = refresh_view(view, _cfg(), filters, tables.watermarks())
+
+    assert _only_since_query(tables.queries, "t_tickets") == first["tickets"].max_time
+    assert fresh.tickets["ticket_id"].tolist() == tables.full_tickets["ticket_id"].tolist()
+    assert fresh.source_watermarks == tables.watermarks()
+    assert fresh.version != view.version and len(view.tickets) == len(tables.full_tickets) - 2_000
+    # Cubo e sketches estendidos (não reconstruídos sob demanda) batem com os do recorte inteiro
+    _assert_same_rollups(fresh, fresh.tickets)
+
+
+def test_streamed_view_refolds_only_days_since_watermark(tables):
+    filters = _filters(tables.full_tickets)
+    first = tables.watermarks()
+    view = load_streaming_view(_cfg(), filters, first)
+    assert len(tables.queries) == 3
+
+    tables.frames["t_tickets"] = tables.full_tickets
+    tables.queries.clear()
+    fresh = refresh_view(view, _cfg(), filters, tables.watermarks())
+
+    assert _only_since_query(tables.queries, "t_tickets") == first["tickets"].max_time.floor("D")
+    assert fresh.tickets.empty and fresh.version != view.version
+    _assert_same_rollups(fresh, tables.full_tickets)
+
+
+def test_rewritten_table_is_read_again(tables):
+    view = load_all_data(use_databricks=True, cfg=_cfg(), watermarks=tables.watermarks())
+    cube_aggregates(view, _filters(view.tickets))
+    tables.frames["t_jobs"] = tables.frames["t_jobs"].iloc[:-10]
+    tables.queries.clear()
+    fresh = refresh_view(view, _cfg(), None, tables.watermarks())
+
+    assert len(tables.queries) == 1 and "since" not in tables.queries[0][1]
+    assert len(fresh.jobs) == len(view.jobs) - 10
+    assert fresh.cube is view.cube  # tickets não mudaram: o cubo continua valendo
@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+from src.data_access import normalize_schema
+
+
+def test_float32_only_when_round_trip_is_exact():
+    exact = pd.DataFrame({"ait_min": [0.5, 12.25, np.nan], "tnps": [100.0, -100.0, 0.0]})
+    out, _ = normalize_schema("tickets", exact)
+    assert out["ait_min"].dtype == "float32" and out["tnps"].dtype == "float32"
+
+    # Centavos acima de 2^24 não cabem em float32 (vira 16777216.0): a coluna fica em float64
+    cents = pd.DataFrame({"ait_min": [16_777_217.25, 1.0], "tnps": [0.1, 0.2]})
+    out, _ = normalize_schema("tickets", cents)
+    assert out["ait_min"].dtype == "float64"
+    assert out["ait_min"].iloc[0] == 16_777_217.25
+    # 0.1 não é representável igual em float32 e float64: também não é convertido
+    assert out["tnps"].dtype == "float64"
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from src import sketch
+from src.catalog import build_filter_options
+from src.data_access import load_all_data
+from src.filters import TICKET_DIMENSIONS, filter_table
+from src.sketch import RELATIVE_ACCURACY, SKETCH_METRICS, QuantileSketches, exact_quantiles, quantile_error, sketch_quantiles
+
+
+@pytest.fixture(scope="module")
+def ds():
+    return load_all_data(use_databricks=False)
+
+
+def _filters(ds, **overrides) -> dict:
+    options = build_filter_options(ds)
+    filters = {key: options[key] for key in TICKET_DIMENSIONS}
+    filters["date_range"] = (options["min_date"], options["max_date"])
+    return {**filters, **overrides}
+
+
+def _scenarios(ds) -> dict:
+    options = build_filter_options(ds)
+    end = options["max_date"]
+    return {
+        "full": _filters(ds),
+        "last_30_days": _filters(ds, date_range=(end - timedelta(days=30), end)),
+        "one_canal": _filters(ds, canal=options["canal"][:1]),
+        "consignado": _filters(ds, produto=["Consignado"], convenio=options["convenio"][:2]),
+        "single_day": _filters(ds, date_range=(end, end)),
+    }
+
+
+@pytest.mark.parametrize("metric", list(SKETCH_METRICS))
+@pytest.mark.parametrize("by", [None, "canal", "convenio"])
+def test_sketch_matches_exact_within_relative_accuracy(ds, metric, by):
+    for name, filters in _scenarios(ds).items():
+        estimated = sketch_quantiles(ds, filters, metric, by)
+        exact = exact_quantiles(filter_table(ds, "tickets", filters), metric, by)
+        assert len(estimated) == len(exact), name
+        assert estimated["n"].tolist() == exact["n"].tolist(), name
+        assert quantile_error(estimated, exact, by) <= RELATIVE_ACCURACY + 1e-9, name
+
+
+def test_merged_chunks_equal_single_pass(ds):
+    builder = sketch.SketchBuilder(compact_rows=1)
+    for start in range(0, len(ds.tickets), 5_000):
+        builder.add(ds.tickets.iloc[start:start + 5_000])
+    merged, single = builder.build(), QuantileSketches.from_tickets(ds.tickets)
+    filters = _filters(ds)
+    for metric in SKETCH_METRICS:
+        pd.testing.assert_frame_equal(merged.quantiles(metric, filters, "canal"), single.quantiles(metric, filters, "canal"))
+
+
+def test_filter_outside_grain_falls_back_to_exact(ds, monkeypatch):
+    filters = _filters(ds, categoria=build_filter_options(ds)["categoria"][:2])
+    estimated = sketch_quantiles(ds, filters, "ait", "canal")
+    exact = exact_quantiles(filter_table(ds, "tickets", filters), "ait", "canal")
+    pd.testing.assert_frame_equal(estimated, exact)
+
+    # Seleção completa fora do grão não restringe nada: continua nos sketches
+    monkeypatch.setattr(sketch, "exact_quantiles", lambda *args, **kwargs: pytest.fail("fallback inesperado"))
+    sketch_quantiles(ds, _filters(ds), "ait", "canal")